@@ -0,0 +1,83 @@
+# benchmarks/bench_sql_engines.py
+"""
+SQLite vs DuckDB execution on the bundled CSVs.
+
+Compares:
+- legacy path   : fresh :memory: SQLite + df.to_sql per query
+- sqlite store  : SQLiteTableStore (load once, indexed)
+- duckdb        : DuckDBEngine (registered typed frame, Arrow results)
+
+Run from the repo root:
+    python -m benchmarks.bench_sql_engines
+"""
+import sqlite3
+import time
+
+import pandas as pd
+
+from llm.models.sql_engine import SQLiteTableStore, DuckDBEngine
+
+
+DATASETS = {
+    "telemetry_data.csv": [
+        "SELECT AVG(Power), MAX(Speed), MIN(RPM) FROM data",
+        "SELECT AVG(Power) FROM data WHERE Speed BETWEEN 10 AND 12",
+        "SELECT Draft, AVG(Power), COUNT(*) FROM data GROUP BY Draft",
+        "SELECT COUNT(*) FROM data WHERE RPM > 55 AND Power < 5000",
+    ],
+    "cdac_timestamp_power_deviation_dataset.csv": [
+        "SELECT AVG(PowerDeviation), MAX(PowerDeviation) FROM data",
+        "SELECT COUNT(*) FROM data WHERE PowerDeviation > 30",
+        "SELECT AVG(PowerDeviation) FROM data WHERE PowerDeviation IS NOT NULL",
+    ],
+}
+
+REPEATS = 20
+
+
+def legacy_sqlite(df, sql):
+    conn = sqlite3.connect(":memory:")
+    try:
+        df.to_sql("data", conn, if_exists="replace", index=False)
+        return pd.read_sql_query(sql, conn)
+    finally:
+        conn.close()
+
+
+def bench(fn, repeats=REPEATS):
+    fn()  # warm-up (first load is reported separately)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    sqlite_store = SQLiteTableStore()
+    duck = DuckDBEngine()
+
+    print(f"{'dataset':45} {'query':62} {'legacy':>9} {'store':>9} {'duckdb':>9}")
+    for name, queries in DATASETS.items():
+        df = pd.read_csv(f"data/{name}")
+
+        start = time.perf_counter()
+        sqlite_store.table(df)
+        sqlite_load = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        duck.connection(df)
+        duck_load = (time.perf_counter() - start) * 1000
+
+        print(f"{name:45} {'<first load>':62} {'-':>9} {sqlite_load:8.2f}m {duck_load:8.2f}m")
+
+        for sql in queries:
+            legacy_ms = bench(lambda: legacy_sqlite(df, sql))
+            store_ms = bench(lambda: sqlite_store.query(df, sql))
+            duck_ms = bench(lambda: duck.query_arrow(df, sql))
+            print(f"{'':45} {sql[:62]:62} {legacy_ms:8.2f}m {store_ms:8.2f}m {duck_ms:8.2f}m")
+
+    print("\n(times in ms per query, mean of", REPEATS, "runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/bench_vision_budget.py
+"""
+Qwen2-VL visual-token budget on the bundled charts (data/graph_*.jpeg).
+
+For each budget (max pixels after cropping):
+- visual tokens    : 28x28 blocks the image costs
+- preprocess       : crop + resize time
+- latency          : QwenClient.analyze wall time           (--model only)
+- field agreement  : extracted JSON fields matching the native-resolution,
+                     uncropped extraction                    (--model only)
+
+Run from the repo root:
+    python -m benchmarks.bench_vision_budget            # tokens / preprocessing only
+    python -m benchmarks.bench_vision_budget --model    # + Qwen latency / agreement (GPU)
+"""
+import re
+import sys
+import glob
+import time
+
+from llm.models.image_preprocess import PATCH, load_image, fit_budget, prepare_chart, visual_tokens
+
+
+# name -> (max_pixels, crop); "native" is the reference extraction
+BUDGETS = {
+    "native": (None, False),
+    "crop": (None, True),
+    "1024": (1024 * PATCH * PATCH, True),
+    "512": (512 * PATCH * PATCH, True),
+    "256": (256 * PATCH * PATCH, True),
+    "128": (128 * PATCH * PATCH, True),
+}
+
+FIELDS = [
+    ("axes", "x"),
+    ("axes", "y"),
+    ("axes", "units"),
+    ("time_range", "start"),
+    ("time_range", "end"),
+    ("trend",),
+]
+
+
+def _field(d, path):
+    for key in path:
+        d = d.get(key) if isinstance(d, dict) else None
+    return d
+
+
+def _tokens(value) -> set:
+    return set(re.findall(r"[a-z0-9.]+", str(value).lower()))
+
+
+def field_agreement(reference: dict, output: dict) -> float:
+    """
+    Share of the reference's fields (plus the event-type set) that the
+    output reproduces; strings match on >= 50% token overlap.
+    """
+    scores = []
+    for path in FIELDS:
+        ref = _field(reference, path)
+        if ref in (None, "", "..."):
+            continue
+        got = _tokens(_field(output, path))
+        ref = _tokens(ref)
+        scores.append(len(ref & got) / max(len(ref | got), 1) >= 0.5)
+
+    ref_events = {e.get("type") for e in reference.get("events", []) if isinstance(e, dict)}
+    if ref_events:
+        got_events = {e.get("type") for e in output.get("events", []) if isinstance(e, dict)}
+        scores.append(ref_events == got_events)
+    return sum(scores) / len(scores) if scores else float("nan")
+
+
+def main():
+    with_model = "--model" in sys.argv
+    paths = sorted(glob.glob("data/graph_*.jpeg"))
+    pages = {p: load_image(p) for p in paths}
+
+    if with_model:
+        from llm.models.qwen_client import QwenClient
+        from workflow.vision_flow import CHART_SCHEMA, extraction_prompt
+
+        qwen = QwenClient(cache=None)
+        prompt = extraction_prompt()
+        reference = {}
+
+    print(f"{'budget':8} {'image':18} {'size':>11} {'tokens':>7} {'prep':>9} {'latency':>9} {'agree':>6}")
+    for name, (max_pixels, crop) in BUDGETS.items():
+        totals = {"tokens": 0, "prep": 0.0, "latency": 0.0, "agree": []}
+
+        for path, (image_bytes, image) in pages.items():
+            start = time.perf_counter()
+            prepared = prepare_chart(image, max_pixels, crop=crop)
+            prep_ms = (time.perf_counter() - start) * 1000
+            tokens = visual_tokens(fit_budget(prepared.size))
+
+            latency, agree = "-", "-"
+            if with_model:
+                qwen.max_pixels, qwen.crop = max_pixels, crop
+                start = time.perf_counter()
+                output = qwen.analyze(path, prompt, schema=CHART_SCHEMA)
+                seconds = time.perf_counter() - start
+
+                if name == "native":
+                    reference[path] = output
+                score = field_agreement(reference[path], output)
+                totals["latency"] += seconds
+                totals["agree"].append(score)
+                latency, agree = f"{seconds:8.2f}s", f"{score:6.2f}"
+
+            totals["tokens"] += tokens
+            totals["prep"] += prep_ms
+            size = f"{prepared.size[0]}x{prepared.size[1]}"
+            print(f"{name:8} {path.split('/')[-1]:18} {size:>11} {tokens:7d} {prep_ms:7.1f}ms {latency:>9} {agree:>6}")
+
+        n = len(pages)
+        latency = f"{totals['latency'] / n:8.2f}s" if with_model else "-"
+        agree = f"{sum(totals['agree']) / n:6.2f}" if with_model else "-"
+        print(f"{name:8} {'<mean>':18} {'':>11} {totals['tokens'] // n:7d} {totals['prep'] / n:7.1f}ms {latency:>9} {agree:>6}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# llm/models/batching.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Request coalescing for a batched model call.
+
+    Concurrent `submit` calls that arrive within `max_wait_ms` of each other
+    (and share the same generation key) are merged into ONE call to
+    `batch_fn(items, **kwargs)`, up to `max_batch_size` items.
+
+    batch_fn must return one result per item, in order.
+
+    For callers on their own threads (sync graph runs). The async graph
+    serializes model calls on one GPU worker, which batches its queued
+    jobs itself (workflow.async_runtime.GPUWorker.run_batched).
+    """
+
+    def __init__(
+        self,
+        batch_fn,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue = queue.Queue()
+        self._pending = {}           # key -> list of (item, future) not yet dispatched
+        self._stats = {"requests": 0, "batches": 0}
+        self._stats_lock = threading.Lock()
+
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    # --------------------------------------------------
+    # PUBLIC
+    # --------------------------------------------------
+    def submit(self, item, **kwargs) -> Future:
+        future = Future()
+        key = tuple(sorted(kwargs.items()))
+        self._queue.put((key, item, future))
+        return future
+
+    def __call__(self, item, **kwargs):
+        return self.submit(item, **kwargs).result()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["mean_batch_size"] = (
+            stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        )
+        return stats
+
+    # --------------------------------------------------
+    # WORKER
+    # --------------------------------------------------
+    def _collect(self):
+        """
+        Block for the first request, then keep collecting until the window
+        closes or some key reaches max_batch_size.
+        """
+        key, item, future = self._queue.get()
+        self._pending.setdefault(key, []).append((item, future))
+
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(self._pending[key]) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                k, item, future = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            self._pending.setdefault(k, []).append((item, future))
+            if len(self._pending[k]) >= self.max_batch_size:
+                key = k
+                break
+
+        return key
+
+    def _dispatch(self, key):
+        batch = self._pending.pop(key)
+        chunk, rest = batch[: self.max_batch_size], batch[self.max_batch_size:]
+        if rest:
+            self._pending[key] = rest
+
+        items = [item for item, _ in chunk]
+        try:
+            results = self.batch_fn(items, **dict(key))
+        except Exception as e:
+            for _, future in chunk:
+                future.set_exception(e)
+        else:
+            for (_, future), result in zip(chunk, results):
+                future.set_result(result)
+
+        with self._stats_lock:
+            self._stats["requests"] += len(chunk)
+            self._stats["batches"] += 1
+
+    def _run(self):
+        while True:
+            key = self._collect()
+            self._dispatch(key)
+
+            # flush other keys that accumulated in the same window
+            while self._pending:
+                self._dispatch(next(iter(self._pending)))
@@ -0,0 +1,127 @@
+# llm/models/image_preprocess.py
+import io
+import os
+import threading
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+# kept import-light on purpose: spawned pool workers import only this module
+
+
+def load_image(path: str):
+    """
+    (raw bytes, decoded RGB image) for one page / chart file.
+    """
+    with open(path, "rb") as f:
+        image_bytes = f.read()
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    return image_bytes, image
+
+
+# --------------------------------------------------
+# CHART PREPROCESSING (visual-token budget)
+# --------------------------------------------------
+# Qwen2-VL: 14px patches merged 2x2, so one visual token per 28x28 block
+PATCH = 28
+
+
+def visual_tokens(size) -> int:
+    """
+    Visual tokens Qwen2-VL spends on an image of `size` = (width, height)
+    already snapped to the patch grid.
+    """
+    width, height = size
+    return (width // PATCH) * (height // PATCH)
+
+
+def content_bbox(image: Image.Image, tol: int = 24, pad: int = 8, line_frac: float = 0.97):
+    """
+    Bounding box (left, top, right, bottom) of the chart content: everything
+    that differs from the background colour (taken from the image border),
+    ignoring full-span rows / columns (window chrome, screenshot borders).
+    Titles, tick labels and legends are kept; only empty margins go.
+    """
+    px = np.asarray(image.convert("L"), dtype=np.int16)
+    h, w = px.shape
+    border = np.concatenate([px[0], px[-1], px[:, 0], px[:, -1]])
+    background = np.bincount(border.astype(np.int64), minlength=256).argmax()
+
+    ink = np.abs(px - background) > tol
+    # masked out of the ink itself: a full-width rule would otherwise mark every column
+    ink[ink.sum(axis=1) >= line_frac * w, :] = False
+    ink[:, ink.sum(axis=0) >= line_frac * h] = False
+    rows, cols = ink.sum(axis=1), ink.sum(axis=0)
+
+    ys, xs = np.nonzero(rows)[0], np.nonzero(cols)[0]
+    if ys.size == 0 or xs.size == 0:
+        return 0, 0, w, h
+    return (
+        max(int(xs[0]) - pad, 0),
+        max(int(ys[0]) - pad, 0),
+        min(int(xs[-1]) + 1 + pad, w),
+        min(int(ys[-1]) + 1 + pad, h),
+    )
+
+
+def fit_budget(size, max_pixels: int = None, min_pixels: int = 4 * PATCH * PATCH):
+    """
+    (width, height) snapped to the patch grid and scaled (aspect kept) so
+    width * height <= max_pixels. None = no budget, snap only.
+    """
+    width, height = size
+    scale = 1.0
+    if max_pixels and width * height > max_pixels:
+        scale = math.sqrt(max_pixels / (width * height))
+    elif width * height < min_pixels:
+        scale = math.sqrt(min_pixels / (width * height))
+
+    w = max(PATCH, int(width * scale) // PATCH * PATCH)
+    h = max(PATCH, int(height * scale) // PATCH * PATCH)
+    return w, h
+
+
+def prepare_chart(image: Image.Image, max_pixels: int = None, crop: bool = True) -> Image.Image:
+    """
+    Crop empty margins, then downsample to the visual-token budget.
+    """
+    if crop:
+        image = image.crop(content_bbox(image))
+    size = fit_budget(image.size, max_pixels)
+    if size != image.size:
+        image = image.resize(size, Image.BICUBIC)
+    return image
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(max_workers: int = None) -> ProcessPoolExecutor:
+    """
+    Shared process pool for image decoding. "spawn" so workers never
+    inherit a CUDA context from the parent.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers or min(4, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return _pool
+
+
+def load_images(paths, parallel_min: int = 3) -> list:
+    """
+    load_image over many paths; decoded in the process pool when there are
+    at least `parallel_min` of them (below that the IPC costs more than it saves).
+    """
+    paths = list(paths)
+    if len(paths) < parallel_min:
+        return [load_image(p) for p in paths]
+    return list(get_pool().map(load_image, paths))
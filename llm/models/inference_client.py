@@ -0,0 +1,272 @@
+# llm/models/inference_client.py
+import os
+import stat
+import secrets
+import tempfile
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+
+KEY_FILE = "inference.key"
+SOCKET_FILE = "inference.sock"
+
+
+def runtime_dir() -> str:
+    """
+    Per-user 0700 directory for the socket and key file:
+    $XDG_RUNTIME_DIR/mdis, else <tmp>/mdis-<uid>. Refuses a directory
+    another user owns or others can enter.
+    """
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    path = os.path.join(base, "mdis") if base else os.path.join(tempfile.gettempdir(), f"mdis-{os.getuid()}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is not a directory owned by this user")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def default_address() -> str:
+    return os.environ.get("MDIS_INFERENCE_ADDR") or f"unix:{os.path.join(runtime_dir(), SOCKET_FILE)}"
+
+
+def parse_address(address: str):
+    """
+    "unix:/path.sock" -> ("/path.sock", "AF_UNIX")
+    "tcp:127.0.0.1:8765" / "127.0.0.1:8765" -> (("127.0.0.1", 8765), "AF_INET")
+    """
+    if address.startswith("unix:"):
+        return address[len("unix:"):], "AF_UNIX"
+    host, _, port = address.replace("tcp:", "", 1).rpartition(":")
+    return (host or "127.0.0.1", int(port)), "AF_INET"
+
+
+def authkey(create: bool = False) -> bytes:
+    """
+    Shared secret for the connection handshake (requests are pickled, so
+    only key holders may connect): MDIS_INFERENCE_KEY, else the 0600 key
+    file in runtime_dir(). The server (create=True) generates a random key
+    on first start; a client without one cannot connect.
+    """
+    key = os.environ.get("MDIS_INFERENCE_KEY")
+    if key:
+        return key.encode()
+
+    path = os.path.join(runtime_dir(), KEY_FILE)
+    if create and not os.path.exists(path):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass  # another server process won the race
+        else:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        raise RuntimeError(
+            f"No inference key: set MDIS_INFERENCE_KEY or start the server (creates {path})"
+        ) from None
+    if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        raise PermissionError(f"{path} must be owned by this user with mode 0600")
+    with open(path) as f:
+        return f.read().strip().encode()
+
+
+class RemoteError(RuntimeError):
+    """
+    An exception raised inside the inference server.
+    """
+
+    def __init__(self, reply: dict):
+        super().__init__(f"{reply.get('type')}: {reply.get('error')}")
+        self.type = reply.get("type")
+        self.trace = reply.get("trace")
+
+
+class InferenceClient:
+    """
+    Thin client for llm.models.inference_server.
+
+    One connection per calling thread (connections are not shared across
+    threads), opened lazily. An idle connection the server has closed (e.g.
+    it restarted) is replaced before sending. A request is only re-sent
+    when it cannot have run: the send failed, or the op is idempotent
+    (health). A call that loses its connection while waiting for the reply
+    raises instead, so GPU work never runs twice.
+    """
+
+    IDEMPOTENT = {"health"}
+
+    def __init__(self, address: str = None):
+        self.address = address or default_address()
+        self._local = threading.local()
+
+    def _connect(self):
+        address, family = parse_address(self.address)
+        return Client(address, family=family, authkey=authkey())
+
+    def _conn(self, fresh: bool = False):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and not fresh:
+            try:
+                # between requests nothing is unread: readable means closed by the server
+                fresh = conn.poll()
+            except (EOFError, OSError):
+                fresh = True
+        if conn is None or fresh:
+            if conn is not None:
+                conn.close()
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _drop(self, conn):
+        self._local.conn = None
+        conn.close()
+
+    def _request(self, request: dict):
+        """
+        Send + first reply. Returns (connection, first reply).
+        """
+        conn = self._conn()
+        try:
+            conn.send(request)
+        except OSError:
+            # never delivered: safe to send again on a fresh connection
+            conn = self._conn(fresh=True)
+            conn.send(request)
+
+        try:
+            return conn, conn.recv()
+        except (EOFError, OSError):
+            self._drop(conn)
+            if request["op"] not in self.IDEMPOTENT:
+                raise  # the server may already have run it
+            conn = self._conn(fresh=True)
+            conn.send(request)
+            return conn, conn.recv()
+
+    def health(self) -> dict:
+        return self._request({"op": "health"})[1]
+
+    def available(self) -> bool:
+        try:
+            return bool(self.health().get("ok"))
+        except (OSError, EOFError, RuntimeError, AuthenticationError):
+            return False  # down, no key, or a key the server does not accept
+
+    def call(self, model: str, method: str, *args, **kwargs):
+        _, reply = self._request(
+            {"op": "call", "model": model, "method": method, "args": args, "kwargs": kwargs}
+        )
+        if not reply.get("ok"):
+            raise RemoteError(reply)
+        return reply["result"]
+
+    def stream(self, model: str, method: str, *args, **kwargs):
+        conn, reply = self._request(
+            {"op": "stream", "model": model, "method": method, "args": args, "kwargs": kwargs}
+        )
+        finished = False
+        try:
+            while True:
+                if "chunk" in reply:
+                    yield reply["chunk"]
+                    reply = conn.recv()
+                elif reply.get("ok"):
+                    finished = True
+                    return
+                else:
+                    finished = True
+                    raise RemoteError(reply)
+        finally:
+            if not finished:
+                # abandoned mid-stream: unread chunks would poison the next reply
+                self._drop(conn)
+
+    def model(self, name: str, engine: str = "sqlite"):
+        return RemoteModel(self, name, engine)
+
+
+def _plain(value):
+    # LangChain PromptValues are sent as text
+    return value.to_string() if hasattr(value, "to_string") else value
+
+
+class RemoteModel:
+    """
+    Drop-in stand-in for a model client (MistralClient / SQLCoderClient /
+    QwenClient) whose methods run in the inference server.
+    `stream` is proxied as a generator; `execute_sql` runs locally on
+    `engine` (as SQLCoderClient's), since it only needs the SQL engine and
+    the DataFrame is already in this process.
+    """
+
+    STREAMING = {"stream"}
+    tokenizer = None  # not shipped; result compaction falls back to its estimate
+
+    def __init__(self, client: InferenceClient, name: str, engine: str = "sqlite"):
+        self._client = client
+        self._name = name
+        self.engine = engine
+
+    def execute_sql(self, df, sql_query: str, **kwargs):
+        from llm.models.sql_engine import get_executor
+
+        return get_executor(self.engine).execute_sql(df, sql_query, **kwargs)
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def _remote(*args, **kwargs):
+            args = tuple(_plain(a) for a in args)
+            kwargs = {k: _plain(v) for k, v in kwargs.items()}
+            if method in self.STREAMING:
+                return self._client.stream(self._name, method, *args, **kwargs)
+            return self._client.call(self._name, method, *args, **kwargs)
+
+        return _remote
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_inference_client() -> InferenceClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = InferenceClient()
+    return _client
+
+
+def local_manager():
+    """
+    The in-process ModelManager (for prefetching), or None when the models
+    are served by an inference server.
+    """
+    if os.environ.get("MDIS_INFERENCE_ADDR"):
+        return None
+
+    from llm.models.model_manager import get_manager
+
+    return get_manager()
+
+
+def resolve_model(name: str):
+    """
+    Model handle for graph nodes: a RemoteModel when MDIS_INFERENCE_ADDR
+    points at a running inference server, else the in-process manager proxy.
+    """
+    if os.environ.get("MDIS_INFERENCE_ADDR"):
+        return get_inference_client().model(name)
+
+    from llm.models.model_manager import get_manager
+
+    return get_manager().proxy(name)
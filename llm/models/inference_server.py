@@ -0,0 +1,195 @@
+# llm/models/inference_server.py
+import os
+import time
+import json
+import argparse
+import importlib
+import threading
+import traceback
+from multiprocessing.connection import Listener
+
+from llm.models.inference_client import authkey, default_address, parse_address
+from llm.models.model_manager import ModelManager, get_manager
+from llm.models.sql_engine import get_executor
+
+
+# --------------------------------------------------
+# STUB MODELS (tests / UI work without a GPU)
+# --------------------------------------------------
+class StubMistral:
+    def route(self, prompt: str, labels=None) -> str:
+        return self.classify(prompt, labels)[0] if labels else "sql"
+
+    def classify(self, prompt: str, labels) -> tuple:
+        labels = list(labels)
+        return ("sql" if "sql" in labels else labels[0]), 1.0
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        return f"[stub answer] {prompt[-80:].strip()}"
+
+    def generate_batch(self, prompts, **kwargs):
+        return [self.generate(p) for p in prompts]
+
+    def stream(self, prompt, **kwargs):
+        for word in self.generate(str(prompt)).split(" "):
+            yield word + " "
+
+
+class StubSQLCoder:
+    def generate_sql(self, prompt: str) -> str:
+        return "SELECT COUNT(*) AS n FROM data;"
+
+
+class StubQwen:
+    def analyze(self, image_path: str, prompt: str, schema=None):
+        result = {"axes": {}, "trend": "stub", "events": [], "notes": image_path}
+        return result if schema is not None else json.dumps(result)
+
+    def analyze_batch(self, image_paths, prompt: str, batch_size: int = None, schema=None):
+        return [self.analyze(p, prompt, schema) for p in image_paths]
+
+
+def stub_manager() -> ModelManager:
+    manager = ModelManager(budget_gb=float("inf"))
+    manager.register("mistral", StubMistral, footprint_gb=0.0)
+    manager.register("sqlcoder", StubSQLCoder, footprint_gb=0.0, cpu=get_executor)
+    manager.register("qwen", StubQwen, footprint_gb=0.0)
+    return manager
+
+
+# --------------------------------------------------
+# SERVER
+# --------------------------------------------------
+# importing these registers their prompt templates for prefix KV reuse
+PROMPT_MODULES = ("workflow.sql_flow", "workflow.router", "workflow.vision_flow", "workflow.direct_flow")
+
+
+def register_prompts():
+    for module in PROMPT_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"prompt prefixes from {module} not registered: {e}", flush=True)
+
+
+class InferenceServer:
+    """
+    One process owning the model weights (through a ModelManager), serving
+    any number of UI workers over a Unix socket (default: in the per-user
+    0700 runtime_dir) or localhost TCP. Clients must hold the authkey.
+
+    Requests (pickled dicts over multiprocessing.connection):
+        {"op": "health"}
+        {"op": "call",   "model": m, "method": f, "args": [...], "kwargs": {...}}
+        {"op": "stream", "model": m, "method": f, "args": [...], "kwargs": {...}}
+    Replies: {"ok": True, "result": ...} / {"ok": False, "error": ..., "type": ...};
+    a stream sends {"chunk": ...} messages then {"ok": True, "done": True}.
+
+    Each connection gets a thread; concurrent requests for the same model
+    meet in that client's MicroBatcher (MistralClient batches generate /
+    route calls), so several UI workers share one batched forward pass.
+    """
+
+    def __init__(self, address: str = None, manager: ModelManager = None):
+        self.address = address or default_address()
+        self.manager = manager or get_manager()
+        self.started = time.time()
+        self.stats = {"connections": 0, "requests": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def health(self) -> dict:
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started, 1),
+            "stats": dict(self.stats),
+            "models": self.manager.stats(),
+        }
+
+    def _handle(self, conn, request: dict):
+        op = request.get("op")
+        if op == "health":
+            conn.send(self.health())
+            return
+
+        name, method = request["model"], request["method"]
+        if method.startswith("_"):
+            raise AttributeError(f"Private method not callable remotely: {method}")
+        args, kwargs = request.get("args", ()), request.get("kwargs", {})
+
+        with self.manager.use(name) as client:
+            fn = getattr(client, method)
+            if op == "stream":
+                for chunk in fn(*args, **kwargs):
+                    conn.send({"chunk": getattr(chunk, "content", chunk)})
+                conn.send({"ok": True, "done": True})
+            else:
+                conn.send({"ok": True, "result": fn(*args, **kwargs)})
+
+    def _serve_connection(self, conn):
+        self._count("connections")
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                self._count("requests")
+                try:
+                    self._handle(conn, request)
+                except (BrokenPipeError, ConnectionResetError):
+                    return  # client went away (e.g. abandoned a stream)
+                except Exception as e:
+                    self._count("errors")
+                    conn.send({
+                        "ok": False,
+                        "type": type(e).__name__,
+                        "error": str(e),
+                        "trace": traceback.format_exc(limit=5),
+                    })
+
+    def serve_forever(self):
+        address, family = parse_address(self.address)
+        if family == "AF_UNIX" and os.path.exists(address):
+            os.unlink(address)  # stale socket from a previous run
+
+        self._listener = Listener(address, family=family, authkey=authkey(create=True))
+        if family == "AF_UNIX":
+            os.chmod(address, 0o600)
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                break  # listener closed
+            except Exception:
+                continue  # failed handshake (wrong authkey)
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the project models to UI workers.")
+    parser.add_argument("--address", default=None, help="default: MDIS_INFERENCE_ADDR or the per-user socket")
+    parser.add_argument("--stub", action="store_true", help="serve stub models (no GPU / weights)")
+    parser.add_argument("--preload", default="", help="comma-separated models to load at startup")
+    args = parser.parse_args()
+
+    register_prompts()
+    server = InferenceServer(args.address, stub_manager() if args.stub else None)
+    for name in filter(None, args.preload.split(",")):
+        server.manager.get(name)
+
+    print(f"inference server listening on {server.address} (pid {os.getpid()})", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
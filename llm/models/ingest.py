@@ -0,0 +1,160 @@
+# llm/models/ingest.py
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# tried in order; day-first wins over month-first (the CSVs are dd-mm-YYYY)
+DATETIME_FORMATS = [
+    "%d-%m-%Y %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%d-%m-%Y",
+    "%Y-%m-%d",
+]
+
+# how timestamps are stored in SQLite (its native, sortable date text)
+SQL_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def detect_datetime_format(series: pd.Series, sample_size: int = 200):
+    """
+    Try the known formats on a small sample before touching the full column.
+    """
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return None
+    sample = series.dropna().astype(str).head(sample_size)
+    if sample.empty:
+        return None
+    for fmt in DATETIME_FORMATS:
+        if pd.to_datetime(sample, format=fmt, errors="coerce").notna().all():
+            return fmt
+    return None
+
+
+def _downcast(series: pd.Series) -> pd.Series:
+    """
+    Integers -> int32 when they fit; floats -> float32 only when the
+    round trip is exact (reported values must not change). Nothing goes
+    below 32 bits: int8/int16 wrap in ordinary pandas arithmetic (x ** 3).
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        narrow = pd.to_numeric(series, downcast="integer")
+        if narrow.dtype.itemsize < 4:
+            narrow = narrow.astype("int32" if narrow.dtype.kind == "i" else "uint32")
+        return narrow
+
+    values = series.to_numpy(dtype="float64")
+    narrow = values.astype("float32")
+    if np.array_equal(narrow.astype("float64"), values, equal_nan=True):
+        return pd.Series(narrow, index=series.index, name=series.name)
+    return series
+
+
+def ingest_frame(df: pd.DataFrame, threshold: float = 0.9, downcast: bool = True) -> pd.DataFrame:
+    """
+    Typed copy of a freshly read frame:
+
+    - timestamp strings -> datetime64 (format detected on a sample, then one
+      vectorized to_datetime over the column)
+    - numeric strings -> numbers
+    - numerics downcast where lossless
+    - column names stripped of BOM / surrounding whitespace
+
+    Already-typed columns pass through, so ingesting twice is cheap.
+    """
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        name = str(col).lstrip("\ufeff").strip()
+
+        if pd.api.types.is_datetime64_any_dtype(series):
+            out[name] = series
+            continue
+
+        if pd.api.types.is_numeric_dtype(series):
+            out[name] = _downcast(series) if downcast else series
+            continue
+
+        converted = series
+        non_null = max(int(series.notna().sum()), 1)
+
+        fmt = detect_datetime_format(series)
+        if fmt is not None:
+            parsed = pd.to_datetime(series, format=fmt, errors="coerce")
+            if parsed.notna().sum() / non_null >= threshold:
+                converted = parsed
+        else:
+            numeric = pd.to_numeric(series, errors="coerce")
+            if numeric.notna().sum() / non_null >= threshold:
+                converted = _downcast(numeric) if downcast else numeric
+
+        out[name] = converted
+
+    return pd.DataFrame(out, index=df.index)
+
+
+def needs_ingest(df: pd.DataFrame, threshold: float = 0.9, sample_size: int = 200) -> bool:
+    """
+    Whether ingest_frame would change anything beyond downcasting: a column
+    name to clean, or a text column whose sample parses as timestamps or
+    numbers. Already-ingested frames can then be used without a copy.
+    """
+    for col in df.columns:
+        series = df[col]
+        if str(col).lstrip("\ufeff").strip() != col:
+            return True
+        if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+            continue
+        if detect_datetime_format(series, sample_size) is not None:
+            return True
+        sample = series.dropna().head(sample_size)
+        if len(sample) and pd.to_numeric(sample, errors="coerce").notna().mean() >= threshold:
+            return True
+    return False
+
+
+def sql_type(dtype) -> str:
+    """
+    Column type as declared to SQLite and reported in the SQL prompt.
+    """
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "TIMESTAMP"
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+# --------------------------------------------------
+# QUERY LITERALS
+# --------------------------------------------------
+_LITERAL_RE = re.compile(r"'(\d{1,4}[-/]\d{1,2}[-/]\d{1,4}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?)'")
+
+
+def normalize_datetime_literals(sql: str) -> str:
+    """
+    Rewrite quoted timestamps written in a source format ('31-12-2024 08:00')
+    to the stored one ('2024-12-31 08:00:00'), so comparisons against
+    TIMESTAMP columns are chronological and can use their index.
+    Date-only literals stay date-only.
+    """
+
+    def _replace(match):
+        text = match.group(1)
+        for fmt in DATETIME_FORMATS:
+            try:
+                ts = pd.to_datetime(text, format=fmt)
+            except (ValueError, TypeError):
+                continue
+            out = ts.strftime("%Y-%m-%d" if "%H" not in fmt else SQL_DATETIME_FORMAT)
+            return f"'{out}'"
+        return match.group(0)
+
+    return _LITERAL_RE.sub(_replace, sql)
@@ -0,0 +1,336 @@
+# llm/models/json_constraint.py
+import re
+import json
+import threading
+
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+
+# --------------------------------------------------
+# SCHEMA
+# --------------------------------------------------
+# dict            -> object; any subset of these keys, each at most once
+# [item]          -> array of item
+# tuple of str    -> string enum
+# "string" / "number" / "any" (string or number) -> scalar
+MAX_WS = 32           # whitespace run between tokens
+MAX_STRING = 400      # characters in one string value
+MAX_NUMBER = 24
+
+_WS = " \t\n\r"
+_NUMBER_RE = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?$")
+
+
+class JsonState:
+    """
+    Incremental validator for a JSON prefix against a schema.
+    `feed(text)` returns False as soon as `text` cannot continue a document
+    the schema accepts; `done` once the top-level value has closed.
+    """
+
+    __slots__ = ("stack", "mode", "expect", "buf", "escape", "ws", "is_key", "enum")
+
+    def __init__(self, schema):
+        self.stack = []        # ("obj", schema, used keys, current key) | ("arr", item schema)
+        self.mode = "value"
+        self.expect = schema
+        self.buf = ""
+        self.escape = False
+        self.ws = 0
+        self.is_key = False
+        self.enum = None
+
+    def clone(self) -> "JsonState":
+        new = object.__new__(JsonState)
+        for name in self.__slots__:
+            setattr(new, name, getattr(self, name))
+        new.stack = list(self.stack)
+        return new
+
+    @property
+    def done(self) -> bool:
+        return self.mode == "done"
+
+    def feed(self, text: str) -> bool:
+        for ch in text:
+            if not self._step(ch):
+                return False
+        return True
+
+    def closing(self):
+        """
+        Suffix that closes a truncated document validly, or None when the
+        cut falls inside a key.
+        """
+        if self.mode == "done":
+            return ""
+        suffix = ""
+        if self.mode == "string":
+            if self.is_key:
+                return None
+            suffix = "\\" * self.escape + '"'
+        elif self.mode == "number":
+            if not _NUMBER_RE.match(self.buf):
+                return None
+        elif self.mode not in ("after", "obj_start", "arr_start"):
+            return None
+        for frame in reversed(self.stack):
+            suffix += "}" if frame[0] == "obj" else "]"
+        return suffix
+
+    # ------------------------------------------------
+    # TRANSITIONS
+    # ------------------------------------------------
+    def _step(self, ch: str) -> bool:
+        mode = self.mode
+        if mode == "string":
+            return self._string(ch)
+        if mode == "number":
+            if ch in "0123456789.eE+-":
+                self.buf += ch
+                return len(self.buf) <= MAX_NUMBER
+            if not _NUMBER_RE.match(self.buf):
+                return False
+            self._end_value()
+            return self._step(ch)
+
+        if ch in _WS:
+            self.ws += 1
+            return mode != "done" and self.ws <= MAX_WS
+        self.ws = 0
+
+        if mode == "value":
+            return self._start_value(ch)
+        if mode == "obj_start":
+            return self._close() if ch == "}" else self._start_key(ch)
+        if mode == "key":
+            return self._start_key(ch)
+        if mode == "colon":
+            if ch != ":":
+                return False
+            frame = self.stack[-1]
+            self.expect = frame[1][frame[3]]
+            self.mode = "value"
+            return True
+        if mode == "arr_start":
+            if ch == "]":
+                return self._close()
+            self.expect = self.stack[-1][1]
+            return self._start_value(ch)
+        if mode == "after":
+            frame = self.stack[-1]
+            if ch == ",":
+                if frame[0] == "obj":
+                    if len(frame[2]) == len(frame[1]):
+                        return False
+                    self.mode = "key"
+                else:
+                    self.expect = frame[1]
+                    self.mode = "value"
+                return True
+            if ch == ("}" if frame[0] == "obj" else "]"):
+                return self._close()
+        return False
+
+    def _start_value(self, ch: str) -> bool:
+        schema = self.expect
+        if isinstance(schema, dict):
+            if ch != "{":
+                return False
+            self.stack.append(("obj", schema, frozenset(), None))
+            self.mode = "obj_start"
+            return True
+        if isinstance(schema, list):
+            if ch != "[":
+                return False
+            self.stack.append(("arr", schema[0]))
+            self.mode = "arr_start"
+            return True
+        if ch == '"' and (schema in ("string", "any") or isinstance(schema, tuple)):
+            self.mode, self.buf, self.is_key = "string", "", False
+            self.enum = schema if isinstance(schema, tuple) else None
+            return True
+        if ch in "-0123456789" and schema in ("number", "any"):
+            self.mode, self.buf = "number", ch
+            return True
+        return False
+
+    def _start_key(self, ch: str) -> bool:
+        if ch != '"':
+            return False
+        self.mode, self.buf, self.is_key, self.enum = "string", "", True, None
+        return True
+
+    def _string(self, ch: str) -> bool:
+        constrained = self.is_key or self.enum is not None
+        if self.escape:
+            self.escape = False
+            return ch in '"\\/bfnrtu'
+        if ch == "\\":
+            self.escape = True
+            return not constrained
+        if ch == '"':
+            return self._end_string()
+        if ord(ch) < 0x20:
+            return False
+
+        self.buf += ch
+        if not constrained:
+            return len(self.buf) <= MAX_STRING
+        return any(option.startswith(self.buf) for option in self._options())
+
+    def _options(self):
+        if self.is_key:
+            frame = self.stack[-1]
+            return [k for k in frame[1] if k not in frame[2]]
+        return self.enum
+
+    def _end_string(self) -> bool:
+        if self.is_key:
+            frame = self.stack[-1]
+            if self.buf not in self._options():
+                return False
+            self.stack[-1] = ("obj", frame[1], frame[2] | {self.buf}, self.buf)
+            self.mode = "colon"
+            return True
+        if self.enum is not None and self.buf not in self.enum:
+            return False
+        self._end_value()
+        return True
+
+    def _end_value(self):
+        self.buf = ""
+        self.mode = "after" if self.stack else "done"
+
+    def _close(self) -> bool:
+        self.stack.pop()
+        self._end_value()
+        return True
+
+
+# --------------------------------------------------
+# GENERATION HOOKS
+# --------------------------------------------------
+_vocab = {}
+_vocab_lock = threading.Lock()
+
+
+def token_texts(tokenizer) -> list:
+    """
+    Decoded text per token id (None for special tokens and byte fragments),
+    computed once per tokenizer.
+    """
+    key = getattr(tokenizer, "name_or_path", None) or id(tokenizer)
+    with _vocab_lock:
+        if key not in _vocab:
+            special = set(tokenizer.all_special_ids) | set(getattr(tokenizer, "added_tokens_decoder", {}))
+            texts = []
+            for i in range(len(tokenizer)):
+                text = None if i in special else tokenizer.decode([i])
+                texts.append(None if not text or "\ufffd" in text else text)
+            _vocab[key] = texts
+        return _vocab[key]
+
+
+class JsonLogitsProcessor(LogitsProcessor):
+    """
+    Masks every token that cannot continue a schema-valid JSON document.
+
+    Only the `top_k` most likely tokens are checked each step (then
+    `wide_k` if none of them fits), so the cost is a few dozen prefix
+    checks per token. Once a row's top-level object closes only EOS is
+    allowed. A row where nothing fits is released unconstrained.
+    """
+
+    def __init__(self, token_texts: list, schema, eos_token_ids, top_k: int = 48, wide_k: int = 1024):
+        self.texts = token_texts
+        self.schema = schema
+        self.eos = set(eos_token_ids)
+        self.top_k = top_k
+        self.wide_k = wide_k
+        self.states = None
+        self._seen = 0  # sequence length already fed to the states
+
+    def sync(self, input_ids):
+        """
+        Feed the newest token of every row (called by both the processor and
+        JsonStop; each token is fed once).
+        """
+        if self.states is None:
+            self.states = [JsonState(self.schema) for _ in range(input_ids.shape[0])]
+            self._seen = input_ids.shape[1]
+            return
+        if input_ids.shape[1] <= self._seen:
+            return
+        self._seen = input_ids.shape[1]
+
+        for row, token in enumerate(input_ids[:, -1].tolist()):
+            state = self.states[row]
+            if state is None or state.done or token in self.eos:
+                continue
+            text = self.texts[token] if token < len(self.texts) else None
+            if text is None or not state.feed(text):
+                self.states[row] = None
+
+    def _allowed(self, state, scores, k):
+        k = min(k, scores.shape[-1])
+        allowed = []
+        for token in scores.topk(k).indices.tolist():
+            text = self.texts[token] if token < len(self.texts) else None
+            if text is not None and state.clone().feed(text):
+                allowed.append(token)
+        return allowed
+
+    def __call__(self, input_ids, scores):
+        self.sync(input_ids)
+
+        masked = torch.full_like(scores, float("-inf"))
+        for row, state in enumerate(self.states):
+            if state is None:
+                masked[row] = scores[row]
+                continue
+            if state.done:
+                allowed = list(self.eos)
+            else:
+                allowed = self._allowed(state, scores[row], self.top_k) or self._allowed(
+                    state, scores[row], self.wide_k
+                )
+            if not allowed:
+                self.states[row] = None
+                masked[row] = scores[row]
+                continue
+            masked[row, allowed] = scores[row, allowed]
+        return masked
+
+    def finish(self, row: int, text: str):
+        """
+        Parsed dict for one decoded row: truncated output is closed with
+        the validator's pending brackets; None if it still does not parse.
+        """
+        state = self.states[row] if self.states else None
+        if state is not None and not state.done:
+            suffix = state.closing()
+            text = text.rstrip() + suffix if suffix is not None else text
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+
+class JsonStop(StoppingCriteria):
+    """
+    Stops each row as soon as its top-level JSON object closes.
+    """
+
+    def __init__(self, processor: JsonLogitsProcessor):
+        self.processor = processor
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.processor.states is None:
+            return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        # the token sampled this step has not been seen by the processor yet
+        self.processor.sync(input_ids)
+        done = [state is not None and state.done for state in self.processor.states]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
@@ -1,11 +1,17 @@
 # llm/models/mistral_client.py
+import inspect
+import threading
 import torch
 from transformers import (
     AutoTokenizer,
     AutoModelForCausalLM,
     BitsAndBytesConfig,
+    TextIteratorStreamer,
 )
 
+from llm.models.batching import MicroBatcher
+from llm.models.prefix_cache import PrefixKVCache, seq_length
+
 
 class MistralClient:
     """
@@ -16,12 +22,22 @@ class MistralClient:
     - interpretation of tool outputs
 
     LangGraph-safe (NO HuggingFacePipeline)
+
+    Concurrent calls are coalesced by a MicroBatcher into a single
+    left-padded `model.generate` (max_batch_size=1 disables batching).
+
+    Single prompts that start with a registered template prefix (see
+    llm.models.prefix_cache) reuse that prefix's KV cache and prefill only
+    the variable suffix; prefix_cache_mb=0 disables it.
     """
 
     def __init__(
         self,
         model_id: str = "mistralai/Mistral-7B-Instruct-v0.2",
         dtype=torch.float16,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        prefix_cache_mb: float = 256,
     ):
         bnb_config = BitsAndBytesConfig(
             load_in_4bit=True,
@@ -40,19 +56,59 @@ class MistralClient:
         if self.tokenizer.pad_token is None:
             self.tokenizer.pad_token = self.tokenizer.eos_token
 
+        # decoder-only batching: pad on the left so every row ends at the
+        # same position and generation continues from real tokens
+        self.tokenizer.padding_side = "left"
+
+        self._model_params = None  # forward() parameter names, read lazily
+        self.prefix_cache = None
+        if prefix_cache_mb:
+            self.prefix_cache = PrefixKVCache(
+                self.model,
+                self.tokenizer,
+                max_bytes=int(prefix_cache_mb * 1024**2),
+            )
+
+        self.batcher = None
+        self.classifier = None
+        if max_batch_size > 1:
+            self.batcher = MicroBatcher(
+                self.generate_batch,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms,
+            )
+            self.classifier = MicroBatcher(
+                self.classify_batch,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms,
+            )
+
     # --------------------------------------------------
     # INTERNAL GENERATION CORE
     # --------------------------------------------------
-    def _generate(
+    def _prefix_kwargs(self, prompts: list, inputs) -> dict:
+        # left padding shifts a shared prefix per row, so only unbatched
+        # prompts can start from a cached prefix
+        if self.prefix_cache is None or len(prompts) != 1:
+            return {}
+        return self.prefix_cache.generate_kwargs(prompts[0], inputs["input_ids"])
+
+    def generate_batch(
         self,
-        prompt: str,
-        max_new_tokens: int,
-        temperature: float,
-        do_sample: bool,
-    ) -> str:
+        prompts: list,
+        max_new_tokens: int = 512,
+        temperature: float = 0.2,
+        do_sample: bool = True,
+    ) -> list:
+        """
+        One `model.generate` over many prompts.
+        Rows stop independently at EOS (finished rows are padded), and each
+        completion is sliced at the padded prompt length.
+        """
         inputs = self.tokenizer(
-            prompt,
+            prompts,
             return_tensors="pt",
+            padding=True,
         ).to(self.model.device)
 
         with torch.no_grad():
@@ -61,24 +117,47 @@ class MistralClient:
                 max_new_tokens=max_new_tokens,
                 temperature=temperature,
                 do_sample=do_sample,
-                pad_token_id=self.tokenizer.eos_token_id,
+                pad_token_id=self.tokenizer.pad_token_id,
+                eos_token_id=self.tokenizer.eos_token_id,
+                **self._prefix_kwargs(prompts, inputs),
             )
 
-        decoded = self.tokenizer.decode(
-            output_ids[0],
-            skip_special_tokens=True,
-        )
+        # Return ONLY the generated completions
+        completions = output_ids[:, inputs["input_ids"].shape[1]:]
+        return [
+            text.strip()
+            for text in self.tokenizer.batch_decode(
+                completions,
+                skip_special_tokens=True,
+            )
+        ]
 
-        # Return ONLY the generated completion
-        return decoded[len(prompt):].strip()
+    def _generate(
+        self,
+        prompt: str,
+        max_new_tokens: int,
+        temperature: float,
+        do_sample: bool,
+    ) -> str:
+        kwargs = dict(
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            do_sample=do_sample,
+        )
+        if self.batcher is not None:
+            return self.batcher(prompt, **kwargs)
+        return self.generate_batch([prompt], **kwargs)[0]
 
     # --------------------------------------------------
     # ROUTING (classifier-style)
     # --------------------------------------------------
-    def route(self, prompt: str) -> str:
+    def route(self, prompt: str, labels=None) -> str:
         """
         Deterministic, short output.
+        With `labels`, the closed-set label chosen by `classify` (no decoding).
         """
+        if labels:
+            return self.classify(prompt, labels)[0]
         return self._generate(
             prompt=prompt,
             max_new_tokens=32,
@@ -86,6 +165,131 @@ class MistralClient:
             do_sample=False,
         ).lower()
 
+    def classify(self, prompt, labels) -> tuple:
+        """
+        (label, confidence) for one prompt; concurrent calls with the same
+        label set are batched into one forward pass.
+        """
+        if hasattr(prompt, "to_string"):
+            prompt = prompt.to_string()
+        labels = tuple(labels)
+        if self.classifier is not None:
+            return self.classifier(prompt, labels=labels)
+        return self.classify_batch([prompt], labels)[0]
+
+    def classify_batch(self, prompts: list, labels) -> list:
+        """
+        Closed-set classification by label likelihood, one (label, confidence)
+        per prompt. confidence = the label's probability renormalized over
+        `labels`.
+
+        If the labels differ in their first token, a single prefill of the
+        prompts suffices: the next-token log-probabilities are compared.
+        Otherwise every prompt + label continuation is scored in one batched
+        forward pass (sum of the label tokens' log-probabilities).
+        """
+        labels = list(labels)
+        rows = [self._label_ids(p, labels) for p in prompts]
+
+        if all(len({ids[0] for ids in label_ids}) == len(labels) for _, label_ids in rows):
+            scores = self._next_token_scores(prompts, rows)
+        else:
+            scores = self._sequence_scores(rows)
+
+        results = []
+        for row in scores:
+            probs = torch.softmax(row.float(), dim=0)
+            best = int(probs.argmax())
+            results.append((labels[best], round(float(probs[best]), 4)))
+        return results
+
+    def _label_ids(self, prompt: str, labels: list):
+        """
+        Prompt token ids and each label's continuation ids, tokenized in
+        context (SentencePiece merges the boundary differently than the
+        label alone).
+        """
+        base = self.tokenizer(prompt)["input_ids"]
+        label_ids = []
+        for label in labels:
+            ids = self.tokenizer(prompt + label)["input_ids"]
+            if ids[: len(base)] != base:
+                ids = base + self.tokenizer(label, add_special_tokens=False)["input_ids"]
+            label_ids.append(ids[len(base):])
+        return base, label_ids
+
+    def _forward(self, sequences: list, keep: int):
+        """
+        Log-probabilities at the last `keep` positions of one left-padded
+        forward pass over `sequences` ([B, keep, V]). Only those positions
+        are scored: a float log_softmax over every prompt position would
+        cost B * T * V * 4 bytes.
+        """
+        width = max(len(ids) for ids in sequences)
+        pad = self.tokenizer.pad_token_id
+        input_ids = torch.tensor([[pad] * (width - len(ids)) + ids for ids in sequences])
+        mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in sequences])
+        positions = (mask.cumsum(-1) - 1).clamp(min=0)
+
+        # newer transformers skip the LM head for the other positions too
+        kwargs = {"logits_to_keep": keep} if "logits_to_keep" in self._forward_params() else {}
+        with torch.no_grad():
+            logits = self.model(
+                input_ids=input_ids.to(self.model.device),
+                attention_mask=mask.to(self.model.device),
+                position_ids=positions.to(self.model.device),
+                **kwargs,
+            ).logits
+        return torch.log_softmax(logits[:, -keep:].float(), dim=-1)
+
+    def _forward_params(self):
+        if self._model_params is None:
+            self._model_params = set(inspect.signature(self.model.forward).parameters)
+        return self._model_params
+
+    def _next_token_scores(self, prompts: list, rows: list) -> list:
+        first = [[ids[0] for ids in label_ids] for _, label_ids in rows]
+
+        if len(prompts) == 1 and self.prefix_cache is not None:
+            # a single routing prompt: prefill only the part after the template prefix
+            input_ids = torch.tensor([rows[0][0]])
+            prefix = self.prefix_cache.generate_kwargs(prompts[0], input_ids)
+            if prefix:
+                n = seq_length(prefix["past_key_values"])
+                with torch.no_grad():
+                    logits = self.model(
+                        input_ids=input_ids[:, n:].to(self.model.device),
+                        past_key_values=prefix["past_key_values"],
+                        use_cache=True,
+                    ).logits
+                logprobs = torch.log_softmax(logits[0, -1].float(), dim=-1)
+                return [logprobs[first[0]]]
+
+        logprobs = self._forward([base for base, _ in rows], keep=1)[:, -1]
+        return [logprobs[i, ids] for i, ids in enumerate(first)]
+
+    def _sequence_scores(self, rows: list) -> list:
+        sequences, spans = [], []
+        for base, label_ids in rows:
+            for ids in label_ids:
+                sequences.append(base + ids)
+                spans.append((len(base), len(ids)))
+
+        # every sequence ends with its label: label token j is predicted at
+        # position -(n + 1) + j, so the last max(n) + 1 positions suffice
+        keep = max(n for _, n in spans) + 1
+        logprobs = self._forward(sequences, keep)
+
+        totals = []
+        for r, (seq, (start, n)) in enumerate(zip(sequences, spans)):
+            positions = torch.arange(keep - 1 - n, keep - 1)
+            targets = torch.tensor(seq[start:], device=logprobs.device)
+            totals.append(logprobs[r, positions, targets].sum())
+
+        n_labels = len(rows[0][1])
+        totals = torch.stack(totals).view(len(rows), n_labels)
+        return list(totals)
+
     # --------------------------------------------------
     # ANSWER / INTERPRETATION
     # --------------------------------------------------
@@ -103,16 +307,72 @@ class MistralClient:
             do_sample=True,
         )
 
-    # --- add at bottom of file ---
+    # --------------------------------------------------
+    # STREAMING
+    # --------------------------------------------------
+    def stream(
+        self,
+        prompt,
+        max_new_tokens: int = 512,
+        temperature: float = 0.2,
+        do_sample: bool = True,
+    ):
+        """
+        Yields completion text as tokens are produced.
+        Accepts a string or a LangChain PromptValue.
+        Not batched: the decode runs on its own thread for this caller.
+        """
+        if hasattr(prompt, "to_string"):
+            prompt = prompt.to_string()
+
+        inputs = self.tokenizer(
+            prompt,
+            return_tensors="pt",
+        ).to(self.model.device)
+        prefix_kwargs = self._prefix_kwargs([prompt], inputs)
+
+        streamer = TextIteratorStreamer(
+            self.tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True,
+        )
+
+        errors = []
 
-    _mistral_instance = None
+        def _run():
+            try:
+                with torch.no_grad():
+                    self.model.generate(
+                        **inputs,
+                        max_new_tokens=max_new_tokens,
+                        temperature=temperature,
+                        do_sample=do_sample,
+                        pad_token_id=self.tokenizer.pad_token_id,
+                        streamer=streamer,
+                        **prefix_kwargs,
+                    )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                streamer.end()  # a failed generate never ends the stream itself
 
+        worker = threading.Thread(target=_run, daemon=True)
+        worker.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            worker.join()
+        if errors:
+            raise errors[0]
 
-    def get_mistral():
-        """
-        Lazy-loaded singleton for MistralClient.
-        """
-        global _mistral_instance
-        if _mistral_instance is None:
-            _mistral_instance = MistralClient()
-        return _mistral_instance
+
+
+def get_mistral():
+    """
+    Lazy-loaded MistralClient, owned by the model manager.
+    """
+    from llm.models.model_manager import get_manager
+
+    return get_manager().get("mistral")
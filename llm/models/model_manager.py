@@ -0,0 +1,376 @@
+# llm/models/model_manager.py
+import gc
+import inspect
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import torch
+
+
+# route decided by the router -> model the next node will need
+ROUTE_MODELS = {
+    "sql": "sqlcoder",
+    "generate_sql": "sqlcoder",
+    "vision": "qwen",
+    "extract_from_image": "qwen",
+}
+
+
+class _Entry:
+    def __init__(self, name, factory, footprint_gb, client_class=None, cpu=None):
+        self.name = name
+        self.factory = factory
+        self.footprint_gb = footprint_gb   # declared; replaced by measured on load
+        # class (or zero-arg callable returning it): tells the proxy which
+        # attributes are methods before anything is loaded
+        self.client_class = client_class or (factory if inspect.isclass(factory) else None)
+        self.cpu_factory = cpu             # model-free companion for CPU-only methods
+        self.cpu = None
+        self.client = None
+        self.on_gpu = False
+        self.moving = None                 # Event while loading / swapping in / evicting
+        self.pins = 0                      # in-flight calls; pinned models are never evicted
+        self.stats = {"cold_loads": 0, "cold_load_s": 0.0, "swaps_in": 0, "swap_in_s": 0.0,
+                      "evictions": 0, "evict_s": 0.0}
+
+
+class ModelManager:
+    """
+    Central owner of the GPU-resident models.
+
+    - models are registered with a factory + footprint and loaded lazily
+    - resident footprint is kept under `budget_gb`; the least-recently-used
+      model is offloaded to CPU (policy="offload") or dropped (policy="unload")
+    - `prefetch` loads in the background (e.g. after the router decides)
+    - models in use (see `use`) are pinned and never evicted mid-call
+    - loads, swaps and evictions run outside the manager lock; a caller
+      only waits on the model it asked for (its `moving` event)
+    - cold-load / swap / eviction timings are recorded per model
+    """
+
+    def __init__(self, budget_gb: float = 22.0, policy: str = "offload"):
+        self.budget_gb = budget_gb
+        self.policy = policy
+        self._entries = {}
+        self._resident = OrderedDict()     # name -> None, LRU order of GPU residents
+        self._lock = threading.RLock()
+
+    # --------------------------------------------------
+    # REGISTRY
+    # --------------------------------------------------
+    def register(self, name: str, factory, footprint_gb: float, client_class=None, cpu=None):
+        """
+        cpu: optional factory of a companion object whose methods need no
+        GPU (e.g. SQL execution); proxies call those without loading `name`.
+        """
+        with self._lock:
+            self._entries[name] = _Entry(name, factory, footprint_gb, client_class, cpu)
+
+    def resident_gb(self) -> float:
+        # includes models still loading: their memory is already reserved
+        return sum(self._entries[n].footprint_gb for n in self._resident)
+
+    # --------------------------------------------------
+    # ACCESS
+    # --------------------------------------------------
+    def get(self, name: str):
+        entry = self._entries[name]
+
+        while True:
+            with self._lock:
+                if entry.on_gpu:
+                    self._resident.move_to_end(name)
+                    return entry.client
+                moving = entry.moving
+                if moving is None:
+                    # this caller loads: reserve the footprint, pick victims, then unlock
+                    moving = entry.moving = threading.Event()
+                    self._resident[name] = None
+                    victims = self._pick_victims(entry)
+                    break
+            moving.wait()  # another thread is loading / evicting it: check again
+
+        try:
+            for victim in victims:
+                self._evict(victim)
+            self._load(entry)
+        except BaseException:
+            with self._lock:
+                self._resident.pop(name, None)
+            raise
+        else:
+            with self._lock:
+                entry.on_gpu = True
+        finally:
+            with self._lock:
+                entry.moving = None
+            moving.set()
+        return entry.client
+
+    def _load(self, entry: _Entry):
+        start = time.perf_counter()
+        if entry.client is None:
+            before = self._allocated_gb()
+            client = entry.factory()
+            measured = self._allocated_gb() - before
+            with self._lock:
+                entry.client = client
+                if measured > 0:
+                    entry.footprint_gb = measured
+                entry.stats["cold_loads"] += 1
+                entry.stats["cold_load_s"] += time.perf_counter() - start
+        else:
+            self._move(entry.client, "cuda")
+            with self._lock:
+                entry.stats["swaps_in"] += 1
+                entry.stats["swap_in_s"] += time.perf_counter() - start
+
+    def client(self, name: str):
+        """
+        The client wherever it currently lives (loaded on first use);
+        for attributes that need no GPU, such as the tokenizer.
+        """
+        entry = self._entries[name]
+        if entry.client is not None:
+            return entry.client
+        return self.get(name)
+
+    def _client_class(self, name: str):
+        entry = self._entries[name]
+        cls = type(entry.client) if entry.client is not None else entry.client_class
+        if cls is not None and not inspect.isclass(cls):
+            cls = entry.client_class = cls()  # lazy import
+        return cls
+
+    def is_method(self, name: str, attr: str) -> bool:
+        """
+        Whether `attr` is a method of the client, decided from its class so
+        nothing is loaded to find out (unless the class is unknown).
+        """
+        cls = self._client_class(name)
+        if cls is None:
+            return inspect.ismethod(getattr(self.client(name), attr))
+        return callable(getattr(cls, attr, None))
+
+    def is_generator(self, name: str, attr: str) -> bool:
+        """
+        Whether `attr` is a generator method (e.g. `stream`), which must stay
+        pinned until it is exhausted, not just until it returns.
+        """
+        cls = self._client_class(name)
+        fn = getattr(cls if cls is not None else self.client(name), attr, None)
+        return inspect.isgeneratorfunction(fn)
+
+    def cpu_companion(self, name: str):
+        entry = self._entries[name]
+        if entry.cpu_factory is None:
+            return None
+        with self._lock:
+            if entry.cpu is None:
+                entry.cpu = entry.cpu_factory()
+            return entry.cpu
+
+    @contextmanager
+    def use(self, name: str):
+        """
+        Pin a model for the duration of a call.
+        """
+        entry = self._entries[name]
+        while True:
+            client = self.get(name)
+            with self._lock:
+                if entry.on_gpu:  # not evicted between get() and here
+                    entry.pins += 1
+                    break
+        try:
+            yield client
+        finally:
+            with self._lock:
+                entry.pins -= 1
+
+    def prefetch(self, name: str):
+        """
+        Load `name` on a background thread; a concurrent `get` of the same
+        model waits for that load, other models stay usable meanwhile.
+        """
+        entry = self._entries.get(name)
+        if entry is None or entry.on_gpu:
+            return
+        threading.Thread(target=self.get, args=(name,), daemon=True).start()
+
+    def prefetch_for_route(self, decision: str):
+        name = ROUTE_MODELS.get(decision)
+        if name is not None:
+            self.prefetch(name)
+
+    def proxy(self, name: str):
+        return _ModelProxy(self, name)
+
+    # --------------------------------------------------
+    # EVICTION
+    # --------------------------------------------------
+    def _pick_victims(self, incoming: _Entry) -> list:
+        """
+        Under the lock: take LRU models off the resident set until `incoming`
+        (already reserved) fits. They are marked moving and offloaded by the
+        caller after the lock is released.
+        """
+        victims = []
+        while self.resident_gb() > self.budget_gb:
+            candidates = [
+                n for n in self._resident
+                if n != incoming.name
+                and self._entries[n].pins == 0
+                and self._entries[n].moving is None
+            ]
+            if not candidates:
+                break  # everything else is mid-call or mid-load: run over budget
+            victim = self._entries[candidates[0]]
+            victim.on_gpu = False
+            victim.moving = threading.Event()
+            del self._resident[victim.name]
+            victims.append(victim)
+        return victims
+
+    def _evict(self, victim: _Entry):
+        start = time.perf_counter()
+        try:
+            offloaded = False
+            if self.policy == "offload":
+                offloaded = self._move(victim.client, "cpu")
+            if not offloaded:
+                victim.client = None
+                gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        finally:
+            with self._lock:
+                victim.stats["evictions"] += 1
+                victim.stats["evict_s"] += time.perf_counter() - start
+                moving, victim.moving = victim.moving, None
+            moving.set()
+
+    @staticmethod
+    def _move(client, device: str) -> bool:
+        """
+        Move a client's model between devices. Quantized (bitsandbytes)
+        weights and models dispatched with device_map (accelerate hooks,
+        `hf_device_map`) cannot be moved; callers fall back to unloading.
+        """
+        model = getattr(client, "model", None)
+        if model is None or getattr(model, "is_quantized", False):
+            return False
+        if getattr(model, "hf_device_map", None):
+            return False
+        try:
+            model.to(device)
+        except (RuntimeError, ValueError):
+            return False
+        return True
+
+    @staticmethod
+    def _allocated_gb() -> float:
+        if not torch.cuda.is_available():
+            return 0.0
+        return torch.cuda.memory_allocated() / 1024 ** 3
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: dict(
+                    e.stats,
+                    footprint_gb=round(e.footprint_gb, 2),
+                    on_gpu=e.on_gpu,
+                    loaded=e.client is not None,
+                )
+                for name, e in self._entries.items()
+            }
+
+
+class _ModelProxy:
+    """
+    Stand-in passed to graph nodes. Methods resolve the model through the
+    manager only when called, pinned for the call (generator methods such
+    as `stream` until the generator is exhausted or closed); methods of the
+    CPU companion (see ModelManager.register) never touch the model.
+    """
+
+    def __init__(self, manager: ModelManager, name: str):
+        self._manager = manager
+        self._name = name
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+
+        companion = self._manager.cpu_companion(self._name)
+        if companion is not None and hasattr(companion, attr):
+            return getattr(companion, attr)
+
+        if not self._manager.is_method(self._name, attr):
+            return getattr(self._manager.client(self._name), attr)
+
+        if self._manager.is_generator(self._name, attr):
+
+            def _pinned_stream(*args, **kwargs):
+                with self._manager.use(self._name) as client:
+                    yield from getattr(client, attr)(*args, **kwargs)
+
+            return _pinned_stream
+
+        def _pinned(*args, **kwargs):
+            with self._manager.use(self._name) as client:
+                return getattr(client, attr)(*args, **kwargs)
+
+        return _pinned
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager() -> ModelManager:
+    """
+    Lazy-loaded singleton with the three project models registered.
+    Footprints are starting estimates; real usage is measured on load.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ModelManager()
+
+            # client classes are imported lazily (transformers is heavy)
+            def _mistral_class():
+                from llm.models.mistral_client import MistralClient
+                return MistralClient
+
+            def _sqlcoder_class():
+                from llm.models.sqlcoder_client import SQLCoderClient
+                return SQLCoderClient
+
+            def _qwen_class():
+                from llm.models.qwen_client import QwenClient
+                return QwenClient
+
+            def _qwen():
+                from llm.models.vision_cache import VisionCache
+                return _qwen_class()(
+                    cache=VisionCache(disk_dir="input/cache/vision", use_phash=True),
+                )
+
+            def _sql_executor():
+                from llm.models.sql_engine import get_executor
+                return get_executor("sqlite")
+
+            _manager.register(
+                "mistral", lambda: _mistral_class()(), footprint_gb=4.5,
+                client_class=_mistral_class,
+            )
+            _manager.register(
+                "sqlcoder", lambda: _sqlcoder_class()(), footprint_gb=14.0,
+                client_class=_sqlcoder_class, cpu=_sql_executor,
+            )
+            _manager.register("qwen", _qwen, footprint_gb=16.5, client_class=_qwen_class)
+    return _manager
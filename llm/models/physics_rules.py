@@ -0,0 +1,333 @@
+# llm/models/physics_rules.py
+import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# role -> predicate on the normalized column name
+ROLES = OrderedDict(
+    deviation=lambda n: "deviation" in n,
+    power=lambda n: "power" in n and "deviation" not in n,
+    speed=lambda n: "speed" in n or n.endswith("stw"),
+    rpm=lambda n: "rpm" in n,
+    draft=lambda n: "draft" in n,
+)
+
+# rule id -> (required roles, what a flag means); ids follow Relations.json
+RULES = OrderedDict(
+    law_cubic_speed=(("power", "speed"), "Power off the cubic speed law (P ~ V^3) for its draft band"),
+    law_cubic_rpm=(("power", "rpm"), "Power off the propeller law (P ~ RPM^3) for its draft band"),
+    law_speed_rpm=(("speed", "rpm"), "Speed off the linear speed-RPM fit"),
+    phys_001=(("power", "speed", "draft"), "Physics Violation: draft up but power down at constant speed"),
+    phys_002=(("speed", "rpm"), "Sensor Mismatch: speed and RPM moved in opposite directions"),
+    data_001=(("speed", "power"), "Speed Sensor Error: speed jump without a power change"),
+    data_002=(("power", "speed"), "Pattern Shift: cubic-law residual level shifted"),
+    maint_003=(("deviation",), "Suspected Maintenance: sudden drop in power deviation"),
+)
+
+
+def _norm(name) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+def resolve_roles(df: pd.DataFrame) -> dict:
+    """
+    role -> column, for numeric columns only (first match wins).
+    """
+    roles = {}
+    numeric = df.select_dtypes("number").columns
+    for role, matches in ROLES.items():
+        for col in numeric:
+            if col not in roles.values() and matches(_norm(col)):
+                roles[role] = col
+                break
+    return roles
+
+
+def _timestamp_column(df: pd.DataFrame):
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col
+    return None
+
+
+def _onset(flag: np.ndarray) -> np.ndarray:
+    """
+    Keep only the first row of each flagged run (level-shift rules).
+    """
+    return flag & ~np.r_[False, flag[:-1]]
+
+
+def _robust_sigma(x: np.ndarray) -> float:
+    x = x[~np.isnan(x)]
+    if not len(x):
+        return np.inf
+    return float(1.4826 * np.median(np.abs(x - np.median(x)))) or np.inf
+
+
+class RuleEngine:
+    """
+    Knowledge Base validation rules compiled to vectorized NumPy/pandas.
+
+    `fit` resolves the Draft/Speed/Power/RPM columns and fits the physical
+    coefficients once (cubic-law constants per draft band, the speed-RPM
+    line, robust tolerances); `evaluate` flags a whole frame; `append`
+    flags only newly arrived rows, carrying just enough history (the tail)
+    for the row-to-row and rolling rules to give the same answer as a
+    full re-evaluation.
+
+    Output: one row per input row with `rid` (1-based position, i.e. the
+    SQLite rowid), the timestamp, `<rule>` 0/1, `<rule>_resid`, `n_flags`.
+    """
+
+    def __init__(
+        self,
+        z: float = 3.5,
+        draft_band: float = 0.5,
+        window: int = 36,
+        max_gap_s: float = 1200,
+        speed_tol: float = 0.1,
+        draft_tol: float = 0.05,
+        step_pct: float = 0.15,
+        power_step_pct: float = 0.05,
+        shift_tol: float = 0.3,
+        maint_step: float = 20.0,
+    ):
+        self.z = z
+        self.draft_band = draft_band
+        self.window = window
+        self.max_gap_s = max_gap_s
+        self.speed_tol = speed_tol
+        self.draft_tol = draft_tol
+        self.step_pct = step_pct
+        self.power_step_pct = power_step_pct
+        self.shift_tol = shift_tol
+        self.maint_step = maint_step
+
+        self.roles = None
+        self.ts_col = None
+        self.rules = []
+        self.params = {}
+        self._tail = None
+        self._rows = 0
+
+    # ------------------------------------------------
+    # FIT
+    # ------------------------------------------------
+    def _value(self, frame: pd.DataFrame, role: str) -> pd.Series:
+        # float64 whatever ingest narrowed it to: x ** 3 / diff() on small ints wrap
+        return frame[self.roles[role]].astype("float64")
+
+    def _band(self, frame: pd.DataFrame):
+        if "draft" not in self.roles:
+            return pd.Series(0, index=frame.index)
+        return np.floor(self._value(frame, "draft") / self.draft_band)
+
+    def _cubic(self, frame: pd.DataFrame, driver: str):
+        p, x = self._value(frame, "power"), self._value(frame, driver)
+        ratio = p / x ** 3
+        k = self._band(frame).map(self.params[f"k_{driver}"]).fillna(self.params[f"k_{driver}_all"])
+        return (ratio / k - 1).to_numpy(dtype=float)
+
+    def fit(self, df: pd.DataFrame):
+        self.roles = resolve_roles(df)
+        self.ts_col = _timestamp_column(df)
+        self.rules = [r for r, (needs, _) in RULES.items() if all(n in self.roles for n in needs)]
+
+        for driver in ("speed", "rpm"):
+            if {"power", driver} <= self.roles.keys():
+                ratio = self._value(df, "power") / self._value(df, driver) ** 3
+                ratio = ratio.replace([np.inf, -np.inf], np.nan)
+                self.params[f"k_{driver}"] = ratio.groupby(self._band(df)).median().to_dict()
+                self.params[f"k_{driver}_all"] = float(ratio.median())
+                self.params[f"tol_{driver}"] = self.z * _robust_sigma(self._cubic(df, driver))
+
+        if "law_speed_rpm" in self.rules:
+            s, r = self._value(df, "speed"), self._value(df, "rpm")
+            ok = s.notna() & r.notna()
+            slope, intercept = np.polyfit(r[ok], s[ok], 1)
+            self.params["speed_rpm"] = (float(slope), float(intercept))
+            resid = (s - (slope * r + intercept)).to_numpy(dtype=float)
+            self.params["tol_speed_rpm"] = self.z * _robust_sigma(resid)
+
+        return self
+
+    # ------------------------------------------------
+    # EVALUATE
+    # ------------------------------------------------
+    def _evaluate(self, frame: pd.DataFrame) -> OrderedDict:
+        """
+        frame: time-ordered rows. Returns rule -> (flag, resid) arrays.
+        """
+        out = OrderedDict()
+        col = self.roles
+
+        def delta(role):
+            return self._value(frame, role).diff().to_numpy()
+
+        def prev(role):
+            return self._value(frame, role).shift().to_numpy()
+
+        # row-to-row rules only compare rows that are actually adjacent in time
+        if self.ts_col is not None:
+            gap = frame[self.ts_col].diff().dt.total_seconds().to_numpy()
+            adjacent = gap <= self.max_gap_s
+        else:
+            adjacent = np.r_[False, np.ones(len(frame) - 1, dtype=bool)] if len(frame) else np.zeros(0, bool)
+
+        for driver, rule in (("speed", "law_cubic_speed"), ("rpm", "law_cubic_rpm")):
+            if rule in self.rules:
+                resid = self._cubic(frame, driver)
+                out[rule] = (np.abs(resid) > self.params[f"tol_{driver}"], resid)
+
+        if "law_speed_rpm" in self.rules:
+            slope, intercept = self.params["speed_rpm"]
+            speed, rpm = self._value(frame, "speed"), self._value(frame, "rpm")
+            resid = (speed - (slope * rpm + intercept)).to_numpy()
+            out["law_speed_rpm"] = (np.abs(resid) > self.params["tol_speed_rpm"], resid)
+
+        if "phys_001" in self.rules:
+            d_draft, d_power, d_speed = delta("draft"), delta("power"), delta("speed")
+            resid = d_power / prev("power")
+            flag = adjacent & (np.abs(d_speed) <= self.speed_tol) & (d_draft > self.draft_tol) & (d_power < 0)
+            out["phys_001"] = (flag, resid)
+
+        if "phys_002" in self.rules:
+            d_speed, d_rpm = delta("speed"), delta("rpm")
+            steady = np.abs(delta("draft")) <= self.draft_tol if "draft" in col else True
+            flag = (
+                adjacent & steady
+                & (np.abs(d_speed) > self.speed_tol) & (np.abs(d_rpm) > self.speed_tol)
+                & (np.sign(d_speed) != np.sign(d_rpm))
+            )
+            out["phys_002"] = (flag, d_rpm)
+
+        if "data_001" in self.rules:
+            jump = delta("speed") / prev("speed")
+            flag = (
+                adjacent
+                & (np.abs(jump) > self.step_pct)
+                & (np.abs(delta("power") / prev("power")) < self.power_step_pct)
+            )
+            out["data_001"] = (flag, jump)
+
+        if "data_002" in self.rules:
+            level = pd.Series(self._cubic(frame, "speed"), index=frame.index)
+            level = level.rolling(self.window, min_periods=self.window).median()
+            shift = (level - level.shift(self.window)).to_numpy(dtype=float)
+            out["data_002"] = (_onset(np.abs(shift) > self.shift_tol), shift)
+
+        if "maint_003" in self.rules:
+            dev = self._value(frame, "deviation").rolling(self.window, min_periods=self.window // 2).median()
+            drop = (dev - dev.shift(self.window)).to_numpy(dtype=float)
+            out["maint_003"] = (_onset(drop < -self.maint_step), drop)
+
+        return out
+
+    def _flags_frame(self, frame: pd.DataFrame, rid: np.ndarray, results: OrderedDict) -> pd.DataFrame:
+        data = OrderedDict(rid=rid)
+        if self.ts_col is not None:
+            data[self.ts_col] = frame[self.ts_col].to_numpy()
+        n_flags = np.zeros(len(frame), dtype=np.int16)
+        for rule, (flag, resid) in results.items():
+            flag = np.nan_to_num(flag, nan=0).astype(np.int8)
+            data[rule] = flag
+            data[f"{rule}_resid"] = resid
+            n_flags += flag
+        data["n_flags"] = n_flags
+        return pd.DataFrame(data)
+
+    def _ordered(self, df: pd.DataFrame, start: int):
+        """
+        Time-ordered copy plus the 1-based rid of each row.
+        """
+        frame = df.reset_index(drop=True)
+        rid = np.arange(start + 1, start + len(frame) + 1)
+        if self.ts_col is not None:
+            order = np.argsort(frame[self.ts_col].to_numpy(), kind="stable")
+            frame, rid = frame.iloc[order].reset_index(drop=True), rid[order]
+        return frame, rid
+
+    def evaluate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Flags for every row of df (fits first if needed), in df's row order.
+        """
+        if self.roles is None:
+            self.fit(df)
+
+        frame, rid = self._ordered(df, 0)
+        flags = self._flags_frame(frame, rid, self._evaluate(frame))
+
+        self._tail = frame.tail(2 * self.window + 1)
+        self._rows = len(df)
+        return flags.sort_values("rid", kind="stable").reset_index(drop=True)
+
+    def append(self, new_rows: pd.DataFrame) -> pd.DataFrame:
+        """
+        Flags for rows appended after the last evaluate/append, reusing the
+        fitted coefficients. Rows are assumed to arrive in time order.
+        """
+        if self._tail is None:
+            return self.evaluate(new_rows)
+
+        frame, rid = self._ordered(new_rows, self._rows)
+        context = pd.concat([self._tail, frame], ignore_index=True)
+        results = self._evaluate(context)
+
+        k = len(self._tail)
+        results = OrderedDict((r, (f[k:], v[k:])) for r, (f, v) in results.items())
+        flags = self._flags_frame(frame, rid, results)
+
+        self._tail = context.tail(2 * self.window + 1)
+        self._rows += len(new_rows)
+        return flags
+
+    # ------------------------------------------------
+    # REPORTING
+    # ------------------------------------------------
+    @staticmethod
+    def summary(flags: pd.DataFrame) -> dict:
+        rules = [c for c in flags.columns if c in RULES]
+        return {r: int(flags[r].sum()) for r in rules}
+
+
+def applicable_rules(df: pd.DataFrame) -> list:
+    roles = resolve_roles(df)
+    return [r for r, (needs, _) in RULES.items() if all(n in roles for n in needs)]
+
+
+def flags_schema(df: pd.DataFrame, table_name: str = "data") -> str:
+    """
+    Schema block for SQL_PROMPT describing `<table>__flags`; empty when
+    no rule applies to df's columns.
+    """
+    rules = applicable_rules(df)
+    if not rules:
+        return ""
+    ts = _timestamp_column(df)
+    join = f"{table_name}.rowid = {table_name}__flags.rid"
+    if ts is not None:
+        join = f'{table_name}."{ts}" = {table_name}__flags."{ts}"'
+    lines = [
+        f"Table {table_name}__flags (one row per {table_name} row; JOIN ON {join})",
+        "rid INTEGER",
+    ]
+    if ts is not None:
+        lines.append(f"{ts} TIMESTAMP")
+    for rule in rules:
+        lines.append(f"{rule} INTEGER -- 1 = {RULES[rule][1]}")
+        lines.append(f"{rule}_resid REAL")
+    lines.append("n_flags INTEGER -- number of rules flagged on the row")
+    return "\n".join(lines)
+
+
+def rule_notes(columns) -> str:
+    """
+    One line per rule column present in a result, for the interpret prompt.
+    """
+    return "\n".join(
+        f"{rule}: {RULES[rule][1]}" for rule in RULES
+        if rule in columns or f"{rule}_resid" in columns
+    )
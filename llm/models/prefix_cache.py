@@ -0,0 +1,208 @@
+# llm/models/prefix_cache.py
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import torch
+
+
+# --------------------------------------------------
+# PROMPT PREFIX REGISTRY (process-wide)
+# --------------------------------------------------
+# name -> fixed text every prompt rendered from that template starts with
+_prefixes = {}
+_prefixes_lock = threading.Lock()
+
+_MARKER = "\x00prefix-end\x00"
+
+
+def static_prefix(template) -> str:
+    """
+    Rendered text of a LangChain prompt template up to its first variable.
+    """
+    values = {name: _MARKER for name in template.input_variables}
+    return template.invoke(values).to_string().split(_MARKER, 1)[0]
+
+
+def register_prompt(name: str, template, min_chars: int = 64):
+    """
+    Register a template (or its prefix text) whose static prefix the model
+    clients may prefill once and reuse. Short prefixes are not worth a cache entry.
+    """
+    text = template if isinstance(template, str) else static_prefix(template)
+    if len(text) >= min_chars:
+        with _prefixes_lock:
+            _prefixes[name] = text
+
+
+def registered_prompts() -> dict:
+    with _prefixes_lock:
+        return dict(_prefixes)
+
+
+def _nbytes(obj) -> int:
+    if torch.is_tensor(obj):
+        return obj.numel() * obj.element_size()
+    if hasattr(obj, "to_legacy_cache"):
+        obj = obj.to_legacy_cache()
+    if isinstance(obj, (tuple, list)):
+        return sum(_nbytes(o) for o in obj)
+    return 0
+
+
+def share(past):
+    """
+    A cache object for one generate() call that shares the prefix tensors.
+    DynamicCache.update rebinds each layer to torch.cat(old, new) and never
+    writes into the old tensors, so the stored prefix stays intact without
+    a deep copy (which would double the prefix's KV memory per request).
+    Returns None for cache types that may be updated in place.
+    """
+    if isinstance(past, tuple):
+        return past
+    if hasattr(past, "to_legacy_cache") and hasattr(type(past), "from_legacy_cache"):
+        return type(past).from_legacy_cache(past.to_legacy_cache())
+    return None
+
+
+def seq_length(past) -> int:
+    """
+    Number of positions held in a past_key_values cache.
+    """
+    if hasattr(past, "get_seq_length"):
+        return past.get_seq_length()
+    return past[0][0].shape[-2]
+
+
+# --------------------------------------------------
+# KV CACHE
+# --------------------------------------------------
+class PrefixKVCache:
+    """
+    past_key_values for the static prefix of each registered prompt template.
+
+    Key: (template name, tokenizer, prefix text hash). A prompt that starts
+    with a registered prefix is generated from that prefix's KV
+    cache, so only the variable suffix (schema, query, result) is prefilled.
+    Entries are built on first use (outside the lock; concurrent requests
+    for the same prefix wait for one build) and evicted LRU beyond
+    `max_bytes`. Hits share the prefix tensors (see `share`), copying only
+    for cache types that are updated in place.
+
+    The prefix is tokenized alone and its last token dropped, so a
+    tokenizer merge across the prefix / suffix boundary never invalidates
+    the cache; a prompt whose tokens still disagree is run uncached.
+    """
+
+    def __init__(self, model, tokenizer, max_bytes: int = 256 * 1024**2, min_tokens: int = 16):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_bytes = max_bytes
+        self.min_tokens = min_tokens
+
+        self._entries = OrderedDict()  # key -> (prefix_ids, past_key_values, nbytes)
+        self._bytes = 0
+        self._building = {}            # key -> Future of the entry being prefilled
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "builds": 0, "evictions": 0, "mismatches": 0, "tokens_saved": 0,
+            "deep_copies": 0,
+        }
+
+    def _key(self, name: str, text: str):
+        tokenizer_id = getattr(self.tokenizer, "name_or_path", type(self.tokenizer).__name__)
+        return name, tokenizer_id, hashlib.sha1(text.encode()).hexdigest()[:16]
+
+    def _match(self, prompt: str):
+        best = None
+        for name, text in registered_prompts().items():
+            if prompt.startswith(text) and (best is None or len(text) > len(best[1])):
+                best = (name, text)
+        return best
+
+    def _build(self, text: str):
+        prefix_ids = self.tokenizer(text, return_tensors="pt")["input_ids"][:, :-1]
+        if prefix_ids.shape[1] < self.min_tokens:
+            return prefix_ids, None, 0
+
+        with torch.no_grad():
+            out = self.model(prefix_ids.to(self.model.device), use_cache=True)
+        past = out.past_key_values
+        return prefix_ids, past, _nbytes(past)
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, _, nbytes) = self._entries.popitem(last=False)
+            self._bytes -= nbytes
+            self._stats["evictions"] += 1
+
+    def generate_kwargs(self, prompt: str, input_ids) -> dict:
+        """
+        {"past_key_values": <the prefix cache, shared>} for a single
+        tokenized prompt ([1, seq]) that starts with a registered prefix,
+        else {}. Pass it to `model.generate` with the full input_ids.
+        """
+        if input_ids.shape[0] != 1:
+            return {}
+        matched = self._match(prompt)
+        if matched is None:
+            return {}
+
+        entry = self._entry(self._key(*matched), matched[1])
+
+        prefix_ids, past, _ = entry
+        n = prefix_ids.shape[1]
+        if past is None or input_ids.shape[1] <= n:
+            return {}
+        if not torch.equal(input_ids[0, :n].cpu(), prefix_ids[0]):
+            with self._lock:
+                self._stats["mismatches"] += 1
+            return {}
+
+        shared = share(past)
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["tokens_saved"] += n
+            if shared is None:
+                self._stats["deep_copies"] += 1
+        return {"past_key_values": shared if shared is not None else copy.deepcopy(past)}
+
+    def _entry(self, key, text: str):
+        """
+        Cached (prefix_ids, past, nbytes) for `key`, prefilled on a miss
+        without holding the lock.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            pending = self._building.get(key)
+            if pending is None:
+                future = self._building[key] = Future()
+
+        if pending is not None:
+            return pending.result()
+
+        try:
+            entry = self._build(text)
+        except BaseException as e:
+            with self._lock:
+                del self._building[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._building[key]
+            self._entries[key] = entry
+            self._bytes += entry[2]
+            self._stats["builds"] += 1
+            self._evict()
+        future.set_result(entry)
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "mb": round(self._bytes / 1024**2, 1)}
@@ -1,8 +1,26 @@
 # llm/models/qwen_client.py
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
 import torch
-from transformers import AutoProcessor, AutoModelForVision2Seq
+from transformers import (
+    AutoProcessor,
+    AutoModelForVision2Seq,
+    TextIteratorStreamer,
+    LogitsProcessorList,
+    StoppingCriteriaList,
+)
 from PIL import Image
 
+from llm.models.vision_cache import VisionCache, content_hash
+from llm.models.image_preprocess import PATCH, load_image, load_images, prepare_chart
+from llm.models.json_constraint import JsonLogitsProcessor, JsonStop, token_texts
+
+
+IMAGE_PAD = "<|image_pad|>"
+
 
 class QwenClient:
     def __init__(
@@ -10,17 +28,105 @@ class QwenClient:
         model_name="Qwen/Qwen2-VL-7B-Instruct",
         device="cuda",
         dtype=torch.float16,
+        cache: VisionCache = None,
+        batch_size: int = 4,
+        max_pixels: int = 512 * PATCH * PATCH,
+        crop: bool = True,
+        feature_cache_size: int = 64,
     ):
+        """
+        cache: optional VisionCache; repeated (image, prompt) pairs skip the VLM
+        batch_size: images per batched generate in `analyze_batch`
+        max_pixels: visual-token budget (pixels after cropping; one token per
+            28x28 block, so 512*28*28 ~ 512 tokens); None = native resolution
+        crop: trim empty margins / screenshot borders before resizing
+        feature_cache_size: processed image tensors kept (LRU), so asking a
+            second question about the same chart skips preprocessing
+        """
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_pixels = max_pixels
+        self.crop = crop
+        self.feature_cache_size = feature_cache_size
+        self._features = OrderedDict()  # (image hash, budget, crop) -> processor output
+        self._features_lock = threading.Lock()
         self.processor = AutoProcessor.from_pretrained(model_name)
+        # batched generate appends after the prompt, so pad on the left
+        self.processor.tokenizer.padding_side = "left"
         self.model = AutoModelForVision2Seq.from_pretrained(
             model_name,
             torch_dtype=dtype,
             device_map="auto",
         )
 
-    def analyze(self, image_path: str, prompt: str) -> str:
-        image = Image.open(image_path).convert("RGB")
+        # (image hash, prompt, settings) -> Future for pages being analyzed right now,
+        # so a page requested during a background prefetch is not run twice
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._stats = {"generations": 0, "generated_tokens": 0, "parse_failures": 0}
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["tokens_per_generation"] = (
+            stats["generated_tokens"] / stats["generations"] if stats["generations"] else 0.0
+        )
+        return stats
+
+    def _settings(self) -> str:
+        # part of every cache key: a result extracted at one budget is not reused at another
+        return f"max_pixels={self.max_pixels},crop={self.crop}"
+
+    @staticmethod
+    def _cache_prompt(prompt: str, schema) -> str:
+        # constrained and free-text results for one prompt are cached apart
+        if schema is None:
+            return prompt
+        return f"{prompt}\n#schema:{json.dumps(schema, sort_keys=True)}"
+
+    @staticmethod
+    def _result(text: str, schema):
+        return json.loads(text) if schema is not None else text
+
+    # ------------------------------------------------
+    # SINGLE IMAGE
+    # ------------------------------------------------
+    def analyze(self, image_path: str, prompt: str, schema=None):
+        """
+        Free-text extraction, or with `schema` (see llm.models.json_constraint)
+        JSON decoding constrained to the schema that stops when the object
+        closes, returned as a dict.
+        """
+        image_bytes, image = load_image(image_path)
+        key, settings = self._cache_prompt(prompt, schema), self._settings()
 
+        if self.cache is not None:
+            cached = self.cache.get(image_bytes, key, image=image, settings=settings)
+            if cached is not None:
+                return self._result(cached, schema)
+
+        # claim the page, or wait for whoever is already analyzing it
+        slot = (content_hash(image_bytes), key, settings)
+        with self._inflight_lock:
+            pending = self._inflight.get(slot)
+            if pending is None:
+                future = self._inflight[slot] = Future()
+        if pending is not None:
+            return self._result(pending.result(), schema)
+
+        try:
+            result = self._analyze((image_bytes, image), prompt, schema)
+            if self.cache is not None:
+                self.cache.put(image_bytes, key, result, image=image, settings=settings)
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(slot, None)
+        return self._result(result, schema)
+
+    def _chat_text(self, prompt: str) -> str:
         messages = [
             {
                 "role": "user",
@@ -30,34 +136,222 @@ class QwenClient:
                 ],
             }
         ]
+        return self.processor.apply_chat_template(messages, add_generation_prompt=True)
+
+    def _image_features(self, image_bytes: bytes, image: Image.Image) -> dict:
+        """
+        pixel_values / image_grid_thw for one page after cropping and
+        downsampling to the budget; cached per image content.
+        """
+        key = (content_hash(image_bytes), self.max_pixels, self.crop)
+        with self._features_lock:
+            if key in self._features:
+                self._features.move_to_end(key)
+                return self._features[key]
+
+        prepared = prepare_chart(image, self.max_pixels, crop=self.crop)
+        features = dict(self.processor.image_processor(images=[prepared], return_tensors="pt"))
+
+        with self._features_lock:
+            self._features[key] = features
+            while len(self._features) > self.feature_cache_size:
+                self._features.popitem(last=False)
+        return features
+
+    def _inputs(self, pages: list, prompts: list):
+        """
+        pages: (image bytes, image) pairs. Builds the same inputs as the
+        processor would, from the cached image tensors: each image
+        placeholder is expanded to that image's visual-token count.
+        """
+        features = [self._image_features(b, im) for b, im in pages]
+        merge = self.processor.image_processor.merge_size ** 2
+
+        texts = []
+        for prompt, f in zip(prompts, features):
+            n_tokens = int(f["image_grid_thw"].prod()) // merge
+            texts.append(self._chat_text(prompt).replace(IMAGE_PAD, IMAGE_PAD * n_tokens, 1))
+
+        inputs = self.processor.tokenizer(texts, padding=True, return_tensors="pt")
+        inputs["pixel_values"] = torch.cat([f["pixel_values"] for f in features])
+        inputs["image_grid_thw"] = torch.cat([f["image_grid_thw"] for f in features])
+        return inputs.to(self.model.device)
 
-        inputs = self.processor(
-            messages,
-            images=image,
-            return_tensors="pt",
-        ).to(self.model.device)
+    def _constraint(self, schema):
+        eos = self.model.generation_config.eos_token_id
+        processor = JsonLogitsProcessor(
+            token_texts(self.processor.tokenizer),
+            schema,
+            eos if isinstance(eos, list) else [eos],
+        )
+        return processor, {
+            "logits_processor": LogitsProcessorList([processor]),
+            "stopping_criteria": StoppingCriteriaList([JsonStop(processor)]),
+        }
+
+    def _analyze_many(self, pages: list, prompts: list, schema=None) -> list:
+        """
+        One batched generate over several images; returns one completion each
+        (with `schema`: canonical JSON text of the parsed object). Always
+        text, as cached and shared with in-flight waiters; `analyze` /
+        `analyze_batch` decode it once on the way out.
+        """
+        inputs = self._inputs(pages, prompts)
+        constraint, constraint_kwargs = (None, {}) if schema is None else self._constraint(schema)
 
         with torch.no_grad():
             output_ids = self.model.generate(
                 **inputs,
                 max_new_tokens=512,
                 temperature=0.2,
+                **constraint_kwargs,
             )
 
-        return self.processor.decode(
-            output_ids[0], skip_special_tokens=True
-        )
+        # Return ONLY the generated completions (left padding: same offset for all rows)
+        start = inputs["input_ids"].shape[1]
+        completions = output_ids[:, start:]
+        texts = self.processor.batch_decode(completions, skip_special_tokens=True)
+
+        pad = self.processor.tokenizer.pad_token_id
+        self._stats["generations"] += len(texts)
+        self._stats["generated_tokens"] += int((completions != pad).sum())
+        if constraint is None:
+            return texts
+
+        results = []
+        for row, text in enumerate(texts):
+            parsed = constraint.finish(row, text)
+            if parsed is None:
+                self._stats["parse_failures"] += 1
+                parsed = {"raw_text": text}
+            results.append(json.dumps(parsed))
+        return results
 
-    _qwen_instance = None
+    def _analyze(self, page, prompt: str, schema=None) -> str:
+        return self._analyze_many([page], [prompt], schema)[0]
 
+    # ------------------------------------------------
+    # BATCH (multi-page PDFs)
+    # ------------------------------------------------
+    def analyze_batch(self, image_paths: list, prompt: str, batch_size: int = None, schema=None) -> list:
+        """
+        Analyze many pages with the same prompt, one result per path.
 
-    def get_qwen():
+        Pages are decoded in a process pool, cache hits are served directly,
+        and the misses run through Qwen2-VL `batch_size` images at a time.
+        Each page result is cached on its own, so a later `analyze` of any
+        single page is a cache hit. `schema` as in `analyze`.
         """
-        Lazy-loaded singleton for QwenClient.
+        batch_size = batch_size or self.batch_size
+        key, settings = self._cache_prompt(prompt, schema), self._settings()
+        loaded = load_images(image_paths)
+        results = [None] * len(loaded)
+
+        misses = []
+        for i, (image_bytes, image) in enumerate(loaded):
+            if self.cache is not None:
+                results[i] = self.cache.get(image_bytes, key, image=image, settings=settings)
+            if results[i] is None:
+                misses.append(i)
+
+        # claim the misses so concurrent single-page requests wait for us
+        claimed, waiting = {}, {}
+        with self._inflight_lock:
+            for i in misses:
+                slot = (content_hash(loaded[i][0]), key, settings)
+                if slot in self._inflight:
+                    waiting[i] = self._inflight[slot]
+                else:
+                    self._inflight[slot] = claimed[i] = Future()
+
+        try:
+            todo = [i for i in misses if i in claimed]
+            for b in range(0, len(todo), batch_size):
+                chunk = todo[b : b + batch_size]
+                outputs = self._analyze_many([loaded[i] for i in chunk], [prompt] * len(chunk), schema)
+                for i, text in zip(chunk, outputs):
+                    results[i] = text
+                    if self.cache is not None:
+                        self.cache.put(loaded[i][0], key, text, image=loaded[i][1], settings=settings)
+                    claimed[i].set_result(text)
+        except BaseException as e:
+            for future in claimed.values():
+                if not future.done():
+                    future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                for i in claimed:
+                    self._inflight.pop((content_hash(loaded[i][0]), key, settings), None)
+
+        # pages another caller was already analyzing
+        for i, pending in waiting.items():
+            results[i] = pending.result()
+
+        return [self._result(text, schema) for text in results]
+
+    def stream(self, image_path: str, prompt: str):
         """
-        global _qwen_instance
-        if _qwen_instance is None:
-            _qwen_instance = QwenClient()
-        return _qwen_instance
+        Yields extraction text as tokens are produced.
+        A cached result is yielded in one piece.
+        """
+        image_bytes, image = load_image(image_path)
+        settings = self._settings()
+
+        if self.cache is not None:
+            cached = self.cache.get(image_bytes, prompt, image=image, settings=settings)
+            if cached is not None:
+                yield cached
+                return
+
+        inputs = self._inputs([(image_bytes, image)], [prompt])
+        streamer = TextIteratorStreamer(
+            self.processor.tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True,
+        )
+
+        errors = []
+
+        def _run():
+            try:
+                with torch.no_grad():
+                    self.model.generate(
+                        **inputs,
+                        max_new_tokens=512,
+                        temperature=0.2,
+                        streamer=streamer,
+                    )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                streamer.end()  # a failed generate never ends the stream itself
+
+        worker = threading.Thread(target=_run, daemon=True)
+        worker.start()
+
+        parts = []
+        try:
+            for text in streamer:
+                if text:
+                    parts.append(text)
+                    yield text
+        finally:
+            worker.join()
+        if errors:
+            raise errors[0]  # nothing cached from a failed decode
+
+        if self.cache is not None:
+            self.cache.put(image_bytes, prompt, "".join(parts), image=image, settings=settings)
+
+
+
+def get_qwen():
+    """
+    Lazy-loaded QwenClient, owned by the model manager.
+    """
+    from llm.models.model_manager import get_manager
+
+    return get_manager().get("qwen")
 
     
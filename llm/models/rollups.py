@@ -0,0 +1,268 @@
+# llm/models/rollups.py
+import re
+import sqlite3
+
+import pandas as pd
+
+from llm.models.ingest import detect_datetime_format, DATETIME_FORMATS, SQL_DATETIME_FORMAT
+
+
+GRAINS = {"hour": 3600, "day": 86400}
+
+AGG_RE = re.compile(
+    r"^\s*(AVG|SUM|MIN|MAX|COUNT)\s*\(\s*(\*|\"?[A-Za-z_][\w]*\"?)\s*\)"
+    r"(?:\s+AS\s+(\"[^\"]+\"|\w+))?\s*$",
+    re.I,
+)
+
+RANGE_RE = re.compile(
+    r"^\s*SELECT\s+(?P<aggs>.+?)\s+FROM\s+\"?(?P<table>\w+)\"?\s+WHERE\s+(?P<where>.+?)\s*;?\s*$",
+    re.I | re.S,
+)
+
+BETWEEN_RE = re.compile(
+    r"^\"?(?P<col>\w+)\"?\s+BETWEEN\s+'(?P<lo>[^']+)'\s+AND\s+'(?P<hi>[^']+)'$",
+    re.I,
+)
+
+BOUNDS_RE = re.compile(
+    r"^\"?(?P<c1>\w+)\"?\s*(?P<op1>>=|>)\s*'(?P<lo>[^']+)'\s+AND\s+"
+    r"\"?(?P<c2>\w+)\"?\s*(?P<op2><=|<)\s*'(?P<hi>[^']+)'$",
+    re.I,
+)
+
+
+def _epoch(series: pd.Series):
+    return (series.astype("datetime64[s]").astype("int64")).to_numpy()
+
+
+def _parse_literal(value: str):
+    for fmt in DATETIME_FORMATS:
+        try:
+            return int(pd.to_datetime(value, format=fmt).timestamp())
+        except (ValueError, TypeError):
+            continue
+    try:
+        return int(pd.Timestamp(value).timestamp())
+    except (ValueError, TypeError):
+        return None
+
+
+def _bound(value: str):
+    """
+    (epoch, exact) for a literal the base table compares as ISO text, or
+    None when text order and time order could disagree. A literal shorter
+    than the stored form (date-only '2025-01-07') sorts before every stored
+    value at its instant ('2025-01-07 00:00:00' > '2025-01-07'): not exact.
+    """
+    ts = _parse_literal(value)
+    if ts is None:
+        return None
+    stored = pd.Timestamp(ts, unit="s").strftime(SQL_DATETIME_FORMAT)
+    if not stored.startswith(value):
+        return None
+    return ts, value == stored
+
+
+class Rollups:
+    """
+    Hourly / daily rollups of every numeric column over the primary
+    timestamp column, materialized next to the base table:
+
+        <table>__time          (rid, ts)                 epoch per base rowid
+        <table>__rollup_hour   (bucket, __rows, c__count, c__sum, c__min, c__max, c__sumsq, ...)
+        <table>__rollup_day    (same)
+
+    `rewrite` turns `SELECT AGG(col), ... FROM <table> WHERE ts BETWEEN a AND b`
+    into a read of the full buckets plus the raw rows in the partial edge
+    buckets, so long ranges cost O(buckets) instead of O(rows). Bounds keep
+    the base table's text comparison, so the rewrite returns what the
+    original query would.
+    """
+
+    def __init__(self, table_name: str, ts_col: str, numeric_cols: list):
+        self.table_name = table_name
+        self.ts_col = ts_col
+        self.numeric_cols = numeric_cols
+        self.rewrites = 0
+
+    # ------------------------------------------------
+    # BUILD (at load time)
+    # ------------------------------------------------
+    @classmethod
+    def build(cls, conn: sqlite3.Connection, df: pd.DataFrame, table_name: str):
+        """
+        Returns None when the frame has no parseable timestamp column.
+        """
+        ts_col, parsed = None, None
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                ts_col, parsed = col, df[col]
+                break
+            fmt = detect_datetime_format(df[col])
+            if fmt:
+                ts_col, parsed = col, pd.to_datetime(df[col], format=fmt, errors="coerce")
+                break
+
+        numeric_cols = list(df.select_dtypes("number").columns)
+        if ts_col is None or not numeric_cols:
+            return None
+
+        valid = parsed.notna().to_numpy()
+        ts = _epoch(parsed[valid])
+        rid = pd.RangeIndex(1, len(df) + 1).to_numpy()[valid]  # to_sql rowids are 1..n
+
+        time_table = f"{table_name}__time"
+        conn.execute(f'DROP TABLE IF EXISTS "{time_table}"')
+        conn.execute(f'CREATE TABLE "{time_table}" (rid INTEGER PRIMARY KEY, ts INTEGER)')
+        conn.executemany(
+            f'INSERT INTO "{time_table}" VALUES (?, ?)',
+            zip(rid.tolist(), ts.tolist()),
+        )
+        conn.execute(f'CREATE INDEX "idx_{time_table}_ts" ON "{time_table}" (ts)')
+
+        values = df.loc[valid, numeric_cols]
+        for grain, size in GRAINS.items():
+            bucket = pd.Series(ts // size * size, index=values.index, name="bucket")
+            grouped = values.groupby(bucket)
+
+            parts = {"__rows": grouped.size()}
+            for col in numeric_cols:
+                g = grouped[col]
+                parts[f"{col}__count"] = g.count()
+                parts[f"{col}__sum"] = g.sum(min_count=1)
+                parts[f"{col}__min"] = g.min()
+                parts[f"{col}__max"] = g.max()
+                parts[f"{col}__sumsq"] = (values[col] ** 2).groupby(bucket).sum(min_count=1)
+
+            rollup = pd.DataFrame(parts).reset_index()
+            rollup.to_sql(f"{table_name}__rollup_{grain}", conn, if_exists="replace", index=False)
+            conn.execute(
+                f'CREATE INDEX "idx_{table_name}__rollup_{grain}" '
+                f'ON "{table_name}__rollup_{grain}" (bucket)'
+            )
+
+        return cls(table_name, ts_col, numeric_cols)
+
+    # ------------------------------------------------
+    # REWRITE
+    # ------------------------------------------------
+    def _parse(self, sql: str):
+        m = RANGE_RE.match(sql)
+        if not m or m.group("table") != self.table_name:
+            return None
+
+        where = m.group("where").strip()
+        b = BETWEEN_RE.match(where)
+        if b:
+            col, lo, hi, lo_incl, hi_incl = b["col"], b["lo"], b["hi"], True, True
+        else:
+            b = BOUNDS_RE.match(where)
+            if not b or b["c1"] != b["c2"]:
+                return None
+            col, lo, hi = b["c1"], b["lo"], b["hi"]
+            lo_incl, hi_incl = b["op1"] == ">=", b["op2"] == "<="
+
+        if col != self.ts_col:
+            return None
+
+        aggs = []
+        for expr in _split_select(m.group("aggs")):
+            a = AGG_RE.match(expr)
+            if not a:
+                return None
+            func, arg, alias = a.group(1).upper(), a.group(2).strip('"'), a.group(3)
+            if arg != "*" and arg not in self.numeric_cols:
+                return None
+            if arg == "*" and func != "COUNT":
+                return None
+            aggs.append((func, arg, alias.strip('"') if alias else expr.strip()))
+
+        lo_bound, hi_bound = _bound(lo), _bound(hi)
+        if lo_bound is None or hi_bound is None:
+            return None
+        (lo_ts, lo_exact), (hi_ts, hi_exact) = lo_bound, hi_bound
+
+        # normalize to the half-open interval [lo_ts, hi_ts) with the base
+        # table's text semantics: a non-exact literal sits just before its
+        # instant, so `> lo` keeps the lo_ts rows and `<= hi` drops the hi_ts rows
+        lo_ts += 1 if lo_exact and not lo_incl else 0
+        hi_ts += 1 if hi_exact and hi_incl else 0
+        return aggs, lo_ts, hi_ts
+
+    def rewrite(self, sql: str):
+        """
+        Rollup-backed SQL for a range aggregate, or None to run `sql` as-is.
+        """
+        parsed = self._parse(sql)
+        if parsed is None:
+            return None
+        aggs, lo_ts, hi_ts = parsed
+
+        grain = "day" if hi_ts - lo_ts >= 2 * GRAINS["day"] else "hour"
+        size = GRAINS[grain]
+        first = -(-lo_ts // size) * size       # first full bucket start
+        last = hi_ts // size * size            # end of the last full bucket
+        if last - first < 2 * size:
+            return None                        # too short to be worth it
+
+        cols = sorted({arg for _, arg, _ in aggs if arg != "*"})
+        r_cols = ["SUM(__rows) AS n"] + [
+            f'SUM("{c}__count") AS "{c}_count", SUM("{c}__sum") AS "{c}_sum", '
+            f'MIN("{c}__min") AS "{c}_min", MAX("{c}__max") AS "{c}_max"'
+            for c in cols
+        ]
+        e_cols = ["COUNT(*) AS n"] + [
+            f'COUNT("{c}") AS "{c}_count", SUM("{c}") AS "{c}_sum", '
+            f'MIN("{c}") AS "{c}_min", MAX("{c}") AS "{c}_max"'
+            for c in cols
+        ]
+
+        def ref(arg, kind):
+            return "n" if arg == "*" else f'"{arg}_{kind}"'
+
+        def total(arg, kind):
+            return f"(COALESCE(r.{ref(arg, kind)}, 0) + COALESCE(e.{ref(arg, kind)}, 0))"
+
+        out = []
+        for func, arg, alias in aggs:
+            if func == "COUNT":
+                expr = total(arg, "count")
+            elif func == "SUM":
+                expr = f'CASE WHEN {total(arg, "count")} = 0 THEN NULL ELSE {total(arg, "sum")} END'
+            elif func == "AVG":
+                expr = f'{total(arg, "sum")} * 1.0 / NULLIF({total(arg, "count")}, 0)'
+            else:
+                k = ref(arg, func.lower())
+                expr = f"{func}(COALESCE(r.{k}, e.{k}), COALESCE(e.{k}, r.{k}))"
+            out.append(f'{expr} AS "{alias}"')
+
+        t = self.table_name
+        self.rewrites += 1
+        return (
+            f'WITH r AS (SELECT {", ".join(r_cols)} FROM "{t}__rollup_{grain}" '
+            f"WHERE bucket >= {first} AND bucket < {last}), "
+            f'e AS (SELECT {", ".join(e_cols)} FROM "{t}" WHERE rowid IN ('
+            f'SELECT rid FROM "{t}__time" '
+            f"WHERE (ts >= {lo_ts} AND ts < {first}) OR (ts >= {last} AND ts < {hi_ts}))) "
+            f'SELECT {", ".join(out)} FROM r, e;'
+        )
+
+
+def _split_select(text: str) -> list:
+    """
+    Split a select list on top-level commas.
+    """
+    parts, depth, current = [], 0, []
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    parts.append("".join(current))
+    return [p.strip() for p in parts]
@@ -0,0 +1,481 @@
+# llm/models/sql_engine.py
+import queue
+import sqlite3
+import hashlib
+import itertools
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+
+import pandas as pd
+
+from llm.models.ingest import ingest_frame, needs_ingest, normalize_datetime_literals
+from llm.models.sql_guard import SQLGuard
+
+
+def make_guard(guard):
+    """
+    guard: True (default budgets) | False / None (off) | an SQLGuard
+    """
+    if isinstance(guard, SQLGuard):
+        return guard
+    return SQLGuard() if guard else None
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Content hash of a DataFrame (values + column names + dtypes).
+    """
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    h.update("|".join(f"{c}:{t}" for c, t in df.dtypes.items()).encode())
+    return h.hexdigest()[:16]
+
+
+class _LoadedTable:
+    """
+    One dataset version living in a shared-cache in-memory SQLite DB.
+    The keeper connection holds the DB alive; readers come from a pool.
+    Queries pin the table (see SQLiteTableStore.checkout): an evicted table
+    is released only once its last pin is dropped, so a reader never waits
+    on a pool that eviction has emptied.
+    """
+
+    def __init__(self, uri: str, keeper: sqlite3.Connection, pool_size: int, rollups=None):
+        self.uri = uri
+        self.keeper = keeper
+        self.rollups = rollups
+        self.pool = queue.Queue()
+        self.pins = 0
+        self.closed = False      # evicted: no new pins
+        self.released = False    # connections closed
+        self._lock = threading.Lock()
+        for _ in range(pool_size):
+            self.pool.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def pin(self):
+        with self._lock:
+            self.pins += 1
+
+    def unpin(self):
+        with self._lock:
+            self.pins -= 1
+            release = self.closed and self.pins == 0
+        if release:
+            self._release()
+
+    @contextmanager
+    def reader(self):
+        with self._lock:
+            if self.released:
+                raise RuntimeError(f"{self.uri} was evicted; check the table out again")
+        conn = self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            release = self.pins == 0
+        if release:
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            if self.released:
+                return
+            self.released = True
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
+        self.keeper.close()
+
+
+class SQLiteTableStore:
+    """
+    Long-lived SQLite store for query execution.
+
+    - Each DataFrame is loaded ONCE per content version, through the typed
+      ingestion layer: timestamps are stored as TIMESTAMP columns holding
+      ISO text, so range filters compare chronologically and use the index
+    - Timestamp and high-cardinality columns are indexed at load time
+    - Hourly/daily rollups are materialized at load time and range
+      aggregates are rewritten onto them (see llm.models.rollups)
+    - Knowledge Base rule flags are materialized as `<table>__flags`
+      (see llm.models.physics_rules)
+    - Queries run on a small pool of read-only connections, through an
+      SQLGuard (plan checks, row limit, time / VM-step budget) unless guard=False
+    - Least-recently-used datasets are dropped beyond `max_tables`; queries
+      still running on a dropped table finish first (tables are pinned)
+    - Loads run outside the store lock, so one large upload does not stall
+      queries on other datasets
+    - Tables are keyed by content hash; callers that already know it (the
+      dataset registry's dataset_id) pass `fingerprint=` to skip hashing
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 4,
+        max_tables: int = 4,
+        index_cardinality: float = 0.5,
+        max_indexes: int = 4,
+        rollups: bool = True,
+        flags: bool = True,
+        guard=True,
+    ):
+        self.pool_size = pool_size
+        self.guard = make_guard(guard)
+        self.rollups = rollups
+        self.flags = flags
+        self.max_tables = max_tables
+        self.index_cardinality = index_cardinality
+        self.max_indexes = max_indexes
+
+        self._tables = {}                            # (fingerprint, table) -> _LoadedTable
+        self._loading = {}                           # key -> Future of the table being loaded
+        self._versions = itertools.count()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------
+    # LOADING
+    # ------------------------------------------------
+    def fingerprint(self, df: pd.DataFrame) -> str:
+        # hashed per call: a frame mutated in place must not hit the old table
+        return frame_fingerprint(df)
+
+    def index_columns(self, df: pd.DataFrame) -> list:
+        """
+        Columns worth a B-tree index: timestamps first, then
+        high-cardinality columns.
+        """
+        n = max(len(df), 1)
+        timestamps, others = [], []
+
+        for col in df.columns:
+            name = str(col).lower()
+            if pd.api.types.is_datetime64_any_dtype(df[col]) or any(
+                k in name for k in ("date", "time")
+            ):
+                timestamps.append(col)
+            elif df[col].nunique(dropna=True) / n >= self.index_cardinality:
+                others.append(col)
+
+        return (timestamps + others)[: self.max_indexes]
+
+    def _load(self, fp: str, df: pd.DataFrame, table_name: str) -> _LoadedTable:
+        # unique per load: a reloaded table never shares a DB with its evicted, still-pinned copy
+        uri = f"file:mdis_{fp}_{table_name}_{next(self._versions)}?mode=memory&cache=shared"
+        keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+        df = ingest_frame(df)
+        df.to_sql(table_name, keeper, if_exists="replace", index=False)
+
+        for i, col in enumerate(self.index_columns(df)):
+            keeper.execute(
+                f'CREATE INDEX IF NOT EXISTS "idx_{table_name}_{i}" '
+                f'ON "{table_name}" ("{col}")'
+            )
+
+        rollups = None
+        if self.rollups:
+            from llm.models.rollups import Rollups
+
+            rollups = Rollups.build(keeper, df, table_name)
+
+        if self.flags:
+            from llm.models.physics_rules import RuleEngine
+
+            flags_table = f"{table_name}__flags"
+            flags = RuleEngine().evaluate(df)
+            if len(flags.columns) > 3:                 # rid, ts, n_flags only: no rule applies
+                flags.to_sql(flags_table, keeper, if_exists="replace", index=False)
+                keeper.execute(f'CREATE INDEX "idx_{flags_table}_rid" ON "{flags_table}" (rid)')
+
+        keeper.execute("ANALYZE")
+        keeper.commit()
+
+        return _LoadedTable(uri, keeper, self.pool_size, rollups)
+
+    def _acquire(self, key, df: pd.DataFrame, table_name: str) -> _LoadedTable:
+        """
+        The pinned table for `key`, loaded on a miss without holding the
+        store lock (concurrent requests for the same key wait for one load;
+        queries on other datasets are not blocked).
+        """
+        while True:
+            with self._lock:
+                loaded = self._tables.pop(key, None)
+                if loaded is not None:
+                    self._tables[key] = loaded
+                    loaded.pin()
+                    return loaded
+                pending = self._loading.get(key)
+                if pending is None:
+                    future = self._loading[key] = Future()
+                    break
+            pending.result()  # then look again: it may already have been evicted
+
+        try:
+            loaded = self._load(key[0], df, table_name)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+
+        evicted = []
+        with self._lock:
+            del self._loading[key]
+            self._tables[key] = loaded
+            loaded.pin()
+            while len(self._tables) > self.max_tables:
+                evicted.append(self._tables.pop(next(iter(self._tables))))
+        future.set_result(loaded)
+
+        for old in evicted:
+            old.close()
+        return loaded
+
+    @contextmanager
+    def checkout(self, df: pd.DataFrame, table_name: str = "data", fingerprint: str = None):
+        """
+        The loaded table, pinned against eviction until the block exits.
+        """
+        loaded = self._acquire((fingerprint or self.fingerprint(df), table_name), df, table_name)
+        try:
+            yield loaded
+        finally:
+            loaded.unpin()
+
+    def table(self, df: pd.DataFrame, table_name: str = "data", fingerprint: str = None) -> _LoadedTable:
+        """
+        Load (or touch) the table without holding a pin, e.g. to warm it up.
+        """
+        with self.checkout(df, table_name, fingerprint) as loaded:
+            return loaded
+
+    # ------------------------------------------------
+    # QUERY
+    # ------------------------------------------------
+    def query(
+        self,
+        df: pd.DataFrame,
+        sql_query: str,
+        table_name: str = "data",
+        fingerprint: str = None,
+    ) -> pd.DataFrame:
+        sql_query = normalize_datetime_literals(sql_query)
+        with self.checkout(df, table_name, fingerprint) as loaded:
+            if loaded.rollups is not None:
+                sql_query = loaded.rollups.rewrite(sql_query) or sql_query
+            with loaded.reader() as conn:
+                if self.guard is not None:
+                    return self.guard.execute(conn, sql_query)
+                return pd.read_sql_query(sql_query, conn)
+
+    def query_arrow(
+        self,
+        df: pd.DataFrame,
+        sql_query: str,
+        table_name: str = "data",
+        fingerprint: str = None,
+    ):
+        import pyarrow as pa
+
+        return pa.Table.from_pandas(
+            self.query(df, sql_query, table_name, fingerprint), preserve_index=False
+        )
+
+    def close(self):
+        with self._lock:
+            tables = list(self._tables.values())
+            self._tables.clear()
+        for loaded in tables:
+            loaded.close()
+
+
+# ------------------------------------------------
+# DUCKDB (columnar, vectorized)
+# ------------------------------------------------
+class DuckDBEngine:
+    """
+    DuckDB execution backend.
+
+    - The caller's frame is registered as a view as-is (DuckDB scans pandas/Arrow
+      buffers in place, no INSERT copy), next to its `<table>__flags` view;
+      only a raw frame with text timestamps / numbers is typed first, and
+      never downcast (DOUBLE columns stay DOUBLE)
+    - One connection per dataset version; each query uses its own cursor
+      (views are cursor-local, so the frame is re-registered per cursor,
+      which is a metadata-only operation)
+    - Results can be returned as a DataFrame or an Arrow table
+    - With a guard, queries go through SQLGuard.execute_duckdb (statement /
+      plan checks, row limit, wall-clock budget); results are then DataFrames
+    """
+
+    def __init__(self, max_tables: int = 4, threads: int = None, guard=True):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError(
+                "DuckDBEngine requires `duckdb` (pip install duckdb pyarrow)"
+            ) from e
+
+        self._duckdb = duckdb
+        self.max_tables = max_tables
+        self.threads = threads
+        self.guard = make_guard(guard)
+
+        self._tables = {}                            # (fingerprint, table) -> (conn, {view: frame})
+        self._lock = threading.Lock()
+
+    def fingerprint(self, df: pd.DataFrame) -> str:
+        return frame_fingerprint(df)
+
+    def connection(self, df: pd.DataFrame, table_name: str = "data", fingerprint: str = None):
+        key = (fingerprint or self.fingerprint(df), table_name)
+
+        with self._lock:
+            entry = self._tables.pop(key, None)
+            if entry is None:
+                from llm.models.physics_rules import RuleEngine
+
+                typed = ingest_frame(df, downcast=False) if needs_ingest(df) else df
+                views = {table_name: typed, f"{table_name}__flags": RuleEngine().evaluate(typed)}
+                conn = self._duckdb.connect(database=":memory:")
+                if self.threads:
+                    conn.execute(f"SET threads = {int(self.threads)}")
+                for name, frame in views.items():
+                    conn.register(name, frame)
+                entry = (conn, views)
+            self._tables[key] = entry
+
+            while len(self._tables) > self.max_tables:
+                oldest = next(iter(self._tables))
+                self._tables.pop(oldest)[0].close()
+
+        return entry
+
+    @contextmanager
+    def cursor(self, df: pd.DataFrame, table_name: str = "data", fingerprint: str = None):
+        conn, views = self.connection(df, table_name, fingerprint)
+        cursor = conn.cursor()
+        try:
+            for name, frame in views.items():
+                cursor.register(name, frame)
+            yield cursor
+        finally:
+            cursor.close()
+
+    def query_arrow(
+        self,
+        df: pd.DataFrame,
+        sql_query: str,
+        table_name: str = "data",
+        fingerprint: str = None,
+    ):
+        if self.guard is not None:
+            import pyarrow as pa
+
+            return pa.Table.from_pandas(
+                self.query(df, sql_query, table_name, fingerprint), preserve_index=False
+            )
+        with self.cursor(df, table_name, fingerprint) as cursor:
+            return cursor.execute(normalize_datetime_literals(sql_query)).fetch_arrow_table()
+
+    def query(
+        self,
+        df: pd.DataFrame,
+        sql_query: str,
+        table_name: str = "data",
+        fingerprint: str = None,
+    ) -> pd.DataFrame:
+        with self.cursor(df, table_name, fingerprint) as cursor:
+            if self.guard is not None:
+                return self.guard.execute_duckdb(cursor, normalize_datetime_literals(sql_query))
+            return cursor.execute(normalize_datetime_literals(sql_query)).df()
+
+    def close(self):
+        with self._lock:
+            for conn, _ in self._tables.values():
+                conn.close()
+            self._tables.clear()
+
+
+ENGINES = {
+    "sqlite": SQLiteTableStore,
+    "duckdb": DuckDBEngine,
+}
+
+
+def make_engine(name: str = "sqlite", **kwargs):
+    """
+    Build an execution engine by name ("sqlite" | "duckdb").
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown SQL engine: {name} (expected one of {sorted(ENGINES)})")
+    return ENGINES[name](**kwargs)
+
+
+class SQLExecutor:
+    """
+    Runs SQL over a DataFrame on an engine; needs no model, so graph nodes
+    call it without loading (or swapping in) SQLCoder.
+    """
+
+    def __init__(self, engine: str = "sqlite", **kwargs):
+        self.engine = make_engine(engine, **kwargs)
+
+    def execute_sql(
+        self,
+        df: pd.DataFrame,
+        sql_query: str,
+        db_path: str = ":memory:",
+        table_name: str = "data",
+        as_arrow: bool = False,
+        fingerprint: str = None,
+    ):
+        """
+        Executes SQL on the engine; df is loaded as table `data` by default.
+
+        In-memory execution goes through the long-lived engine, so each
+        dataset version is loaded once, not once per query.
+        as_arrow=True returns a pyarrow.Table instead of a DataFrame.
+        fingerprint: df's content hash when known (dataset_id), else hashed.
+        """
+        if db_path == ":memory:":
+            if as_arrow:
+                return self.engine.query_arrow(df, sql_query, table_name=table_name, fingerprint=fingerprint)
+            return self.engine.query(df, sql_query, table_name=table_name, fingerprint=fingerprint)
+
+        conn = sqlite3.connect(db_path)
+        try:
+            ingest_frame(df).to_sql(table_name, conn, if_exists="replace", index=False)
+
+            sql_query = normalize_datetime_literals(sql_query)
+            guard = getattr(self.engine, "guard", None)
+            if guard is not None:
+                return guard.execute(conn, sql_query)
+            return pd.read_sql_query(sql_query, conn)
+        finally:
+            conn.close()
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(engine: str = "sqlite") -> SQLExecutor:
+    """
+    Shared SQLExecutor per engine name: one loaded-table store per process.
+    """
+    with _executors_lock:
+        if engine not in _executors:
+            _executors[engine] = SQLExecutor(engine)
+        return _executors[engine]
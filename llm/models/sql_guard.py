@@ -0,0 +1,295 @@
+# llm/models/sql_guard.py
+import re
+import time
+import sqlite3
+import threading
+from collections import defaultdict
+
+import pandas as pd
+
+
+AGGREGATES = {"count", "sum", "avg", "min", "max", "total", "group_concat", "string_agg"}
+
+# abort reasons (GuardError.reason)
+REASONS = {
+    "empty": "no SQL statement",
+    "multiple_statements": "more than one statement",
+    "not_select": "only SELECT / WITH queries may run",
+    "invalid_sql": "SQLite could not prepare the query",
+    "self_join": "full self-join (the same table scanned in full twice in one loop)",
+    "cartesian_join": "unconstrained join of full table scans",
+    "timeout": "wall-clock budget exceeded",
+    "step_budget": "VM-step budget exceeded",
+}
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<string>'(?:[^']|'')*'?)
+  | (?P<ident>"(?:[^"]|"")*"?|`[^`]*`?|\[[^\]]*\]?)
+  | (?P<word>[A-Za-z_][A-Za-z_0-9$]*)
+  | (?P<other>.)
+    """,
+    re.S | re.X,
+)
+
+
+_ALIAS_RE = re.compile(r'(?:\bFROM|\bJOIN|,)\s+("?\w+"?)\s+(?:AS\s+)?("?\w+"?)', re.I)
+_NOT_ALIAS = {
+    "where", "join", "on", "using", "left", "right", "inner", "outer", "cross", "natural",
+    "full", "group", "order", "limit", "union", "except", "intersect", "window", "having",
+}
+
+
+class GuardError(ValueError):
+    """
+    A query the guard refused or aborted. `reason` is one of REASONS;
+    `as_dict()` is what the graph state carries.
+    """
+
+    def __init__(self, reason: str, detail: str = "", sql: str = None, **info):
+        self.reason = reason
+        self.detail = detail or REASONS.get(reason, reason)
+        self.sql = sql
+        self.info = info
+        super().__init__(f"{reason}: {self.detail}")
+
+    def as_dict(self) -> dict:
+        return {"reason": self.reason, "detail": self.detail, "sql": self.sql, **self.info}
+
+
+def _tokens(sql: str):
+    """
+    (kind, text, paren depth, end offset) for the code outside strings and comments.
+    """
+    depth = 0
+    for m in _TOKEN_RE.finditer(sql):
+        kind = m.lastgroup
+        if kind in ("ws", "comment"):
+            continue
+        text = m.group()
+        if text == ")":
+            depth -= 1
+        yield kind, text, depth, m.end()
+        if text == "(":
+            depth += 1
+
+
+class SQLGuard:
+    """
+    Pre-execution checks and execution budgets for generated SQL.
+
+    check():
+    - exactly one SELECT / WITH statement
+    - EXPLAIN QUERY PLAN must not contain a full self-join or an
+      unconstrained join of full scans (nested loops over whole tables)
+    - non-aggregate queries without a top-level LIMIT get `LIMIT row_limit + 1`
+      (the extra row tells the caller the result was truncated)
+
+    execute():
+    - SQLite progress handler every `check_every` VM steps enforces
+      `timeout_s` and `max_vm_steps`; the query is interrupted as soon as a
+      budget is spent, so it overruns by at most `check_every` steps
+    - at most `row_limit` rows are fetched (aggregates included); the frame
+      carries attrs["truncated"] / attrs["row_limit"]
+    Every refusal / abort raises GuardError with a structured reason.
+    """
+
+    def __init__(
+        self,
+        row_limit: int = 1000,
+        timeout_s: float = 5.0,
+        max_vm_steps: int = 50_000_000,
+        check_every: int = 1000,
+    ):
+        self.row_limit = row_limit
+        self.timeout_s = timeout_s
+        self.max_vm_steps = max_vm_steps
+        self.check_every = check_every
+
+        self._stats = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    # ------------------------------------------------
+    # STATIC CHECKS
+    # ------------------------------------------------
+    def parse(self, sql: str) -> dict:
+        """
+        Statement shape from the token stream: leading keyword, whether it
+        aggregates, whether it has a top-level LIMIT.
+        """
+        tokens = list(_tokens(sql))
+        while tokens and tokens[-1][1] == ";":
+            tokens.pop()
+        if not tokens:
+            raise GuardError("empty", sql=sql)
+        if any(text == ";" for _, text, _, _ in tokens):
+            raise GuardError("multiple_statements", sql=sql)
+
+        first = tokens[0][1].lower()
+        if first not in ("select", "with"):
+            raise GuardError("not_select", f"statement starts with {first.upper()}", sql=sql)
+
+        code = " ".join(text for _, text, _, _ in tokens)
+        aliases = {
+            alias.strip('"'): table.strip('"')
+            for table, alias in _ALIAS_RE.findall(code)
+            if alias.lower() not in _NOT_ALIAS
+        }
+
+        top = [text.lower() for kind, text, depth, _ in tokens if kind == "word" and depth == 0]
+        aggregate = "group" in top or any(
+            kind == "word" and depth == 0 and text.lower() in AGGREGATES and nxt == "("
+            for (kind, text, depth, _), (_, nxt, _, _) in zip(tokens, tokens[1:])
+        )
+        return {
+            "sql": sql[: tokens[-1][3]].strip(),  # without trailing ';' / comments
+            "aggregate": aggregate,
+            "limit": "limit" in top,
+            "aliases": aliases,
+        }
+
+    def inspect_plan(self, conn: sqlite3.Connection, sql: str, aliases: dict = None) -> list:
+        """
+        EXPLAIN QUERY PLAN rows as (id, parent, detail); raises GuardError
+        for plans that nest full scans of whole tables. The plan names
+        aliased tables by alias; `aliases` maps them back.
+        """
+        aliases = aliases or {}
+        # materialized CTEs / subqueries show up as SCANs too: only base tables count
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        try:
+            plan = [(row[0], row[1], row[3]) for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+        except sqlite3.Error as e:
+            raise GuardError("invalid_sql", str(e), sql=sql)
+
+        # plan rows under one parent run as one nested loop
+        scans = defaultdict(list)
+        for _, parent, detail in plan:
+            m = re.match(r"(SCAN|SEARCH) (\S+)", detail)
+            if m is None or "AUTOMATIC" in detail:
+                continue
+            table = aliases.get(m.group(2), m.group(2))
+            if table in tables:
+                scans[parent].append((m.group(1), table))
+
+        for loop in scans.values():
+            full = [table for kind, table in loop if kind == "SCAN"]
+            if len(full) < 2:
+                continue
+            repeated = {t for t in full if full.count(t) > 1}
+            if repeated:
+                raise GuardError("self_join", sql=sql, tables=sorted(repeated), plan=[d for *_, d in plan])
+            raise GuardError("cartesian_join", sql=sql, tables=full, plan=[d for *_, d in plan])
+        return plan
+
+    def check(self, conn: sqlite3.Connection, sql: str) -> str:
+        """
+        The SQL to run (possibly with an injected LIMIT), or GuardError.
+        """
+        try:
+            parsed = self.parse(sql)
+            self.inspect_plan(conn, parsed["sql"], parsed["aliases"])
+        except GuardError as e:
+            self._count(e.reason)
+            raise
+
+        if parsed["aggregate"] or parsed["limit"]:
+            return parsed["sql"]
+        self._count("limit_injected")
+        return f"{parsed['sql']}\nLIMIT {self.row_limit + 1}"
+
+    # ------------------------------------------------
+    # EXECUTION
+    # ------------------------------------------------
+    def execute(self, conn: sqlite3.Connection, sql: str) -> pd.DataFrame:
+        guarded = self.check(conn, sql)
+
+        state = {"steps": 0, "reason": None}
+        deadline = time.perf_counter() + self.timeout_s
+
+        def _progress():
+            state["steps"] += self.check_every
+            if state["steps"] > self.max_vm_steps:
+                state["reason"] = "step_budget"
+            elif time.perf_counter() > deadline:
+                state["reason"] = "timeout"
+            return 1 if state["reason"] else 0  # non-zero interrupts the query
+
+        start = time.perf_counter()
+        conn.set_progress_handler(_progress, self.check_every)
+        try:
+            cursor = conn.execute(guarded)
+            rows = cursor.fetchmany(self.row_limit + 1)
+            columns = [d[0] for d in cursor.description or ()]
+            cursor.close()
+        except sqlite3.OperationalError as e:
+            if state["reason"] is None:
+                raise GuardError("invalid_sql", str(e), sql=guarded)
+            self._count(state["reason"])
+            raise GuardError(
+                state["reason"],
+                sql=guarded,
+                vm_steps=state["steps"],
+                elapsed_s=round(time.perf_counter() - start, 3),
+            )
+        finally:
+            conn.set_progress_handler(None, 0)
+
+        truncated = len(rows) > self.row_limit
+        if truncated:
+            self._count("truncated")
+        result = pd.DataFrame.from_records(rows[: self.row_limit], columns=columns)
+        result.attrs.update(truncated=truncated, row_limit=self.row_limit)
+        return result
+
+    def execute_duckdb(self, cursor, sql: str) -> pd.DataFrame:
+        """
+        DuckDB has no VM-step hook: same statement checks and LIMIT
+        injection, CROSS_PRODUCT plans refused, the wall-clock budget
+        enforced with `interrupt()`.
+        """
+        try:
+            parsed = self.parse(sql)
+            try:
+                plan = cursor.execute(f"EXPLAIN {parsed['sql']}").fetchall()
+            except Exception as e:  # duckdb.Error: parser / binder / catalog
+                raise GuardError("invalid_sql", str(e), sql=parsed["sql"])
+            if "CROSS_PRODUCT" in " ".join(str(row[-1]) for row in plan):
+                tables = set(parsed["aliases"].values())
+                reason = "self_join" if len(tables) < len(parsed["aliases"]) else "cartesian_join"
+                raise GuardError(reason, sql=parsed["sql"])
+        except GuardError as e:
+            self._count(e.reason)
+            raise
+
+        guarded = parsed["sql"]
+        if not (parsed["aggregate"] or parsed["limit"]):
+            guarded = f"{guarded}\nLIMIT {self.row_limit + 1}"
+
+        timer = threading.Timer(self.timeout_s, cursor.interrupt)
+        timer.start()
+        try:
+            cursor.execute(guarded)
+            rows = cursor.fetchmany(self.row_limit + 1)
+            columns = [d[0] for d in cursor.description or ()]
+        except Exception as e:
+            if not timer.is_alive():
+                self._count("timeout")
+                raise GuardError("timeout", sql=guarded)
+            raise GuardError("invalid_sql", str(e), sql=guarded)
+        finally:
+            timer.cancel()
+
+        result = pd.DataFrame.from_records(rows[: self.row_limit], columns=columns)
+        result.attrs.update(truncated=len(rows) > self.row_limit, row_limit=self.row_limit)
+        return result
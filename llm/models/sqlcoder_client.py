@@ -1,16 +1,22 @@
 # llm/models/sqlcoder_client.py
-import sqlite3
 import torch
 import pandas as pd
 from transformers import AutoTokenizer, AutoModelForCausalLM
 import re 
 
+from llm.models.sql_engine import get_executor
+from llm.models.prefix_cache import PrefixKVCache
+
 
 class SQLCoderClient:
     """
     SQLCoder client:
     - Generates SQL from schema + NL query
-    - Executes SQL on SQLite (in-memory by default)
+    - Executes SQL on a pluggable engine:
+        "sqlite" (persistent in-memory store, default) or "duckdb";
+      execution needs no model (llm.models.sql_engine.SQLExecutor)
+    - Reuses the KV cache of the prompt template's static prefix
+      (llm.models.prefix_cache); prefix_cache_mb=0 disables it
     """
 
     def __init__(
@@ -18,6 +24,8 @@ class SQLCoderClient:
         model_name: str = "defog/sqlcoder-7b-2",
         device: str = "cuda",
         dtype=torch.float16,
+        engine: str = "sqlite",
+        prefix_cache_mb: float = 128,
     ):
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.model = AutoModelForCausalLM.from_pretrained(
@@ -25,6 +33,16 @@ class SQLCoderClient:
             torch_dtype=dtype,
             device_map="auto",
         )
+        # shared with the model manager's CPU companion: one table store per engine
+        self.executor = get_executor(engine)
+        self.engine = self.executor.engine
+        self.prefix_cache = None
+        if prefix_cache_mb:
+            self.prefix_cache = PrefixKVCache(
+                self.model,
+                self.tokenizer,
+                max_bytes=int(prefix_cache_mb * 1024**2),
+            )
 
     # ------------------------------------------------
     # 1. SQL GENERATION
@@ -35,6 +53,9 @@ class SQLCoderClient:
             prompt,
             return_tensors="pt",
         ).to(self.model.device)
+        prefix_kwargs = {}
+        if self.prefix_cache is not None:
+            prefix_kwargs = self.prefix_cache.generate_kwargs(prompt, inputs["input_ids"])
 
         with torch.no_grad():
             output_ids = self.model.generate(
@@ -42,6 +63,7 @@ class SQLCoderClient:
                 max_new_tokens=256,
                 temperature=0.0,
                 do_sample=False,
+                **prefix_kwargs,
             )
 
         decoded = self.tokenizer.decode(
@@ -59,44 +81,20 @@ class SQLCoderClient:
         return sql.rstrip(";") + ";"
 
     # ------------------------------------------------
-    # 2. SQLITE EXECUTION
+    # 2. SQL EXECUTION
     # ------------------------------------------------
-    def execute_sql(
-        self,
-        df: pd.DataFrame,
-        sql_query: str,
-        db_path: str = ":memory:",
-        table_name: str = "data",
-    ) -> pd.DataFrame:
+    def execute_sql(self, df: pd.DataFrame, sql_query: str, **kwargs) -> pd.DataFrame:
         """
-        Executes SQL on SQLite.
-        df is loaded as table `data` by default.
+        Executes SQL on the configured engine (see SQLExecutor.execute_sql).
         """
+        return self.executor.execute_sql(df, sql_query, **kwargs)
 
-        conn = sqlite3.connect(db_path)
-
-        try:
-            df.to_sql(
-                table_name,
-                conn,
-                if_exists="replace",
-                index=False,
-            )
 
-            result = pd.read_sql_query(sql_query, conn)
-        finally:
-            conn.close()
+def get_sqlcoder():
+    """
+    Lazy-loaded SQLCoderClient, owned by the model manager.
+    """
+    from llm.models.model_manager import get_manager
 
-        return result
-    
-    
-    _sqlcoder_instance = None
-    def get_sqlcoder():
-        """
-        Lazy-loaded singleton for SQLCoderClient.
-        """
-        global _sqlcoder_instance
-        if _sqlcoder_instance is None:
-            _sqlcoder_instance = SQLCoderClient()
-        return _sqlcoder_instance
+    return get_manager().get("sqlcoder")
 
@@ -0,0 +1,191 @@
+# llm/models/vision_cache.py
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from PIL import Image
+
+
+def content_hash(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def perceptual_hash(image: Image.Image, size: int = 8) -> int:
+    """
+    64-bit difference hash (dHash): survives re-encoding / resizing.
+    """
+    gray = image.convert("L").resize((size + 1, size), Image.LANCZOS)
+    px = list(gray.getdata())
+
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = px[row * (size + 1) + col]
+            right = px[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class VisionCache:
+    """
+    Two-tier cache for Qwen chart extractions.
+
+    Key: image content hash + prompt hash + preprocessing `settings`
+    (e.g. the visual-token budget), so results extracted at one budget are
+    never served for another.
+    - memory tier: LRU, bounded by `max_entries`
+    - disk tier  : one JSON file per key in `disk_dir`, bounded by `max_disk_entries`
+    - use_phash  : on an exact miss, accept a result for a visually identical
+                   image (dHash distance <= `phash_distance`) with the same prompt
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        disk_dir: Optional[str] = None,
+        max_disk_entries: int = 4096,
+        use_phash: bool = False,
+        phash_distance: int = 4,
+    ):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self.use_phash = use_phash
+        self.phash_distance = phash_distance
+
+        self._memory = OrderedDict()    # key -> result
+        self._phashes = {}              # prompt+settings hash -> {phash: key}
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "phash_hits": 0, "misses": 0}
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # --------------------------------------------------
+    # KEYS
+    # --------------------------------------------------
+    @staticmethod
+    def prompt_hash(prompt: str, settings: str = "") -> str:
+        text = f"{prompt}\x00{settings}" if settings else prompt
+        return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+    def key(self, image_bytes: bytes, prompt: str, settings: str = "") -> str:
+        return f"{content_hash(image_bytes)[:32]}_{self.prompt_hash(prompt, settings)}"
+
+    # --------------------------------------------------
+    # LOOKUP
+    # --------------------------------------------------
+    def get(self, image_bytes: bytes, prompt: str, image: Image.Image = None, settings: str = ""):
+        key = self.key(image_bytes, prompt, settings)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return self._memory[key]
+
+        result = self._read_disk(key)
+        if result is not None:
+            self._remember(key, result)
+            with self._lock:
+                self._stats["disk_hits"] += 1
+            return result
+
+        if self.use_phash and image is not None:
+            result = self._phash_lookup(image, prompt, settings)
+            if result is not None:
+                with self._lock:
+                    self._stats["phash_hits"] += 1
+                return result
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def _phash_lookup(self, image: Image.Image, prompt: str, settings: str = ""):
+        ph = perceptual_hash(image)
+        with self._lock:
+            candidates = self._phashes.get(self.prompt_hash(prompt, settings), {})
+            for other, key in candidates.items():
+                if hamming(ph, other) <= self.phash_distance and key in self._memory:
+                    self._memory.move_to_end(key)
+                    return self._memory[key]
+        return None
+
+    # --------------------------------------------------
+    # STORE
+    # --------------------------------------------------
+    def put(self, image_bytes: bytes, prompt: str, result, image: Image.Image = None, settings: str = ""):
+        key = self.key(image_bytes, prompt, settings)
+        self._remember(key, result)
+
+        if self.use_phash and image is not None:
+            with self._lock:
+                self._phashes.setdefault(self.prompt_hash(prompt, settings), {})[
+                    perceptual_hash(image)
+                ] = key
+
+        self._write_disk(key, result)
+
+    def _remember(self, key: str, result):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                evicted, _ = self._memory.popitem(last=False)
+                for index in self._phashes.values():
+                    for ph in [p for p, k in index.items() if k == evicted]:
+                        del index[ph]
+
+    # --------------------------------------------------
+    # DISK TIER
+    # --------------------------------------------------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                result = json.load(f)["result"]
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(path)  # LRU on disk = most recently touched
+        return result
+
+    def _write_disk(self, key: str, result):
+        if not self.disk_dir:
+            return
+        # private tmp file in the same directory: concurrent writers of one key never share it
+        fd, tmp = tempfile.mkstemp(dir=self.disk_dir, prefix=f".{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"result": result}, f)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        files = [
+            os.path.join(self.disk_dir, name)
+            for name in os.listdir(self.disk_dir)
+            if name.endswith(".json")
+        ]
+        if len(files) > self.max_disk_entries:
+            files.sort(key=os.path.getmtime)
+            for path in files[: len(files) - self.max_disk_entries]:
+                os.remove(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._memory))
@@ -0,0 +1,15 @@
+# tests/conftest.py
+import os
+
+import pandas as pd
+import pytest
+
+from llm.models.ingest import ingest_frame
+
+
+TELEMETRY_CSV = os.path.join(os.path.dirname(__file__), "..", "data", "telemetry_data.csv")
+
+
+@pytest.fixture(scope="session")
+def telemetry() -> pd.DataFrame:
+    return ingest_frame(pd.read_csv(TELEMETRY_CSV))
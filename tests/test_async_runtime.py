@@ -0,0 +1,97 @@
+# tests/test_async_runtime.py
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+from workflow.async_runtime import GPUWorker, run_cpu
+
+
+current = contextvars.ContextVar("current", default=None)
+
+
+@pytest.fixture
+def gpu():
+    worker = GPUWorker(name="test-gpu")
+    yield worker
+    worker.close()
+
+
+def _gate(gpu):
+    """
+    Occupy the worker until the returned event is set, so later jobs queue up.
+    """
+    started, release = threading.Event(), threading.Event()
+    gpu.submit(lambda: (started.set(), release.wait(5)))
+    assert started.wait(5)
+    return release
+
+
+def test_jobs_run_one_at_a_time_on_the_worker_thread(gpu):
+    active, peak, threads = [0], [0], set()
+    lock = threading.Lock()
+
+    def _job(i):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        threads.add(threading.current_thread().name)
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return i
+
+    async def _main():
+        return await asyncio.gather(*(gpu.run(_job, i) for i in range(8)))
+
+    assert asyncio.run(_main()) == list(range(8))
+    assert peak[0] == 1 and threads == {"test-gpu"}
+
+
+def test_waiting_jobs_with_one_key_share_a_batch(gpu):
+    calls = []
+
+    def _batch(items, prompt):
+        calls.append(list(items))
+        return [f"{prompt}:{i}" for i in items]
+
+    release = _gate(gpu)
+    a = [gpu.submit_batched("k", _batch, i, prompt="p") for i in range(3)]
+    other = gpu.submit_batched("other", _batch, 9, prompt="q")
+    release.set()
+
+    assert [f.result(timeout=5) for f in a] == ["p:0", "p:1", "p:2"]
+    assert other.result(timeout=5) == "q:9"
+    assert calls == [[0, 1, 2], [9]]
+    assert gpu.stats["batched_items"] == 4
+
+
+def test_errors_reach_the_caller_and_the_worker_survives(gpu):
+    def _fail():
+        raise RuntimeError("CUDA out of memory")
+
+    async def _main():
+        with pytest.raises(RuntimeError, match="out of memory"):
+            await gpu.run(_fail)
+        return await gpu.run(lambda: "still serving")
+
+    assert asyncio.run(_main()) == "still serving"
+
+
+def test_nested_submit_runs_inline(gpu):
+    def _outer():
+        return gpu.submit(lambda: "inner").result(timeout=5) + "+outer"
+
+    assert gpu.submit(_outer).result(timeout=5) == "inner+outer"
+
+
+def test_contextvars_follow_the_job(gpu):
+    async def _main():
+        current.set("session-1")
+        on_gpu = await gpu.run(current.get)
+        on_cpu = await run_cpu(current.get)
+        return on_gpu, on_cpu
+
+    assert asyncio.run(_main()) == ("session-1", "session-1")
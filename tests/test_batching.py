@@ -0,0 +1,82 @@
+# tests/test_batching.py
+import threading
+
+import pytest
+
+from llm.models.batching import MicroBatcher
+
+
+class _Recorder:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, items, **kwargs):
+        with self.lock:
+            self.calls.append((list(items), kwargs))
+        return [f"{kwargs.get('prompt', '')}:{item}" for item in items]
+
+
+def test_concurrent_submits_share_one_call():
+    fn = _Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=8, max_wait_ms=200)
+
+    futures = [batcher.submit(i, prompt="p") for i in range(4)]
+    assert [f.result(timeout=5) for f in futures] == ["p:0", "p:1", "p:2", "p:3"]
+    assert fn.calls == [([0, 1, 2, 3], {"prompt": "p"})]
+    assert batcher.stats()["mean_batch_size"] == 4.0
+
+
+def test_threads_blocking_on_call_are_merged():
+    fn = _Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=8, max_wait_ms=200)
+    results = [None] * 3
+
+    def _call(i):
+        results[i] = batcher(i, prompt="p")
+
+    threads = [threading.Thread(target=_call, args=(i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert results == ["p:0", "p:1", "p:2"]
+    assert sorted(fn.calls[0][0]) == [0, 1, 2] and len(fn.calls) == 1
+
+
+def test_different_kwargs_are_not_mixed():
+    fn = _Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=8, max_wait_ms=200)
+
+    futures = [batcher.submit(i, prompt="a" if i % 2 else "b") for i in range(4)]
+    assert [f.result(timeout=5) for f in futures] == ["b:0", "a:1", "b:2", "a:3"]
+    assert sorted(fn.calls, key=lambda c: c[1]["prompt"]) == [
+        ([1, 3], {"prompt": "a"}),
+        ([0, 2], {"prompt": "b"}),
+    ]
+
+
+def test_max_batch_size_splits_batches():
+    fn = _Recorder()
+    batcher = MicroBatcher(fn, max_batch_size=2, max_wait_ms=200)
+
+    futures = [batcher.submit(i) for i in range(5)]
+    assert [f.result(timeout=5) for f in futures] == [":0", ":1", ":2", ":3", ":4"]
+    assert [items for items, _ in fn.calls] == [[0, 1], [2, 3], [4]]
+    assert batcher.stats()["batches"] == 3
+
+
+def test_batch_error_reaches_every_caller():
+    def _fail(items):
+        raise ValueError("bad batch")
+
+    batcher = MicroBatcher(_fail, max_wait_ms=100)
+    futures = [batcher.submit(i) for i in range(3)]
+    for f in futures:
+        with pytest.raises(ValueError, match="bad batch"):
+            f.result(timeout=5)
+
+    # the worker survives a failed batch
+    batcher.batch_fn = lambda items: [i * 2 for i in items]
+    assert batcher(21) == 42
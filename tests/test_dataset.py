@@ -0,0 +1,64 @@
+# tests/test_dataset.py
+import asyncio
+
+import pandas as pd
+import pytest
+
+from workflow import dataset
+from workflow.dataset import DatasetRegistry, merge_timings, resolve_dataset, timed
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = DatasetRegistry(max_datasets=2)
+    monkeypatch.setattr(dataset, "_registry", registry)
+    return registry
+
+
+def _csv(tmp_path, name="speeds.csv"):
+    path = tmp_path / name
+    path.write_text("StartDateUTC,Speed\n31-12-2024 08:00,11.5\n31-12-2024 08:10,12.0\n")
+    return str(path)
+
+
+def test_paths_are_parsed_once_and_typed(registry, tmp_path, monkeypatch):
+    reads = []
+    read_csv = pd.read_csv
+    monkeypatch.setattr(pd, "read_csv", lambda path: reads.append(path) or read_csv(path))
+
+    path = _csv(tmp_path)
+    first = registry.load_path(path)
+    assert registry.load_path(path) == first and len(reads) == 1
+    assert pd.api.types.is_datetime64_any_dtype(registry.get(first)["StartDateUTC"])
+
+
+def test_state_resolves_by_dataset_id_before_path(registry, tmp_path):
+    df = pd.DataFrame({"Speed": [1.0, 2.0]})
+    dataset_id = dataset.register_dataframe(df)
+    assert resolve_dataset({"dataset_id": dataset_id, "dataframe_path": "missing.csv"}) == (dataset_id, df)
+
+    # unknown or evicted ids fall back to the path
+    path_id, frame = resolve_dataset({"dataset_id": "gone", "dataframe_path": _csv(tmp_path)})
+    assert path_id in registry and len(frame) == 2
+
+    with pytest.raises(ValueError):
+        resolve_dataset({"dataset_id": "gone"})
+
+
+def test_registry_evicts_least_recently_used(registry):
+    ids = [registry.register(pd.DataFrame({"x": [i]})) for i in range(2)]
+    registry.get(ids[0])
+    registry.register(pd.DataFrame({"x": [9]}))
+    assert ids[0] in registry and ids[1] not in registry
+
+
+def test_timed_reports_node_wall_time_sync_and_async():
+    update = timed("node", lambda state: {"out": 1, "timings": {"inner": 1.0}})({})
+    assert update["out"] == 1 and set(update["timings"]) == {"inner", "node"}
+
+    async def _node(state):
+        return {"out": 2}
+
+    update = asyncio.run(timed("anode", _node)({}))
+    assert update["out"] == 2 and update["timings"]["anode"] >= 0
+    assert merge_timings({"a": 1}, {"b": 2}) == {"a": 1, "b": 2}
@@ -0,0 +1,62 @@
+# tests/test_fast_router.py
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from workflow.fast_router import fast_router_node, keyword_scores
+from workflow.router import ROUTES, SQL_ROUTES, VISION_ROUTES
+
+
+class FakeLLM:
+    def __init__(self, label):
+        self.label = label
+        self.calls = 0
+
+    def classify(self, prompt, labels):
+        self.calls += 1
+        return self.label, 0.9
+
+
+class FakeManager:
+    def __init__(self):
+        self.prefetched = []
+
+    def prefetch_for_route(self, decision):
+        self.prefetched.append(decision)
+
+
+def test_present_inputs_rule_labels_out():
+    llm = FakeLLM("simple")
+    route = fast_router_node(llm, valid_routes=ROUTES)
+
+    # table only: chart words cannot route to vision
+    out = route({"query": "plot the average speed chart", "dataset_id": "x"})
+    assert (out["decision"], out["route_source"]) == ("sql", "keywords")
+
+    only = fast_router_node(llm, valid_routes=("sql",))
+    assert only({"query": "hello"})["route_source"] == "structural"
+    assert llm.calls == 0
+
+
+def test_keywords_answer_without_the_llm_and_emit_flow_labels():
+    llm, manager = FakeLLM("answer_directly"), FakeManager()
+    route = fast_router_node(llm, model_manager=manager, valid_routes=SQL_ROUTES)
+
+    out = route({"query": "average speed per day", "dataset_id": "x"})
+    assert (out["decision"], out["route_source"]) == ("generate_sql", "keywords")
+    assert llm.calls == 0 and manager.prefetched == ["generate_sql"]
+    assert out["timings"]["router"] >= 0
+
+
+def test_ambiguous_queries_fall_back_to_the_llm():
+    llm = FakeLLM("extract_from_image")
+    route = fast_router_node(llm, valid_routes=VISION_ROUTES)
+
+    out = route({"query": "tell me about this", "image_path": "chart.png"})
+    assert (out["decision"], out["route_source"], llm.calls) == ("extract_from_image", "llm", 1)
+    assert set(route.stats()) == {"llm"}
+
+
+def test_keyword_scores_are_shares_of_hits():
+    assert keyword_scores("explain the chart") == {"sql": 0.0, "vision": 0.5, "simple": 0.5}
+    assert keyword_scores("hello there") == {}
@@ -0,0 +1,62 @@
+# tests/test_image_preprocess.py
+from PIL import Image, ImageDraw
+
+from llm.models.image_preprocess import (
+    PATCH,
+    content_bbox,
+    fit_budget,
+    load_image,
+    load_images,
+    prepare_chart,
+    visual_tokens,
+)
+
+
+def _chart(size=(1200, 900), box=(300, 200, 700, 600), frame: bool = False) -> Image.Image:
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    draw.line([box[:2], box[2:]], fill="black", width=3)
+    draw.rectangle(box, outline="blue")
+    if frame:  # window chrome: full-width title-bar rule and a full-height side bar
+        draw.line([(0, 40), (size[0], 40)], fill="gray", width=2)
+        draw.line([(1150, 0), (1150, size[1])], fill="gray", width=2)
+    return image
+
+
+def test_content_bbox_drops_margins_and_chrome():
+    assert content_bbox(_chart(frame=True)) == content_bbox(_chart()) == (291, 191, 710, 610)
+
+    blank = Image.new("RGB", (64, 48), "white")
+    assert content_bbox(blank) == (0, 0, 64, 48)
+
+
+def test_fit_budget_snaps_and_keeps_aspect():
+    w, h = fit_budget((1920, 1080), max_pixels=448 * 448)
+    assert w % PATCH == 0 and h % PATCH == 0
+    assert w * h <= 448 * 448
+    assert abs(w / h - 1920 / 1080) < 0.1
+
+    assert fit_budget((40, 20)) == (56, 28)          # too small: scaled up to the minimum
+    assert fit_budget((300, 300)) == (280, 280)      # no budget: snap only
+
+
+def test_prepare_chart_cuts_visual_tokens():
+    image = _chart()
+    full = visual_tokens(fit_budget(image.size))
+    prepared = prepare_chart(image, max_pixels=256 * PATCH * PATCH)
+
+    assert visual_tokens(prepared.size) <= 256
+    assert visual_tokens(prepared.size) < full / 4
+    assert prepared.size == fit_budget(prepared.size)
+
+
+def test_load_images_matches_serial(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"p{i}.png"
+        _chart(size=(200 + i, 100)).save(path)
+        paths.append(str(path))
+
+    parallel = load_images(paths, parallel_min=2)
+    assert [b for b, _ in parallel] == [load_image(p)[0] for p in paths]
+    assert [img.size for _, img in parallel] == [(200, 100), (201, 100), (202, 100)]
@@ -0,0 +1,165 @@
+# tests/test_inference.py
+import os
+import stat
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("torch")
+
+from llm.models.inference_client import InferenceClient, RemoteError, authkey, runtime_dir
+from llm.models.inference_server import InferenceServer, StubSQLCoder, stub_manager
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.delenv("MDIS_INFERENCE_ADDR", raising=False)
+    monkeypatch.delenv("MDIS_INFERENCE_KEY", raising=False)
+
+    server = InferenceServer(None, stub_manager())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client = InferenceClient()
+    deadline = time.monotonic() + 10
+    while not client.available():
+        assert time.monotonic() < deadline, "inference server did not start"
+        time.sleep(0.05)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def client(server):
+    return InferenceClient(server.address)
+
+
+def _mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_runtime_files_are_private(server):
+    directory = runtime_dir()
+    assert server.address == f"unix:{os.path.join(directory, 'inference.sock')}"
+    assert _mode(directory) == 0o700
+    assert _mode(os.path.join(directory, "inference.key")) == 0o600
+    assert _mode(os.path.join(directory, "inference.sock")) == 0o600
+    assert len(authkey()) == 64
+
+
+def test_call_stream_and_health(client):
+    assert client.call("mistral", "route", "any prompt", labels=["simple", "sql"]) == "sql"
+    assert "".join(client.stream("mistral", "stream", "tell me")).startswith("[stub answer]")
+
+    health = client.health()
+    assert health["ok"] and health["stats"]["requests"] >= 3
+    assert health["models"]["mistral"]["loaded"]
+
+
+def test_remote_errors_carry_type(client):
+    with pytest.raises(RemoteError) as info:
+        client.call("mistral", "missing_method")
+    assert info.value.type == "AttributeError"
+
+    with pytest.raises(RemoteError):
+        client.call("mistral", "_private")
+    assert client.call("sqlcoder", "generate_sql", "count rows") == StubSQLCoder().generate_sql("")
+
+
+def test_abandoned_stream_does_not_poison_connection(client):
+    chunks = client.stream("mistral", "stream", "one two three four")
+    next(chunks)
+    chunks.close()
+    assert client.call("mistral", "classify", "x", ["direct", "sql"]) == ("sql", 1.0)
+
+
+def test_remote_model_proxies_methods_and_runs_sql_locally(client, server):
+    sqlcoder = client.model("sqlcoder")
+    assert sqlcoder.generate_sql("count rows") == "SELECT COUNT(*) AS n FROM data;"
+
+    requests = server.stats["requests"]
+    df = pd.DataFrame({"Speed": [10.0, 12.0, 14.0]})
+    result = sqlcoder.execute_sql(df, "SELECT AVG(Speed) AS avg_speed FROM data;")
+    assert result["avg_speed"].iloc[0] == pytest.approx(12.0)
+    assert server.stats["requests"] == requests  # no round trip
+
+    qwen = client.model("qwen")
+    assert qwen.analyze_batch(["a.png", "b.png"], "prompt", schema={})[1]["notes"] == "b.png"
+
+
+class _DeadConn:
+    """
+    A connection that looks alive but loses the reply (EOFError over TCP).
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def poll(self):
+        return False
+
+    def send(self, request):
+        self.sent.append(request)
+
+    def recv(self):
+        raise EOFError
+
+    def close(self):
+        pass
+
+
+class _ClosedConn(_DeadConn):
+    """
+    An idle connection the server closed (e.g. it restarted).
+    """
+
+    def poll(self):
+        return True
+
+
+def test_lost_health_reply_is_retried_once(client):
+    client._local.conn = _DeadConn()
+    assert client.health()["ok"]
+    assert not isinstance(client._local.conn, _DeadConn)
+
+
+def test_lost_call_reply_is_not_resent(client, server):
+    dead = client._local.conn = _DeadConn()
+    requests = server.stats["requests"]
+    with pytest.raises(EOFError):
+        client.call("mistral", "route", "any prompt", labels=["simple", "sql"])
+    assert len(dead.sent) == 1 and server.stats["requests"] == requests
+    assert client.call("mistral", "route", "any prompt", labels=["simple", "sql"]) == "sql"
+
+
+def test_closed_idle_connection_is_replaced_before_sending(client):
+    closed = client._local.conn = _ClosedConn()
+    assert client.call("mistral", "route", "any prompt", labels=["simple", "sql"]) == "sql"
+    assert closed.sent == []
+
+
+def test_remote_model_runs_sql_on_its_engine(client, monkeypatch):
+    from llm.models import sql_engine
+
+    engines = []
+    executor = sql_engine.get_executor("sqlite")
+    monkeypatch.setattr(sql_engine, "get_executor", lambda engine: engines.append(engine) or executor)
+
+    client.model("sqlcoder", engine="duckdb").execute_sql(pd.DataFrame({"x": [1]}), "SELECT x FROM data;")
+    assert engines == ["duckdb"]
+
+
+def test_wrong_key_is_refused(client, monkeypatch):
+    monkeypatch.setenv("MDIS_INFERENCE_KEY", "not-the-key")
+    assert not InferenceClient(client.address).available()
+
+
+def test_stub_manager_runs_sql_without_loading_the_model():
+    manager = stub_manager()
+    proxy = manager.proxy("sqlcoder")
+    result = proxy.execute_sql(pd.DataFrame({"x": [1, 2]}), "SELECT SUM(x) AS s FROM data;")
+    assert result["s"].iloc[0] == 3
+    assert not manager.stats()["sqlcoder"]["loaded"]
+
@@ -0,0 +1,51 @@
+# tests/test_ingest.py
+import numpy as np
+import pandas as pd
+
+from llm.models.ingest import ingest_frame, needs_ingest
+
+
+def test_types_from_strings():
+    raw = pd.DataFrame(
+        {
+            "﻿StartDateUTC ": ["31-12-2024 08:00", "31-12-2024 08:10", "31-12-2024 08:20"],
+            "Speed": ["11.5", "12.0", "bad"],
+            "Vessel": ["a", "b", "c"],
+        }
+    )
+    df = ingest_frame(raw, threshold=0.6)
+
+    assert list(df.columns) == ["StartDateUTC", "Speed", "Vessel"]
+    assert pd.api.types.is_datetime64_any_dtype(df["StartDateUTC"])
+    assert df["StartDateUTC"].iloc[1] == pd.Timestamp("2024-12-31 08:10")
+    assert df["Speed"].dtype == np.float32
+    assert np.isnan(df["Speed"].iloc[2])
+    assert not pd.api.types.is_numeric_dtype(df["Vessel"])
+
+
+def test_integers_stop_at_32_bits():
+    df = ingest_frame(pd.DataFrame({"small": [1, 2, 3], "big": [0, 2**40, 5]}))
+    assert df["small"].dtype == np.int32
+    assert df["big"].dtype == np.int64
+    # what int8 would wrap: 120 ** 3
+    assert int((ingest_frame(pd.DataFrame({"rpm": [120]}))["rpm"] ** 3).iloc[0]) == 120**3
+
+
+def test_floats_narrow_only_when_exact():
+    df = ingest_frame(pd.DataFrame({"exact": [0.5, 1.25], "inexact": [0.1, 3.3]}))
+    assert df["exact"].dtype == np.float32
+    assert df["inexact"].dtype == np.float64
+
+
+def test_ingest_is_idempotent(telemetry):
+    again = ingest_frame(telemetry)
+    assert again.dtypes.equals(telemetry.dtypes)
+    pd.testing.assert_frame_equal(again, telemetry)
+
+
+def test_needs_ingest_only_for_raw_frames(telemetry):
+    assert not needs_ingest(telemetry)
+    assert not needs_ingest(pd.DataFrame({"Vessel": ["a", "b"], "Speed": [0.1, 3.3]}))
+    assert needs_ingest(pd.DataFrame({"Speed": ["11.5", "12.0"]}))
+    assert needs_ingest(pd.DataFrame({"StartDateUTC": ["31-12-2024 08:00"]}))
+    assert needs_ingest(pd.DataFrame({" Speed": [1.0]}))
@@ -0,0 +1,97 @@
+# tests/test_json_constraint.py
+import json
+
+import pytest
+
+pytest.importorskip("transformers")
+
+from llm.models.json_constraint import JsonState
+
+
+SCHEMA = {
+    "trend": "string",
+    "axes": {"x": "string", "y": "string"},
+    "events": [{"type": ("peak", "dip"), "y": "any"}],
+}
+
+DOC = '{"trend": "rising", "axes": {"x": "time", "y": "power"}, "events": [{"type": "peak", "y": 4.5}, {"type": "dip", "y": "low"}]}'
+
+
+def test_valid_document_is_accepted_char_by_char():
+    state = JsonState(SCHEMA)
+    for ch in DOC:
+        assert not state.done
+        assert state.feed(ch)
+    assert state.done
+    assert state.closing() == ""
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '[',                                    # top level must be an object
+        '{"unknown"',                           # key outside the schema
+        '{"trend": "a", "trend"',               # repeated key
+        '{"trend": 3',                          # number where a string is expected
+        '{"events": [{"type": "spike"',         # value outside the enum
+        '{"axes": {"x": "t"}} x',               # content after the document
+        '{"trend": "a" "b"',                    # missing comma
+    ],
+)
+def test_invalid_prefixes_are_rejected(text):
+    assert not JsonState(SCHEMA).feed(text)
+
+
+def test_enum_and_key_prefixes_stay_open():
+    state = JsonState(SCHEMA)
+    assert state.feed('{"ev')
+    assert state.feed('ents": [{"type": "pe')
+    assert not state.clone().feed("x")
+    assert state.feed('ak"}')
+
+
+def test_clone_is_independent():
+    state = JsonState(SCHEMA)
+    state.feed('{"axes": {"x": "t"')
+    branch = state.clone()
+
+    assert branch.feed("}}")
+    assert branch.done
+    assert not state.done
+    assert state.feed(', "y": "p"}}')
+    assert state.done
+
+
+@pytest.mark.parametrize(
+    "prefix",
+    [
+        '{"trend": "ris',
+        '{"events": [{"type": "peak", "y": 4.5',
+        '{"axes": {"x": "t"}, "events": [',
+        '{"trend": "a\\',
+    ],
+)
+def test_closing_completes_truncated_documents(prefix):
+    state = JsonState(SCHEMA)
+    assert state.feed(prefix)
+    suffix = state.closing()
+
+    assert suffix is not None
+    json.loads(prefix + suffix)
+    assert state.clone().feed(suffix)
+
+
+def test_closing_refuses_cut_inside_key_or_number():
+    state = JsonState(SCHEMA)
+    state.feed('{"tre')
+    assert state.closing() is None
+
+    state = JsonState(SCHEMA)
+    state.feed('{"events": [{"y": 4.')
+    assert state.closing() is None
+
+
+def test_whitespace_runs_are_bounded():
+    state = JsonState(SCHEMA)
+    assert state.feed("{" + " " * 32)
+    assert not state.feed(" ")
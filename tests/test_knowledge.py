@@ -0,0 +1,132 @@
+# tests/test_knowledge.py
+import json
+import threading
+
+import pytest
+
+from workflow.knowledge import KnowledgeIndex, chunk_json, chunk_markdown, tokenize
+
+
+CONCEPTS = """# Logical Validation
+## Physics Constraints
+### Draft-Power Relationship
+A deeper draft increases hull resistance, so power rises with draft at equal speed.
+### Speed-Power Relationship
+Propulsion power grows roughly with the cube of speed through water.
+## Sensor Faults
+A frozen RPM sensor repeats the same value while speed changes.
+"""
+
+RELATIONS = {
+    "module": "telemetry",
+    "parameters": [
+        {"variable_name": "Draft", "unit": "m", "description": "Vertical distance keel to waterline"},
+        {"variable_name": "RPM", "unit": "rev/min", "description": "Shaft revolutions per minute"},
+    ],
+}
+
+
+@pytest.fixture
+def kb_dir(tmp_path):
+    (tmp_path / "Concepts.md").write_text(CONCEPTS, encoding="utf-8")
+    (tmp_path / "Relations.json").write_text(json.dumps(RELATIONS), encoding="utf-8")
+    return tmp_path
+
+
+def _index(kb_dir, cache_path):
+    return KnowledgeIndex(
+        kb_dir=str(kb_dir), files=("Concepts.md", "Relations.json"), cache_path=str(cache_path)
+    )
+
+
+def test_tokenize_drops_stopwords_and_plurals():
+    assert tokenize("What are the Sensors of the Ships?") == ["sensor", "ship"]
+
+
+def test_chunks_carry_heading_path_and_json_ids():
+    titles = [c["title"] for c in chunk_markdown(CONCEPTS, "Concepts.md")]
+    assert titles == [
+        "Logical Validation > Physics Constraints > Draft-Power Relationship",
+        "Logical Validation > Physics Constraints > Speed-Power Relationship",
+        "Logical Validation > Sensor Faults",
+    ]
+    assert [c["title"] for c in chunk_json(RELATIONS, "Relations.json")] == [
+        "telemetry > Draft",
+        "telemetry > RPM",
+    ]
+
+
+def test_search_ranks_matching_chunk_first(kb_dir, tmp_path):
+    index = _index(kb_dir, tmp_path / "cache" / "kb.npz")
+
+    hits = index.search("why does power rise with draft", top_k=2)
+    assert hits[0][1]["title"].endswith("Draft-Power Relationship")
+    assert hits[0][0] >= hits[1][0]
+
+    assert index.search("frozen rpm sensor", top_k=1)[0][1]["title"].endswith("Sensor Faults")
+    assert index.search("zzz unknown") == []
+
+
+def test_context_respects_max_chars(kb_dir, tmp_path):
+    index = _index(kb_dir, tmp_path / "kb.npz")
+    full = index.context("power speed draft", top_k=3, max_chars=10_000)
+    capped = index.context("power speed draft", top_k=3, max_chars=80)
+
+    assert full.startswith("[Logical Validation")
+    assert len(capped) <= 80
+    assert full.startswith(capped)
+
+
+def test_persisted_index_is_loaded_not_rebuilt(kb_dir, tmp_path):
+    cache_path = tmp_path / "kb.npz"
+    first = _index(kb_dir, cache_path)
+    expected = first.search("cube of speed")
+    assert first.stats["builds"] == 1 and cache_path.exists()
+
+    second = _index(kb_dir, cache_path)
+    assert second.search("cube of speed") == expected
+    assert (second.stats["builds"], second.stats["loads"]) == (0, 1)
+
+
+def test_changed_source_triggers_rebuild(kb_dir, tmp_path):
+    index = _index(kb_dir, tmp_path / "kb.npz")
+    assert index.search("ballast") == []
+
+    (kb_dir / "Concepts.md").write_text(CONCEPTS + "## Ballast\nBallast water trims the vessel.\n")
+    assert index.search("ballast")[0][1]["title"] == "Logical Validation > Ballast"
+    assert index.stats["builds"] == 2
+
+
+def test_save_leaves_only_the_index_file(kb_dir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    for _ in range(2):
+        _index(kb_dir, cache_dir / "kb.npz").search("draft")
+        (kb_dir / "Concepts.md").write_text(CONCEPTS + "## Trim\nTrim is the draft difference.\n")
+    assert [p.name for p in cache_dir.iterdir()] == ["kb.npz"]
+
+
+def test_queries_during_rebuilds_see_one_consistent_build(kb_dir, tmp_path):
+    index = _index(kb_dir, tmp_path / "kb.npz")
+    errors, stop = [], threading.Event()
+
+    def _query():
+        while not stop.is_set():
+            try:
+                for _, chunk in index.search("power draft speed sensor ballast", top_k=5):
+                    assert chunk["title"]
+            except Exception as e:  # IndexError when arrays from two builds mix
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=_query, daemon=True) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for i in range(30):
+        extra = "".join(f"## Ballast {j}\nBallast water {j} trims the vessel.\n" for j in range(i % 7))
+        (kb_dir / "Concepts.md").write_text(CONCEPTS + extra)
+        index.search("ballast")
+    stop.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert errors == []
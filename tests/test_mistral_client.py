@@ -0,0 +1,161 @@
+# tests/test_mistral_client.py
+import threading
+
+import pytest
+
+pytest.importorskip("transformers")
+torch = pytest.importorskip("torch")
+
+from llm.models.mistral_client import MistralClient
+
+
+class _Encoding(dict):
+    def to(self, device):
+        return self
+
+
+class FakeTokenizer:
+    pad_token_id = 0
+
+    def __call__(self, prompt, return_tensors="pt"):
+        return _Encoding(input_ids=torch.ones(1, len(prompt.split()), dtype=torch.long))
+
+
+class FakeModel:
+    device = "cpu"
+
+    def __init__(self, words=None, error=None):
+        self.words = words or []
+        self.error = error
+
+    def generate(self, input_ids, streamer, **kwargs):
+        for word in self.words:
+            streamer.on_finalized_text(word)
+        if self.error is not None:
+            raise self.error
+        streamer.end()
+
+
+def _client(model) -> MistralClient:
+    # no weights: only the attributes stream() uses
+    client = object.__new__(MistralClient)
+    client.tokenizer = FakeTokenizer()
+    client.model = model
+    client.prefix_cache = None
+    return client
+
+
+def _drain(gen, timeout: float = 5.0):
+    """
+    Consume `gen` on a thread so a hung stream fails the test instead of the run.
+    """
+    out = {}
+
+    def _run():
+        try:
+            out["parts"] = list(gen)
+        except Exception as e:
+            out["error"] = e
+
+    worker = threading.Thread(target=_run, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    assert not worker.is_alive(), "stream never ended"
+    return out
+
+
+def test_stream_yields_tokens():
+    out = _drain(_client(FakeModel(["Speed ", "rises"])).stream("why"))
+    assert out == {"parts": ["Speed ", "rises"]}
+
+
+def test_stream_reraises_generate_errors():
+    model = FakeModel(["partial "], error=RuntimeError("CUDA out of memory"))
+    out = _drain(_client(model).stream("why"))
+    assert isinstance(out["error"], RuntimeError)
+    assert "out of memory" in str(out["error"])
+
+
+# --------------------------------------------------
+# LABEL SCORING
+# --------------------------------------------------
+class WordTokenizer:
+    """
+    Whitespace tokenizer with a growing vocabulary; id 1 is BOS, 0 is padding.
+    """
+
+    pad_token_id = 0
+
+    def __init__(self):
+        self.vocab = {}
+
+    def _id(self, word):
+        return self.vocab.setdefault(word, len(self.vocab) + 2)
+
+    def __call__(self, text, add_special_tokens=True):
+        ids = [self._id(w) for w in text.split()]
+        return {"input_ids": ([1] if add_special_tokens else []) + ids}
+
+
+class BigramModel:
+    """
+    Next-token logits depend only on the current token: logits[t] = table[ids[t]].
+    """
+
+    device = "cpu"
+
+    def __init__(self, vocab_size=64, seed=0):
+        self.table = torch.randn(vocab_size, vocab_size, generator=torch.Generator().manual_seed(seed)) * 3
+
+    def forward(self, input_ids, attention_mask=None, position_ids=None):
+        return type("Out", (), {"logits": self.table[input_ids]})()
+
+    __call__ = forward
+
+
+class KeepingBigramModel(BigramModel):
+    def forward(self, input_ids, attention_mask=None, position_ids=None, logits_to_keep=0):
+        logits = self.table[input_ids]
+        return type("Out", (), {"logits": logits[:, -logits_to_keep:] if logits_to_keep else logits})()
+
+    __call__ = forward
+
+
+def _scoring_client(model) -> MistralClient:
+    client = _client(model)
+    client.tokenizer = WordTokenizer()
+    client.classifier = None
+    client._model_params = None
+    return client
+
+
+def _reference(client, prompt, labels):
+    """
+    Label probabilities from token-by-token autoregressive scoring.
+    """
+    logp = torch.log_softmax(client.model.table, dim=-1)
+    totals = []
+    for label in labels:
+        ids = client.tokenizer(prompt + label)["input_ids"]
+        start = len(client.tokenizer(prompt)["input_ids"])
+        totals.append(sum(logp[ids[i - 1], ids[i]] for i in range(start, len(ids))))
+    return torch.softmax(torch.stack(totals), dim=0)
+
+
+@pytest.mark.parametrize("model_class", [BigramModel, KeepingBigramModel])
+@pytest.mark.parametrize(
+    "labels",
+    [
+        ("sql", "vision", "simple"),                                   # one prefill, next-token scores
+        ("answer directly", "answer with sql", "answer from chart"),   # shared first token: sequences
+    ],
+)
+def test_classify_matches_autoregressive_scoring(model_class, labels):
+    client = _scoring_client(model_class())
+    prompts = ["route this question please ", "short one ", "a much longer question about draft and power "]
+
+    results = client.classify_batch(prompts, labels)
+    for prompt, (label, confidence) in zip(prompts, results):
+        probs = _reference(client, prompt, labels)
+        assert label == labels[int(probs.argmax())]
+        assert confidence == pytest.approx(float(probs.max()), abs=1e-3)
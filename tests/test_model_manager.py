@@ -0,0 +1,139 @@
+# tests/test_model_manager.py
+import threading
+
+import pytest
+
+pytest.importorskip("torch")
+
+from llm.models.model_manager import ModelManager
+
+
+class FakeModel:
+    def __init__(self, **attrs):
+        self.devices = []
+        self.__dict__.update(attrs)
+
+    def to(self, device):
+        self.devices.append(device)
+        return self
+
+
+class FakeClient:
+    model_attrs = {}
+
+    def __init__(self):
+        self.model = FakeModel(**self.model_attrs)
+
+    def generate(self, prompt: str) -> str:
+        return prompt.upper()
+
+    def stream(self, prompt: str):
+        for word in prompt.split():
+            yield word
+
+
+class DeviceMapClient(FakeClient):
+    model_attrs = {"hf_device_map": {"": 0}}
+
+
+class QuantizedClient(FakeClient):
+    model_attrs = {"is_quantized": True}
+
+
+def _manager(*clients, budget_gb: float = 10.0) -> ModelManager:
+    manager = ModelManager(budget_gb=budget_gb)
+    for i, cls in enumerate(clients):
+        manager.register(f"m{i}", cls, footprint_gb=6.0)
+    return manager
+
+
+def test_lru_model_is_offloaded_then_swapped_back():
+    manager = _manager(FakeClient, FakeClient)
+    first = manager.get("m0")
+    manager.get("m1")
+
+    stats = manager.stats()
+    assert not stats["m0"]["on_gpu"] and stats["m0"]["loaded"]
+    assert stats["m0"]["evictions"] == 1 and first.model.devices == ["cpu"]
+
+    assert manager.get("m0") is first
+    assert first.model.devices == ["cpu", "cuda"]
+    assert manager.stats()["m0"]["swaps_in"] == 1
+
+
+@pytest.mark.parametrize("cls", [DeviceMapClient, QuantizedClient])
+def test_unmovable_models_are_unloaded(cls):
+    manager = _manager(cls, FakeClient)
+    first = manager.get("m0")
+    manager.get("m1")
+
+    assert first.model.devices == []          # never .to("cpu")
+    assert not manager.stats()["m0"]["loaded"]
+    assert manager.get("m0") is not first     # cold load again
+    assert manager.stats()["m0"]["cold_loads"] == 2
+
+
+def test_pinned_model_is_not_evicted():
+    manager = _manager(FakeClient, FakeClient)
+    with manager.use("m0"):
+        manager.get("m1")
+        assert manager.stats()["m0"]["on_gpu"]  # over budget rather than mid-call eviction
+    assert manager.proxy("m1").generate("x") == "X"
+
+
+def test_stream_stays_pinned_until_exhausted():
+    manager = _manager(FakeClient, FakeClient, FakeClient)
+    stream = manager.proxy("m0").stream("a b c")
+    assert next(stream) == "a"
+
+    manager.get("m1")
+    assert manager.stats()["m0"]["on_gpu"]  # mid-stream: not evicted
+    assert list(stream) == ["b", "c"]
+
+    manager.get("m2")
+    assert not manager.stats()["m0"]["on_gpu"]  # released with the stream
+
+
+def test_closed_stream_releases_its_pin():
+    manager = _manager(FakeClient)
+    stream = manager.proxy("m0").stream("a b c")
+    next(stream)
+    assert manager._entries["m0"].pins == 1
+    stream.close()
+    assert manager._entries["m0"].pins == 0
+
+
+def test_proxy_resolves_methods_without_loading():
+    manager = _manager(FakeClient)
+    proxy = manager.proxy("m0")
+    generate = proxy.generate
+    assert not manager.stats()["m0"]["loaded"]
+    assert generate("hi") == "HI"
+
+
+def test_concurrent_gets_load_once_and_other_models_stay_usable():
+    started, release = threading.Event(), threading.Event()
+    loads = []
+
+    class Slow(FakeClient):
+        def __init__(self):
+            loads.append("slow")
+            started.set()
+            release.wait(5)
+            super().__init__()
+
+    manager = ModelManager(budget_gb=float("inf"))
+    manager.register("slow", Slow, footprint_gb=0.0)
+    manager.register("fast", FakeClient, footprint_gb=0.0)
+
+    threads = [threading.Thread(target=manager.get, args=("slow",)) for _ in range(3)]
+    for t in threads:
+        t.start()
+    assert started.wait(5)
+
+    assert isinstance(manager.get("fast"), FakeClient)  # not blocked by the slow load
+    release.set()
+    for t in threads:
+        t.join(timeout=5)
+    assert loads == ["slow"]
+    assert manager.stats()["slow"]["cold_loads"] == 1
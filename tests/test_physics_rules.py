@@ -0,0 +1,82 @@
+# tests/test_physics_rules.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from llm.models.physics_rules import RULES, RuleEngine, applicable_rules, flags_schema, resolve_roles
+from llm.models.sql_engine import SQLiteTableStore
+
+
+def _voyage(n: int = 400, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    speed = 12 + np.sin(np.arange(n) / 20) + rng.normal(0, 0.02, n)
+    rpm = 8 * speed + 5 + rng.normal(0, 0.05, n)
+    return pd.DataFrame({
+        "StartDateUTC": pd.date_range("2025-01-01", periods=n, freq="10min"),
+        "Draft": np.full(n, 10.0),
+        "Speed": speed,
+        "Power": 5.0 * speed ** 3 * (1 + rng.normal(0, 0.01, n)),
+        "RPM": rpm,
+    })
+
+
+def test_roles_and_applicable_rules(telemetry):
+    assert resolve_roles(telemetry) == {"power": "Power", "speed": "Speed", "rpm": "RPM", "draft": "Draft"}
+    assert applicable_rules(telemetry) == [r for r in RULES if r != "maint_003"]
+    assert applicable_rules(pd.DataFrame({"Power": [1.0]})) == []
+
+
+def test_cubic_law_outlier_is_flagged():
+    df = _voyage()
+    df.loc[200, "Power"] *= 1.5
+    flags = RuleEngine().evaluate(df)
+
+    assert flags.loc[200, "law_cubic_speed"] == 1
+    assert flags["law_cubic_speed"].sum() == 1
+    assert flags.loc[200, "law_cubic_speed_resid"] == pytest.approx(0.5, abs=0.05)
+    assert list(flags["rid"]) == list(range(1, len(df) + 1))
+
+
+def test_speed_and_rpm_moving_apart_is_flagged():
+    df = _voyage()
+    df.loc[300, "Speed"] += 1.0
+    df.loc[300, "RPM"] -= 8.0
+    flags = RuleEngine().evaluate(df)
+    assert flags.loc[300, "phys_002"] == 1
+    assert flags.loc[300, "law_speed_rpm"] == 1
+
+
+def test_rows_across_a_time_gap_are_not_compared():
+    df = _voyage()
+    df.loc[250:, "StartDateUTC"] += pd.Timedelta(days=2)
+    df.loc[250:, ["Speed", "RPM"]] = [[14.0, 120.0]] * (len(df) - 250)
+    df.loc[250:, "Power"] = df.loc[249, "Power"]
+    flags = RuleEngine().evaluate(df)
+    assert flags.loc[250, "data_001"] == 0  # a jump, but not between adjacent samples
+
+
+def test_append_matches_full_evaluation(telemetry):
+    full = RuleEngine().fit(telemetry).evaluate(telemetry)
+
+    engine = RuleEngine().fit(telemetry)
+    head = engine.evaluate(telemetry.iloc[:15000])
+    tail = engine.append(telemetry.iloc[15000:])
+    incremental = pd.concat([head, tail], ignore_index=True)
+
+    pd.testing.assert_frame_equal(incremental, full)
+
+
+def test_narrow_integer_columns_do_not_overflow():
+    df = _voyage()
+    df["RPM"] = (df["RPM"] * 20).round().astype("int32")   # ~2000, cubed > int32 max
+    as_float = df.assign(RPM=df["RPM"].astype("float64"))
+    pd.testing.assert_frame_equal(RuleEngine().evaluate(df), RuleEngine().evaluate(as_float))
+
+
+def test_flags_table_is_queryable(telemetry):
+    store = SQLiteTableStore()
+    expected = RuleEngine().evaluate(telemetry)["law_cubic_speed"].sum()
+    result = store.query(telemetry, "SELECT SUM(law_cubic_speed) AS n FROM data__flags")
+    assert result["n"].iloc[0] == expected
+    assert "JOIN ON data.\"StartDateUTC\" = data__flags.\"StartDateUTC\"" in flags_schema(telemetry)
+    store.close()
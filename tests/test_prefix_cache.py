@@ -0,0 +1,137 @@
+# tests/test_prefix_cache.py
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from llm.models import prefix_cache
+from llm.models.prefix_cache import PrefixKVCache, register_prompt, seq_length, share
+
+
+PREFIX = "You are a maritime data analyst. Answer from the table below only.\n"
+
+
+class CharTokenizer:
+    name_or_path = "chars"
+
+    def __call__(self, text, return_tensors="pt"):
+        return {"input_ids": torch.tensor([[ord(c) for c in text]])}
+
+
+class FakeModel:
+    device = "cpu"
+
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.delay = delay
+
+    def __call__(self, input_ids, use_cache=True):
+        self.calls += 1
+        time.sleep(self.delay)
+        n = input_ids.shape[1]
+        layer = (torch.zeros(1, 1, n, 2), torch.ones(1, 1, n, 2))
+        return SimpleNamespace(past_key_values=(layer,))
+
+
+class LegacyCache:
+    def __init__(self, layers):
+        self.layers = layers
+
+    def to_legacy_cache(self):
+        return self.layers
+
+    @classmethod
+    def from_legacy_cache(cls, layers):
+        return cls(tuple(layers))
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(prefix_cache, "_prefixes", {})
+    register_prompt("interpret", PREFIX)
+
+
+def _ids(text):
+    return CharTokenizer()(text)["input_ids"]
+
+
+def test_prompt_with_registered_prefix_reuses_its_kv():
+    model = FakeModel()
+    cache = PrefixKVCache(model, CharTokenizer())
+    prompt = PREFIX + "Result: 42"
+
+    kwargs = cache.generate_kwargs(prompt, _ids(prompt))
+    assert seq_length(kwargs["past_key_values"]) == len(PREFIX) - 1
+    cache.generate_kwargs(prompt + "!", _ids(prompt + "!"))
+
+    stats = cache.stats()
+    assert (stats["builds"], stats["hits"], model.calls) == (1, 2, 1)
+    assert stats["tokens_saved"] == 2 * (len(PREFIX) - 1)
+
+
+def test_unregistered_batched_or_mismatched_prompts_run_uncached():
+    cache = PrefixKVCache(FakeModel(), CharTokenizer())
+    assert cache.generate_kwargs("no prefix here", _ids("no prefix here")) == {}
+
+    prompt = PREFIX + "x"
+    assert cache.generate_kwargs(prompt, torch.cat([_ids(prompt)] * 2)) == {}
+
+    other = _ids(prompt).clone()
+    other[0, 3] = 0  # tokenizer disagreed inside the prefix
+    assert cache.generate_kwargs(prompt, other) == {}
+    assert cache.stats()["mismatches"] == 1
+
+
+def test_short_prefixes_are_not_worth_caching(monkeypatch):
+    monkeypatch.setattr(prefix_cache, "_prefixes", {})
+    register_prompt("tiny", "Be brief.")
+    assert prefix_cache.registered_prompts() == {}
+
+
+def test_concurrent_requests_build_once():
+    model = FakeModel(delay=0.2)
+    cache = PrefixKVCache(model, CharTokenizer())
+    prompt = PREFIX + "q"
+    results = []
+
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.generate_kwargs(prompt, _ids(prompt))))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert model.calls == 1 and len(results) == 4
+    assert all("past_key_values" in r for r in results)
+
+
+def test_share_never_copies_tensors_and_keeps_the_prefix_intact():
+    layer = (torch.zeros(1, 1, 4, 2), torch.zeros(1, 1, 4, 2))
+    assert share((layer,)) == (layer,)
+
+    legacy = LegacyCache((layer,))
+    shared = share(legacy)
+    assert shared is not legacy
+    assert shared.layers[0][0] is layer[0]
+    shared.layers = ((torch.cat([layer[0], layer[0]], dim=2), layer[1]),)  # what DynamicCache.update does
+    assert legacy.layers[0][0].shape[2] == 4
+    assert share(object()) is None
+
+
+def test_entries_are_evicted_beyond_max_bytes():
+    sql = "You write SQLite queries for a telemetry table. Return one statement.\n"
+    register_prompt("sql", sql)
+    largest = 2 * (max(len(PREFIX), len(sql)) - 1) * 2 * 4  # k + v, float32
+    cache = PrefixKVCache(FakeModel(), CharTokenizer(), max_bytes=int(largest * 1.5))
+
+    for prefix in (PREFIX, sql):
+        prompt = prefix + "q"
+        cache.generate_kwargs(prompt, _ids(prompt))
+
+    stats = cache.stats()
+    assert (stats["builds"], stats["entries"], stats["evictions"]) == (2, 1, 1)
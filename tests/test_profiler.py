@@ -0,0 +1,78 @@
+# tests/test_profiler.py
+import pandas as pd
+import pytest
+
+from workflow import profiler
+from workflow.profiler import ProfileCache, describe_profile, link_columns, profile_dataset, schema_string
+
+
+def test_profile_matches_pandas(telemetry):
+    profile = profile_dataset(telemetry)
+    assert profile["rows"] == len(telemetry)
+
+    power = profile["columns"]["Power"]
+    assert power["kind"] == "numeric"
+    assert power["min"] == pytest.approx(float(telemetry["Power"].min()))
+    assert power["max"] == pytest.approx(float(telemetry["Power"].max()))
+    assert power["mean"] == pytest.approx(float(telemetry["Power"].mean()), rel=1e-6)
+    assert power["cardinality"] == telemetry["Power"].nunique()
+    assert power["null_rate"] == pytest.approx(telemetry["Power"].isna().mean())
+
+    start = profile["columns"]["StartDateUTC"]
+    assert start["kind"] == "timestamp" and start["sql_type"] == "TIMESTAMP"
+    assert start["min"].startswith("2024-12-31 08:00")
+
+
+def test_text_timestamps_and_categoricals():
+    df = pd.DataFrame({"ts": ["31-12-2024 08:00", "01-01-2025 09:30", None], "port": ["A", "B", "A"]})
+    columns = profile_dataset(df)["columns"]
+
+    assert columns["ts"]["kind"] == "timestamp"
+    assert columns["ts"]["format"] == "%d-%m-%Y %H:%M"
+    assert columns["ts"]["max"] == "2025-01-01 09:30:00"
+    assert columns["ts"]["null_rate"] == pytest.approx(1 / 3)
+    assert columns["port"]["kind"] == "categorical"
+    assert columns["port"]["samples"] == ["A", "B"]
+
+
+def test_cache_profiles_each_dataset_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(profiler, "profile_dataset", lambda df: calls.append(len(df)) or {"rows": len(df)})
+    cache = ProfileCache(max_entries=2)
+    a, b, c = (pd.DataFrame({"x": range(n)}) for n in (1, 2, 3))
+
+    assert cache.get(a) is cache.get(a.copy())        # same content, same entry
+    assert cache.get(b, key="ds-b") is cache.get(pd.DataFrame(), key="ds-b")
+    assert calls == [1, 2]
+
+    cache.get(a)      # a becomes most recent
+    cache.get(c)      # evicts ds-b
+    cache.get(a)
+    cache.get(b, key="ds-b")
+    assert calls == [1, 2, 3, 2]
+
+
+def test_schema_string_carries_timestamp_format_and_range(telemetry):
+    profile = profile_dataset(telemetry)
+    lines = schema_string(profile).splitlines()
+
+    assert lines[0].startswith("StartDateUTC TIMESTAMP -- 'YYYY-MM-DD HH:MM:SS', 2024-12-31 08:00:00 to ")
+    assert "Power REAL" in lines
+    assert schema_string(profile, ["Power"]) == "Power REAL"
+
+
+def test_link_columns_keeps_mentioned_and_timestamp_columns():
+    wide = pd.DataFrame({f"Sensor{i}": [float(i)] for i in range(20)})
+    wide["EventTime"] = ["2025-01-01 00:00:00"]
+    wide["MainEngineLoad"] = [1.0]
+    profile = profile_dataset(wide)
+
+    assert link_columns(profile, "average main engine load per day") == ["EventTime", "MainEngineLoad"]
+    narrow = profile_dataset(wide.iloc[:, :5])
+    assert link_columns(narrow, "anything") == list(wide.columns[:5])
+
+
+def test_describe_profile_has_one_row_per_column(telemetry):
+    summary = describe_profile(profile_dataset(telemetry))
+    assert list(summary.index) == list(telemetry.columns)
+    assert summary.loc["Speed", "type"] == "numeric"
@@ -0,0 +1,88 @@
+# tests/test_query_log.py
+import json
+import threading
+
+from workflow.query_log import QueryLog, migrate_json_log
+from workflow.replay import entry_to_state, replay
+
+
+def _entry(i: int) -> dict:
+    return {"query": f"question {i}", "mode": "sql", "dataframe_path": "data.csv"}
+
+
+def test_appends_read_back_in_order(tmp_path):
+    log = QueryLog(str(tmp_path / "queries.jsonl"))
+    for i in range(3):
+        log.append(_entry(i))
+    assert [e["query"] for e in log] == ["question 0", "question 1", "question 2"]
+
+
+def test_rotation_gzips_segments_and_keeps_order(tmp_path):
+    log = QueryLog(str(tmp_path / "queries.jsonl"), max_bytes=200)
+    for i in range(20):
+        log.append(_entry(i))
+
+    segments = log.segments()
+    assert len(segments) > 2
+    assert all(p.endswith(".jsonl.gz") for p in segments[:-1])
+    assert not list(tmp_path.glob("queries.*.jsonl"))  # uncompressed copies removed
+    assert [e["query"] for e in log] == [f"question {i}" for i in range(20)]
+
+
+def test_concurrent_appends_never_interleave(tmp_path):
+    log = QueryLog(str(tmp_path / "queries.jsonl"), max_bytes=4096)
+    payload = "x" * 300
+
+    def _write(t):
+        for i in range(25):
+            log.append({"query": f"{t}-{i}", "pad": payload})
+
+    threads = [threading.Thread(target=_write, args=(t,)) for t in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    entries = list(log)
+    assert len(entries) == 100
+    assert len({e["query"] for e in entries}) == 100
+
+
+def test_partial_trailing_line_is_skipped(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    log = QueryLog(str(path))
+    log.append(_entry(0))
+    with open(path, "a") as f:
+        f.write('{"query": "cut of')
+    assert [e["query"] for e in log] == ["question 0"]
+
+
+def test_migrate_legacy_json(tmp_path):
+    legacy = tmp_path / "queries.json"
+    legacy.write_text(json.dumps([_entry(0), _entry(1)]))
+    log = QueryLog(str(tmp_path / "queries.jsonl"))
+
+    assert migrate_json_log(str(legacy), log) == 2
+    assert not legacy.exists() and (tmp_path / "queries.json.migrated").exists()
+    assert migrate_json_log(str(legacy), log) == 0
+    assert len(list(log)) == 2
+
+
+class _Graph:
+    def __init__(self):
+        self.states = []
+
+    def invoke(self, state):
+        if state["query"] == "question 3":
+            raise RuntimeError("node failed")
+        self.states.append(state)
+
+
+def test_replay_counts_requests_and_errors():
+    graph = _Graph()
+    report = replay((_entry(i) for i in range(10)), graph, concurrency=2)
+
+    assert (report["requests"], report["errors"]) == (10, 1)
+    assert len(graph.states) == 9
+    assert report["p50_ms"] <= report["p99_ms"]
+    assert entry_to_state(_entry(0)) == {"query": "question 0", "dataframe_path": "data.csv", "image_path": None}
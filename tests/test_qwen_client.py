@@ -0,0 +1,189 @@
+# tests/test_qwen_client.py
+import json
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("transformers")
+torch = pytest.importorskip("torch")
+from PIL import Image
+
+from llm.models import qwen_client
+from llm.models.vision_cache import VisionCache
+
+
+ANSWER = {"trend": "rising", "events": []}
+
+
+class _Encoding(dict):
+    def to(self, device):
+        return self
+
+
+class FakeTokenizer:
+    pad_token_id = 0
+    padding_side = "right"
+
+    def __call__(self, texts, padding=True, return_tensors="pt"):
+        width = max(len(t) for t in texts)
+        ids = [[self.pad_token_id] * (width - len(t)) + [1] * len(t) for t in texts]
+        return _Encoding(input_ids=torch.tensor(ids))
+
+
+class FakeImageProcessor:
+    merge_size = 2
+
+    def __call__(self, images, return_tensors="pt"):
+        return {"pixel_values": torch.zeros(4, 3), "image_grid_thw": torch.tensor([[1, 2, 2]])}
+
+
+class FakeProcessor:
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.image_processor = FakeImageProcessor()
+
+    def apply_chat_template(self, messages, add_generation_prompt=True):
+        return f"<|image_pad|>{messages[0]['content'][1]['text']}"
+
+    def batch_decode(self, completions, skip_special_tokens=True):
+        return [json.dumps(ANSWER)] * len(completions)
+
+
+class FakeModel:
+    device = "cpu"
+
+    def __init__(self):
+        self.generation_config = type("GenerationConfig", (), {"eos_token_id": 2})()
+        self.calls = 0
+
+    def generate(self, input_ids, max_new_tokens, temperature, **kwargs):
+        self.calls += 1
+        return torch.cat([input_ids, torch.full((input_ids.shape[0], 5), 7)], dim=1)
+
+
+class FakeConstraint:
+    def finish(self, row, text):
+        return json.loads(text)
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    model = FakeModel()
+    monkeypatch.setattr(qwen_client.AutoProcessor, "from_pretrained", lambda *a, **k: FakeProcessor())
+    monkeypatch.setattr(qwen_client.AutoModelForVision2Seq, "from_pretrained", lambda *a, **k: model)
+    client = qwen_client.QwenClient(device="cpu", cache=VisionCache(disk_dir=str(tmp_path / "cache")))
+    monkeypatch.setattr(client, "_constraint", lambda schema: (FakeConstraint(), {}))
+    return client
+
+
+@pytest.fixture
+def pages(tmp_path):
+    paths = []
+    for i in range(2):
+        path = tmp_path / f"page{i}.png"
+        Image.new("RGB", (64 + i, 64), "white").save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_analyze_many_returns_json_text(client, pages):
+    page = qwen_client.load_image(pages[0])
+    out = client._analyze_many([page], ["describe"], schema={"trend": "string"})
+    assert out == [json.dumps(ANSWER)]
+
+
+def test_analyze_with_schema_decodes_once_and_caches_text(client, pages):
+    schema = {"trend": "string"}
+    assert client.analyze(pages[0], "describe", schema=schema) == ANSWER
+    # cache hit: the stored text is decoded on the way out, not twice
+    assert client.analyze(pages[0], "describe", schema=schema) == ANSWER
+    assert client.model.calls == 1
+
+
+def test_analyze_batch_with_schema_returns_dicts(client, pages):
+    schema = {"trend": "string"}
+    assert client.analyze_batch(pages, "describe", schema=schema) == [ANSWER, ANSWER]
+    assert client.analyze(pages[1], "describe", schema=schema) == ANSWER
+    assert client.model.calls == 1
+
+
+def test_analyze_without_schema_returns_text(client, pages):
+    assert client.analyze(pages[0], "describe") == json.dumps(ANSWER)
+
+
+def test_stream_reraises_generate_errors_and_caches_nothing(client, pages, monkeypatch):
+    def _fail(**kwargs):
+        raise RuntimeError("CUDA out of memory")
+
+    errors = []
+
+    def _consume():
+        try:
+            list(client.stream(pages[0], "describe"))
+        except RuntimeError as e:
+            errors.append(e)
+
+    with monkeypatch.context() as m:
+        m.setattr(client.model, "generate", _fail)
+        worker = threading.Thread(target=_consume, daemon=True)
+        worker.start()
+        worker.join(5)
+    assert not worker.is_alive(), "stream never ended"
+    assert "out of memory" in str(errors[0])
+    assert client.analyze(pages[0], "describe") == json.dumps(ANSWER)  # a real decode, not a cached error
+
+
+def _pages(tmp_path, n):
+    paths = []
+    for i in range(n):
+        path = tmp_path / f"batch{i}.png"
+        Image.new("RGB", (80 + i, 64), "white").save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_analyze_batch_splits_misses_into_batches(client, tmp_path):
+    paths = _pages(tmp_path, 5)
+    assert client.analyze_batch(paths, "describe", batch_size=2) == [json.dumps(ANSWER)] * 5
+    assert client.model.calls == 3
+    assert client.stats()["generations"] == 5
+
+
+def test_analyze_batch_serves_cached_pages_without_the_model(client, tmp_path):
+    paths = _pages(tmp_path, 4)
+    client.analyze(paths[1], "describe")
+    client.analyze(paths[3], "describe")
+
+    assert client.analyze_batch(paths, "describe", batch_size=4) == [json.dumps(ANSWER)] * 4
+    assert client.model.calls == 3  # two singles, then one batch for the two misses
+    assert client.stats()["generations"] == 4
+
+
+def test_concurrent_identical_analyze_runs_the_model_once(client, pages, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    generate = client.model.generate
+
+    def _slow(**kwargs):
+        started.set()
+        release.wait(5)
+        return generate(**kwargs)
+
+    monkeypatch.setattr(client.model, "generate", _slow)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(client.analyze(pages[0], "describe")))
+        for _ in range(3)
+    ]
+    threads[0].start()
+    assert started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    time.sleep(0.2)  # let the others reach the in-flight check
+    release.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert results == [json.dumps(ANSWER)] * 3
+    assert client.model.calls == 1
+    assert client._inflight == {}
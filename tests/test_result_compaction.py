@@ -0,0 +1,50 @@
+# tests/test_result_compaction.py
+import numpy as np
+import pandas as pd
+
+from workflow.result_compaction import compact_result, count_tokens, lttb
+
+
+class WordTokenizer:
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[437] = 50.0     # one spike
+    keep = lttb(x, y, 20)
+
+    assert len(keep) == 20
+    assert keep[0] == 0 and keep[-1] == 999
+    assert 437 in keep
+    assert np.all(np.diff(keep) > 0)
+    assert list(lttb(x[:10], y[:10], 20)) == list(range(10))
+
+
+def test_small_results_pass_through_verbatim():
+    df = pd.DataFrame({"avg_speed": [12.5]})
+    assert compact_result(df) == df.to_string()
+    assert compact_result(42) == "42"
+
+
+def test_large_results_fit_the_budget(telemetry):
+    text = compact_result(telemetry, token_budget=1500)
+
+    assert count_tokens(text) <= 1500
+    assert text.startswith(f"Result has {len(telemetry)} rows x {telemetry.shape[1]} columns (compacted).")
+    assert "Summary statistics:" in text
+    assert "Power trend" in text
+
+
+def test_summary_statistics_are_exact(telemetry):
+    text = compact_result(telemetry[["Speed", "Power"]], token_budget=4000)
+    stats_line = next(line for line in text.splitlines() if line.startswith("Power"))
+    assert f"{telemetry['Power'].max():.4g}" in stats_line
+
+
+def test_budget_uses_the_tokenizer_when_given():
+    df = pd.DataFrame({"x": np.arange(5000, dtype=float), "y": np.sin(np.arange(5000))})
+    text = compact_result(df, token_budget=300, tokenizer=WordTokenizer())
+    assert len(text.split()) <= 300
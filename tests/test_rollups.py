@@ -0,0 +1,115 @@
+# tests/test_rollups.py
+import pandas as pd
+import pytest
+
+from llm.models.sql_engine import SQLiteTableStore
+
+
+@pytest.fixture(scope="module")
+def store():
+    store = SQLiteTableStore(flags=False)
+    yield store
+    store.close()
+
+
+RANGES = [
+    ("2025-01-01", "2025-03-31 23:59:59"),
+    ("2025-02-03 05:30:00", "2025-02-20 17:10:00"),
+    ("2025-07-10 12:00:00", "2025-07-14 00:00:00"),
+]
+
+
+@pytest.mark.parametrize("lo, hi", RANGES)
+def test_rewritten_range_aggregates_match_pandas(store, telemetry, lo, hi):
+    sql = (
+        "SELECT AVG(Power) AS avg_power, SUM(Speed) AS sum_speed, MIN(RPM) AS min_rpm, "
+        'MAX(Draft) AS max_draft, COUNT(*) AS n FROM data '
+        f"WHERE StartDateUTC BETWEEN '{lo}' AND '{hi}'"
+    )
+    loaded = store.table(telemetry)
+    before = loaded.rollups.rewrites
+    result = store.query(telemetry, sql).iloc[0]
+    assert loaded.rollups.rewrites == before + 1
+
+    ts = telemetry["StartDateUTC"]
+    rows = telemetry[(ts >= lo) & (ts <= hi)]
+    assert len(rows) > 0
+    assert result["n"] == len(rows)
+    assert result["avg_power"] == pytest.approx(rows["Power"].astype(float).mean())
+    assert result["sum_speed"] == pytest.approx(rows["Speed"].astype(float).sum())
+    assert result["min_rpm"] == pytest.approx(rows["RPM"].min())
+    assert result["max_draft"] == pytest.approx(rows["Draft"].max())
+
+
+def test_empty_range(store, telemetry):
+    # 2025-06-01..04 is a gap in the telemetry
+    sql = (
+        "SELECT AVG(Power) AS avg_power, COUNT(*) AS n FROM data "
+        "WHERE StartDateUTC BETWEEN '2025-06-01 00:00:00' AND '2025-06-04 00:00:00'"
+    )
+    result = store.query(telemetry, sql).iloc[0]
+    assert result["n"] == 0
+    assert result["avg_power"] is None
+
+
+def test_half_open_bounds(store, telemetry):
+    sql = (
+        "SELECT COUNT(Power) AS n FROM data "
+        "WHERE StartDateUTC >= '2025-01-01 00:00:00' AND StartDateUTC < '2025-02-01 00:00:00'"
+    )
+    ts = telemetry["StartDateUTC"]
+    expected = telemetry.loc[(ts >= "2025-01-01") & (ts < "2025-02-01"), "Power"].count()
+    assert store.query(telemetry, sql)["n"].iloc[0] == expected
+
+
+def test_short_or_filtered_ranges_run_unrewritten(store, telemetry):
+    rollups = store.table(telemetry).rollups
+    assert rollups.rewrite(
+        "SELECT AVG(Power) FROM data WHERE StartDateUTC BETWEEN '2025-01-01 00:00:00' AND '2025-01-01 01:00:00'"
+    ) is None
+    assert rollups.rewrite("SELECT AVG(Power) FROM data WHERE Speed > 10") is None
+
+
+# --------------------------------------------------
+# REWRITE VS. PLAIN SQLITE
+# --------------------------------------------------
+@pytest.fixture(scope="module")
+def plain():
+    store = SQLiteTableStore(flags=False, rollups=False)
+    yield store
+    store.close()
+
+
+@pytest.fixture(scope="module")
+def ten_minute():
+    ts = pd.date_range("2025-01-01", "2025-01-20", freq="10min")
+    return pd.DataFrame({"ts": ts.strftime("%Y-%m-%d %H:%M:%S"), "v": range(len(ts))})
+
+
+WHERES = [
+    "ts >= '2025-01-02' AND ts <= '2025-01-07'",
+    "ts > '2025-01-02' AND ts < '2025-01-07'",
+    "ts BETWEEN '2025-01-02' AND '2025-01-07'",
+    "ts BETWEEN '2025-01-02 00:00:00' AND '2025-01-07 00:00:00'",
+    "ts > '2025-01-02 00:00:00' AND ts <= '2025-01-07'",
+    "ts >= '2025-01-02' AND ts < '2025-01-07 00:10:00'",
+    "ts BETWEEN '02-01-2025' AND '07-01-2025 00:00'",
+]
+
+
+@pytest.mark.parametrize("where", WHERES)
+def test_rewrite_matches_unrewritten_query(store, plain, ten_minute, where):
+    sql = f"SELECT COUNT(*) AS n, SUM(v) AS s, MIN(v) AS lo, MAX(v) AS hi FROM data WHERE {where}"
+    rollups = store.table(ten_minute).rollups
+    before = rollups.rewrites
+
+    rewritten = store.query(ten_minute, sql)
+    assert rollups.rewrites == before + 1
+    pd.testing.assert_frame_equal(rewritten, plain.query(ten_minute, sql), check_dtype=False)
+
+
+def test_literals_that_sort_differently_are_not_rewritten(store, ten_minute):
+    rollups = store.table(ten_minute).rollups
+    assert rollups.rewrite(
+        "SELECT COUNT(*) FROM data WHERE ts BETWEEN '2025-01-02T00:00:00' AND '2025-01-07'"
+    ) is None
@@ -0,0 +1,80 @@
+# tests/test_sql_cache.py
+import json
+import os
+import threading
+
+from workflow.sql_cache import SQLCache, rebind_literals, templatize
+
+
+SCHEMA = "data(Speed REAL, Power REAL, StartDateUTC TIMESTAMP)"
+
+
+def test_templatize_extracts_literals():
+    template, literals = templatize("Average speed between '2024-12-01' and 2024-12-31 above 10?")
+    assert literals == ["2024-12-01", "2024-12-31", "10"]
+    assert template == "average speed between <L0> and <L1> above <L2>"
+
+
+def test_exact_and_template_hits():
+    cache = SQLCache(ttl_s=None)
+    sql = "SELECT AVG(Speed) FROM data WHERE StartDateUTC BETWEEN '2024-12-01' AND '2024-12-31';"
+    cache.put("Average speed between 2024-12-01 and 2024-12-31", SCHEMA, sql)
+
+    assert cache.get("average speed between 2024-12-01 and 2024-12-31 ?", SCHEMA) == sql
+    assert cache.get("Average speed between 2024-11-01 and 2024-11-30", SCHEMA) == sql.replace(
+        "2024-12-01", "2024-11-01"
+    ).replace("2024-12-31", "2024-11-30")
+    assert cache.get("Average speed between 2024-12-01 and 2024-12-31", "other schema") is None
+
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["template_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_rebind_keeps_structural_numbers():
+    sql = "SELECT * FROM data WHERE Speed > 10 ORDER BY Power DESC LIMIT 10;"
+    assert rebind_literals(sql, ["10"], ["12"]) == sql.replace("Speed > 10", "Speed > 12")
+
+
+def test_rebind_swaps_values_in_one_pass():
+    sql = "SELECT * FROM data WHERE Speed BETWEEN 5 AND 10;"
+    assert rebind_literals(sql, ["5", "10"], ["10", "5"]) == "SELECT * FROM data WHERE Speed BETWEEN 10 AND 5;"
+
+
+def test_rebind_miss_when_literal_not_in_sql():
+    assert rebind_literals("SELECT 1;", ["2024-12-01"], ["2024-11-01"]) is None
+
+
+def test_discard_drops_entry_and_template():
+    cache = SQLCache(ttl_s=None)
+    cache.put("count rows above 10", SCHEMA, "SELECT COUNT(*) FROM data WHERE Speed > 10;")
+    cache.discard("count rows above 10", SCHEMA)
+    assert cache.get("count rows above 10", SCHEMA) is None
+    assert cache.get("count rows above 12", SCHEMA) is None
+
+
+def test_lru_eviction():
+    cache = SQLCache(max_entries=2, ttl_s=None)
+    for i in range(3):
+        cache.put(f"question {chr(97 + i)}", SCHEMA, f"SELECT {i};")
+    assert cache.get("question a", SCHEMA) is None
+    assert cache.get("question c", SCHEMA) == "SELECT 2;"
+
+
+def test_persistence_and_concurrent_saves(tmp_path):
+    path = str(tmp_path / "sql_cache.json")
+    cache = SQLCache(path=path)
+
+    def _worker(n):
+        for i in range(20):
+            cache.put(f"question {n} {chr(97 + i)}", SCHEMA, f"SELECT {n};")
+
+    threads = [threading.Thread(target=_worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with open(path) as f:
+        assert len(json.load(f)) == 80
+    assert os.listdir(tmp_path) == ["sql_cache.json"]
+    assert SQLCache(path=path).get("question 3 b", SCHEMA) == "SELECT 3;"
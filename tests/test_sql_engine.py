@@ -0,0 +1,123 @@
+# tests/test_sql_engine.py
+import threading
+
+import pandas as pd
+import pytest
+
+from llm.models.sql_engine import SQLiteTableStore
+
+
+def _frame(n: int) -> pd.DataFrame:
+    return pd.DataFrame({"Speed": [float(i) for i in range(n)]})
+
+
+COUNT = "SELECT COUNT(*) AS n FROM data"
+
+
+@pytest.fixture
+def store():
+    store = SQLiteTableStore(max_tables=1, rollups=False, flags=False)
+    yield store
+    store.close()
+
+
+def _count_loads(store, monkeypatch, gate=None):
+    loads = []
+    load = store._load
+
+    def _load(fp, df, table_name):
+        loads.append(len(df))
+        if gate is not None and len(df) == gate[0]:
+            gate[1].set()
+            gate[2].wait(5)
+        return load(fp, df, table_name)
+
+    monkeypatch.setattr(store, "_load", _load)
+    return loads
+
+
+def test_each_version_is_loaded_once(store, monkeypatch):
+    loads = _count_loads(store, monkeypatch)
+    df = _frame(5)
+    assert store.query(df, COUNT)["n"].iloc[0] == 5
+    assert store.query(df.copy(), COUNT)["n"].iloc[0] == 5
+    assert loads == [5]
+
+    df.loc[0, "Speed"] = -1.0  # mutated in place: new content, new table
+    store.query(df, "SELECT MIN(Speed) AS lo FROM data")
+    assert loads == [5, 5]
+
+
+def test_evicted_table_stays_readable_while_checked_out(store):
+    first, second = _frame(3), _frame(4)
+    with store.checkout(first) as loaded:
+        assert store.query(second, COUNT)["n"].iloc[0] == 4  # evicts `first`
+        assert loaded.closed and not loaded.released
+        with loaded.reader() as conn:
+            assert conn.execute(COUNT).fetchone() == (3,)
+    assert loaded.released
+
+    with pytest.raises(RuntimeError, match="evicted"):
+        with loaded.reader():
+            pass
+    assert store.query(first, COUNT)["n"].iloc[0] == 3  # reloaded
+
+
+def test_slow_load_does_not_block_other_datasets(monkeypatch):
+    store = SQLiteTableStore(rollups=False, flags=False)
+    started, release = threading.Event(), threading.Event()
+    loads = _count_loads(store, monkeypatch, gate=(100, started, release))
+
+    store.query(_frame(3), COUNT)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(store.query(_frame(100), COUNT)["n"].iloc[0]))
+        for _ in range(3)
+    ]
+    for t in threads:
+        t.start()
+    assert started.wait(5)
+
+    assert store.query(_frame(3), COUNT)["n"].iloc[0] == 3  # not behind the 100-row load
+    release.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert results == [100, 100, 100]
+    assert loads == [3, 100]
+    store.close()
+
+
+def test_failed_load_is_not_cached(store, monkeypatch):
+    load = store._load
+    calls = []
+
+    def _flaky(fp, df, table_name):
+        calls.append(fp)
+        if len(calls) == 1:
+            raise MemoryError("load failed")
+        return load(fp, df, table_name)
+
+    monkeypatch.setattr(store, "_load", _flaky)
+    with pytest.raises(MemoryError):
+        store.query(_frame(2), COUNT)
+    assert store.query(_frame(2), COUNT)["n"].iloc[0] == 2
+
+
+def test_duckdb_registers_the_callers_frame_as_is():
+    pytest.importorskip("duckdb")
+    from llm.models.sql_engine import DuckDBEngine
+
+    engine = DuckDBEngine(guard=False)
+    df = pd.DataFrame({"Speed": [0.1, 0.2, 0.4]})
+    _, views = engine.connection(df)
+    assert views["data"] is df
+
+    types = engine.query(df, "SELECT typeof(Speed) AS t, SUM(Speed) AS s FROM data GROUP BY 1")
+    assert types["t"].iloc[0] == "DOUBLE"
+    assert types["s"].iloc[0] == sum([0.1, 0.2, 0.4])
+
+    raw = pd.DataFrame({"StartDateUTC": ["31-12-2024 08:00", "01-01-2025 08:00"], "Speed": ["1.5", "2.5"]})
+    latest = engine.query(raw, "SELECT MAX(StartDateUTC) AS t FROM data")["t"].iloc[0]
+    assert latest == pd.Timestamp("2025-01-01 08:00")
+    engine.close()
@@ -0,0 +1,73 @@
+# tests/test_sql_guard.py
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from llm.models.sql_guard import GuardError, SQLGuard
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    pd.DataFrame({"speed": range(50), "power": range(0, 100, 2)}).to_sql("data", conn, index=False)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize(
+    "sql, reason",
+    [
+        ("", "empty"),
+        ("SELECT 1; SELECT 2", "multiple_statements"),
+        ("DELETE FROM data", "not_select"),
+        ("DROP TABLE data", "not_select"),
+        ("SELECT nope FROM data", "invalid_sql"),
+    ],
+)
+def test_refuses(conn, sql, reason):
+    with pytest.raises(GuardError) as info:
+        SQLGuard().execute(conn, sql)
+    assert info.value.reason == reason
+    assert info.value.as_dict()["reason"] == reason
+
+
+def test_semicolon_inside_string_is_one_statement(conn):
+    result = SQLGuard().execute(conn, "SELECT COUNT(*) AS n FROM data WHERE 'a;b' = 'a;b'")
+    assert result["n"].iloc[0] == 50
+
+
+def test_full_self_join_refused(conn):
+    with pytest.raises(GuardError) as info:
+        SQLGuard().execute(conn, "SELECT COUNT(*) FROM data a, data b")
+    assert info.value.reason in {"self_join", "cartesian_join"}
+
+
+def test_row_limit_injected_and_truncation_flagged(conn):
+    guard = SQLGuard(row_limit=10)
+    assert guard.check(conn, "SELECT speed FROM data").rstrip().endswith("LIMIT 11")
+
+    result = guard.execute(conn, "SELECT speed FROM data")
+    assert len(result) == 10
+    assert result.attrs == {"truncated": True, "row_limit": 10}
+
+
+def test_aggregate_and_explicit_limit_untouched(conn):
+    guard = SQLGuard(row_limit=10)
+    assert "LIMIT" not in guard.check(conn, "SELECT AVG(power) FROM data")
+
+    result = guard.execute(conn, "SELECT speed FROM data ORDER BY speed LIMIT 5")
+    assert result["speed"].tolist() == [0, 1, 2, 3, 4]
+    assert result.attrs["truncated"] is False
+
+
+def test_step_budget_aborts(conn):
+    guard = SQLGuard(max_vm_steps=5_000, check_every=100)
+    with pytest.raises(GuardError) as info:
+        guard.execute(
+            conn,
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 10000000) "
+            "SELECT SUM(i) FROM n",
+        )
+    assert info.value.reason == "step_budget"
+    assert guard.stats()["step_budget"] == 1
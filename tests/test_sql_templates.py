@@ -0,0 +1,50 @@
+# tests/test_sql_templates.py
+import pytest
+
+from llm.models.sql_engine import SQLExecutor
+from workflow.sql_templates import TemplateMatcher
+
+
+@pytest.fixture
+def matcher():
+    return TemplateMatcher()
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "count of rows with speed above 10 between 2024-12-01 and 2024-12-31",
+        "average power between 2024-12-01 and 2024-12-31 where RPM > 50",
+        "average power deviation between 2024-12-01 and 2024-12-31",
+        "average power between 2024-12-01 and 2024-12-31 per day",
+        "compare speed and power",
+    ],
+)
+def test_falls_through(matcher, telemetry, question):
+    assert matcher.match(question, "telemetry", telemetry) is None
+
+
+@pytest.mark.parametrize(
+    "question, func, col",
+    [
+        ("average power between 2024-12-01 and 2024-12-31", "AVG", "Power"),
+        ("What is the maximum Speed from 2024-12-01 to 2024-12-31?", "MAX", "Speed"),
+        ("total of the RPM between 2024-12-30 and 2024-12-31", "SUM", "RPM"),
+        ("count speed between 2024-12-31 08:00 and 2024-12-31 12:00", "COUNT", "Speed"),
+    ],
+)
+def test_matches_agree_with_sql(matcher, telemetry, question, func, col):
+    sql, result = matcher.match(question, "telemetry", telemetry)
+    label = f"{func}({col})"
+    assert list(result.columns) == [label]
+
+    expected = SQLExecutor().execute_sql(telemetry, sql)[label].iloc[0]
+    assert result[label].iloc[0] == pytest.approx(expected)
+
+
+def test_date_only_end_includes_the_whole_day(matcher, telemetry):
+    _, result = matcher.match("average power between 2024-12-01 and 2024-12-31", "telemetry", telemetry)
+    ts = telemetry["StartDateUTC"]
+    in_december = telemetry[(ts >= "2024-12-01") & (ts < "2025-01-01")]
+    assert len(in_december) == 26  # all on 2024-12-31, after midnight
+    assert result.iloc[0, 0] == pytest.approx(in_december["Power"].mean())
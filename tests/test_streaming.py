@@ -0,0 +1,51 @@
+# tests/test_streaming.py
+import pytest
+
+from workflow.streaming import stream_llm, stream_to
+
+
+class _Chunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    def stream(self, prompt):
+        yield from self.chunks
+        if self.error is not None:
+            raise self.error
+
+
+def test_tokens_reach_the_sink_and_metrics_are_named_by_node():
+    tokens = []
+    with stream_to(tokens.append):
+        text, metrics = stream_llm(FakeLLM(["", " Speed ", "rises "]), "prompt", node="sql_interpret")
+
+    assert text == "Speed rises"
+    assert tokens == [" Speed ", "rises "]
+    assert set(metrics) == {"sql_interpret.ttft", "sql_interpret.decode"}
+    assert metrics["sql_interpret.ttft"] <= metrics["sql_interpret.decode"]
+
+
+def test_chat_model_chunks_are_unwrapped():
+    text, _ = stream_llm(FakeLLM([_Chunk("a"), _Chunk(""), _Chunk("b")]), "prompt", node="n")
+    assert text == "ab"
+
+
+def test_sink_is_scoped_to_the_block():
+    tokens = []
+    with stream_to(tokens.append):
+        pass
+    stream_llm(FakeLLM(["x"]), "prompt", node="n")
+    assert tokens == []
+
+
+def test_stream_errors_propagate():
+    tokens = []
+    with stream_to(tokens.append), pytest.raises(RuntimeError, match="generate failed"):
+        stream_llm(FakeLLM(["partial"], error=RuntimeError("generate failed")), "prompt", node="n")
+    assert tokens == ["partial"]
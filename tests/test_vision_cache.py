@@ -0,0 +1,50 @@
+# tests/test_vision_cache.py
+import os
+import threading
+
+from PIL import Image
+
+from llm.models.vision_cache import VisionCache
+
+
+def test_settings_are_part_of_the_key():
+    cache = VisionCache()
+    cache.put(b"page", "describe", "low-res answer", settings="max_pixels=1000")
+    assert cache.get(b"page", "describe", settings="max_pixels=1000") == "low-res answer"
+    assert cache.get(b"page", "describe", settings="max_pixels=None") is None
+
+
+def test_disk_tier_survives_a_restart_and_is_bounded(tmp_path):
+    cache = VisionCache(disk_dir=str(tmp_path), max_disk_entries=2)
+    for i in range(3):
+        cache.put(f"page{i}".encode(), "describe", f"answer {i}")
+
+    fresh = VisionCache(disk_dir=str(tmp_path))
+    assert fresh.get(b"page2", "describe") == "answer 2"
+    assert fresh.stats()["disk_hits"] == 1
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_concurrent_writes_of_one_key_leave_one_clean_file(tmp_path):
+    cache = VisionCache(disk_dir=str(tmp_path))
+    threads = [
+        threading.Thread(target=cache.put, args=(b"page", "describe", f"answer {i}"))
+        for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert len(os.listdir(tmp_path)) == 1
+    assert VisionCache(disk_dir=str(tmp_path)).get(b"page", "describe").startswith("answer ")
+
+
+def test_phash_serves_a_reencoded_copy():
+    cache = VisionCache(use_phash=True)
+    image = Image.linear_gradient("L").convert("RGB")
+    cache.put(b"original", "describe", "answer", image=image)
+
+    resized = image.resize((200, 200))
+    assert cache.get(b"resized", "describe", image=resized) == "answer"
+    assert cache.get(b"resized", "other prompt", image=resized) is None
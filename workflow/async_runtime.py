@@ -0,0 +1,177 @@
+# workflow/async_runtime.py
+import os
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class GPUWorker:
+    """
+    Single owner of GPU calls.
+
+    Jobs from any event loop / thread are queued and served by one
+    dedicated thread, so model calls never run concurrently (one CUDA
+    stream, no cross-thread model access) while callers simply `await`.
+    The caller's contextvars (e.g. the UI token sink of workflow.streaming)
+    are carried into the job.
+
+    Batching happens here rather than behind the queue: `run_batched` jobs
+    that share a key and are waiting together (typically queued while the
+    previous job held the GPU) are merged into ONE `batch_fn(items)` call,
+    up to `max_batch_size` items. A model-side MicroBatcher called from
+    this thread would only ever see one request at a time.
+    """
+
+    def __init__(self, name: str = "gpu-worker", max_batch_size: int = 8):
+        self.max_batch_size = max_batch_size
+        self._loop = asyncio.new_event_loop()
+        self._jobs = deque()          # only touched on the worker thread
+        self._wakeup = None
+        self._ready = threading.Event()
+        self.stats = {"jobs": 0, "max_queue": 0, "batches": 0, "batched_items": 0}
+        self._thread = threading.Thread(target=self._serve, name=name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        self._ready.set()
+        self._loop.run_until_complete(self._drain())
+
+    async def _drain(self):
+        while True:
+            # let submissions that arrived during the last job join the queue
+            await asyncio.sleep(0)
+            if not self._jobs:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            job = self._jobs.popleft()
+            if job is None:
+                break
+            if job[0] is None:
+                self._run_one(job)
+            else:
+                self._run_batch(job)
+
+    def _run_one(self, job):
+        _, ctx, fn, args, kwargs, future = job
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(ctx.run(fn, *args, **kwargs))
+        except BaseException as e:  # delivered to the awaiting caller
+            future.set_exception(e)
+        self.stats["jobs"] += 1
+
+    def _run_batch(self, first):
+        key = first[0]
+        batch, rest = [first], deque()
+        while self._jobs and len(batch) < self.max_batch_size:
+            job = self._jobs.popleft()
+            (batch if job is not None and job[0] == key else rest).append(job)
+        self._jobs.extendleft(reversed(rest))  # others keep their queue position
+
+        batch = [job for job in batch if job[5].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        _, ctx, batch_fn, _, kwargs, _ = batch[0]
+        try:
+            results = ctx.run(batch_fn, [job[3] for job in batch], **kwargs)
+        except BaseException as e:
+            for job in batch:
+                job[5].set_exception(e)
+        else:
+            for job, result in zip(batch, results):
+                job[5].set_result(result)
+
+        self.stats["jobs"] += 1
+        self.stats["batches"] += 1
+        self.stats["batched_items"] += len(batch)
+
+    def _enqueue(self, job):
+        self._jobs.append(job)
+        self._wakeup.set()
+        self.stats["max_queue"] = max(self.stats["max_queue"], len(self._jobs))
+
+    def _submit(self, job) -> Future:
+        if threading.current_thread() is self._thread:
+            # nested call from a job: queueing it would wait on ourselves
+            if job[0] is None:
+                self._run_one(job)
+            else:
+                _, ctx, batch_fn, item, kwargs, future = job
+                self._run_one((None, ctx, lambda: batch_fn([item], **kwargs)[0], (), {}, future))
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, job)
+        return job[5]
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        return self._submit((None, contextvars.copy_context(), fn, args, kwargs, Future()))
+
+    def submit_batched(self, key, batch_fn, item, **kwargs) -> Future:
+        """
+        Queue `item` for `batch_fn(items, **kwargs)`, which must return one
+        result per item. Jobs are merged only with others of the same `key`,
+        which must therefore imply the same batch_fn and kwargs.
+        """
+        return self._submit((key, contextvars.copy_context(), batch_fn, item, kwargs, Future()))
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        await fn(*args, **kwargs) executed on the GPU thread.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    async def run_batched(self, key, batch_fn, item, **kwargs):
+        """
+        await this item's result of a (possibly shared) batch_fn call on the GPU thread.
+        """
+        return await asyncio.wrap_future(self.submit_batched(key, batch_fn, item, **kwargs))
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._enqueue, None)
+        self._thread.join(timeout=5)
+
+
+_cpu_pool = None
+_gpu_worker = None
+_lock = threading.Lock()
+
+
+def get_cpu_pool() -> ThreadPoolExecutor:
+    """
+    Shared pool for CPU-bound node steps (CSV parsing, profiling, SQLite,
+    result compaction); pandas / sqlite3 release the GIL for most of it.
+    """
+    global _cpu_pool
+    with _lock:
+        if _cpu_pool is None:
+            _cpu_pool = ThreadPoolExecutor(
+                max_workers=min(8, (os.cpu_count() or 2)),
+                thread_name_prefix="cpu-step",
+            )
+    return _cpu_pool
+
+
+def get_gpu_worker() -> GPUWorker:
+    global _gpu_worker
+    with _lock:
+        if _gpu_worker is None:
+            _gpu_worker = GPUWorker()
+    return _gpu_worker
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """
+    await fn(*args, **kwargs) on the CPU pool (contextvars preserved).
+    """
+    ctx = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_cpu_pool(), lambda: ctx.run(fn, *args, **kwargs)
+    )
@@ -0,0 +1,159 @@
+# workflow/dataset.py
+import os
+import time
+import inspect
+import threading
+from typing import Optional
+
+import pandas as pd
+
+from llm.models.ingest import ingest_frame
+from llm.models.sql_engine import frame_fingerprint
+
+
+class DatasetRegistry:
+    """
+    Process-wide store of already-parsed DataFrames.
+
+    - Frames are keyed by a content hash (`dataset_id`)
+    - CSV paths are parsed once per (path, size, mtime), through the typed
+      ingestion layer (llm.models.ingest)
+    - Graph nodes resolve `state["dataset_id"]` instead of re-reading CSVs
+    """
+
+    def __init__(self, max_datasets: int = 8):
+        self.max_datasets = max_datasets
+        self._frames = {}          # dataset_id -> DataFrame (insertion = LRU order)
+        self._paths = {}           # (path, size, mtime) -> dataset_id
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------
+    # HASHING
+    # --------------------------------------------------
+    # same hash the SQL engines key their tables by
+    fingerprint = staticmethod(frame_fingerprint)
+
+    # --------------------------------------------------
+    # REGISTRATION
+    # --------------------------------------------------
+    def register(self, df: pd.DataFrame, dataset_id: Optional[str] = None) -> str:
+        dataset_id = dataset_id or self.fingerprint(df)
+
+        with self._lock:
+            if dataset_id in self._frames:
+                self._frames[dataset_id] = self._frames.pop(dataset_id)
+                return dataset_id
+
+            self._frames[dataset_id] = df
+            while len(self._frames) > self.max_datasets:
+                oldest = next(iter(self._frames))
+                del self._frames[oldest]
+                self._paths = {
+                    k: v for k, v in self._paths.items() if v != oldest
+                }
+
+        return dataset_id
+
+    def load_path(self, path: str) -> str:
+        """
+        Parse a CSV / Excel / Parquet file once and return its dataset_id.
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            dataset_id = self._paths.get(key)
+            if dataset_id in self._frames:
+                return dataset_id
+
+        lower = path.lower()
+        if lower.endswith(".parquet"):
+            df = pd.read_parquet(path)
+        elif lower.endswith((".xlsx", ".xls")):
+            df = pd.read_excel(path)
+        else:
+            df = pd.read_csv(path)
+
+        dataset_id = self.register(ingest_frame(df))
+        with self._lock:
+            self._paths[key] = dataset_id
+        return dataset_id
+
+    # --------------------------------------------------
+    # LOOKUP
+    # --------------------------------------------------
+    def get(self, dataset_id: str) -> pd.DataFrame:
+        with self._lock:
+            if dataset_id not in self._frames:
+                raise KeyError(f"Unknown dataset_id: {dataset_id}")
+            df = self._frames.pop(dataset_id)
+            self._frames[dataset_id] = df
+            return df
+
+    def __contains__(self, dataset_id: str) -> bool:
+        return dataset_id in self._frames
+
+
+_registry = DatasetRegistry()
+
+
+def get_registry() -> DatasetRegistry:
+    return _registry
+
+
+def register_dataframe(df: pd.DataFrame) -> str:
+    """
+    Register an already-loaded frame (e.g. st.session_state["raw_df"]).
+    """
+    return _registry.register(df)
+
+
+def resolve_dataset(state):
+    """
+    Return (dataset_id, frame) for a graph state.
+    Prefers `dataset_id`; falls back to parsing `dataframe_path` once.
+    """
+    dataset_id = state.get("dataset_id")
+    if dataset_id is None or dataset_id not in _registry:
+        path = state.get("dataframe_path")
+        if path is None:
+            raise ValueError("State has neither dataset_id nor dataframe_path")
+        dataset_id = _registry.load_path(path)
+    return dataset_id, _registry.get(dataset_id)
+
+
+# --------------------------------------------------
+# PER-NODE TIMINGS
+# --------------------------------------------------
+def merge_timings(left: Optional[dict], right: Optional[dict]) -> dict:
+    """
+    LangGraph reducer: node timings accumulate instead of overwriting.
+    """
+    return {**(left or {}), **(right or {})}
+
+
+def timed(name: str, fn):
+    """
+    Wrap a node so its wall time (ms) is reported under state["timings"][name].
+    Async nodes stay async.
+    """
+
+    def _record(update, start):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        update = dict(update or {})
+        update["timings"] = {**update.get("timings", {}), name: round(elapsed_ms, 3)}
+        return update
+
+    if inspect.iscoroutinefunction(fn):
+
+        async def _atimed(state):
+            start = time.perf_counter()
+            return _record(await fn(state), start)
+
+        return _atimed
+
+    def _timed(state):
+        start = time.perf_counter()
+        return _record(fn(state), start)
+
+    return _timed
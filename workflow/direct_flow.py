@@ -0,0 +1,59 @@
+# workflow/direct_flow.py
+from langchain_core.prompts import ChatPromptTemplate
+
+from workflow.streaming import stream_llm
+from workflow.async_runtime import get_gpu_worker, run_cpu
+from llm.models.prefix_cache import register_prompt
+
+
+DIRECT_PROMPT = ChatPromptTemplate.from_template(
+    """
+You are a maritime domain expert.
+
+Answer the user query clearly and concisely from domain knowledge.
+Do NOT invent figures for a specific vessel or dataset; say when the
+question needs the uploaded data instead.
+
+Domain notes (Knowledge Base excerpts; cite them where they apply):
+{context}
+
+User query:
+{query}
+"""
+)
+
+register_prompt("direct_answer", DIRECT_PROMPT)
+
+
+def _direct_prompt(state, knowledge, top_k: int):
+    context = knowledge.context(state["query"], top_k=top_k) if knowledge else ""
+    return DIRECT_PROMPT.invoke({"context": context or "none", "query": state["query"]})
+
+
+def answer_directly_node(central_llm, knowledge=None, top_k: int = 3):
+    """
+    Answers without SQL or chart extraction (the routers' "answer_directly").
+    Streams the answer token-by-token (see workflow.streaming).
+    knowledge: optional workflow.knowledge.KnowledgeIndex for domain notes
+    """
+
+    def _answer(state):
+        prompt = _direct_prompt(state, knowledge, top_k)
+        answer, metrics = stream_llm(central_llm, prompt, node="answer_directly")
+        return {"final_answer": answer, "timings": metrics}
+
+    return _answer
+
+
+# --------------------------------------------------
+# ASYNC NODES (graph.ainvoke)
+# --------------------------------------------------
+def aanswer_directly_node(central_llm, knowledge=None, top_k: int = 3, gpu=None):
+    gpu = gpu or get_gpu_worker()
+
+    async def _answer(state):
+        prompt = await run_cpu(_direct_prompt, state, knowledge, top_k)
+        answer, metrics = await gpu.run(stream_llm, central_llm, prompt, "answer_directly")
+        return {"final_answer": answer, "timings": metrics}
+
+    return _answer
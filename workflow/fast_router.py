@@ -0,0 +1,199 @@
+# workflow/fast_router.py
+import re
+import time
+import threading
+from collections import defaultdict
+
+from workflow.router import ROUTER_PROMPT, ROUTES, router_node, arouter_node
+
+
+KEYWORDS = {
+    "sql": {
+        "average", "avg", "mean", "max", "maximum", "min", "minimum", "sum",
+        "total", "count", "between", "rows", "table", "column", "median",
+        "highest", "lowest", "group", "daily", "hourly", "weekly",
+    },
+    "vision": {
+        "chart", "graph", "plot", "image", "figure", "axis", "axes", "picture",
+        "curve", "bar", "scatter", "legend", "visible", "shown", "page",
+    },
+    "simple": {
+        "define", "definition", "explain", "meaning", "what's", "why",
+        "difference", "abbreviation", "stand", "concept",
+    },
+}
+
+# generic label -> the label a per-flow builder branches on
+# (graph_builder_sql: answer_directly | generate_sql, graph_builder_vision:
+# answer_directly | extract_from_image)
+FLOW_LABELS = {
+    "simple": "answer_directly",
+    "sql": "generate_sql",
+    "vision": "extract_from_image",
+}
+
+TOKEN_RE = re.compile(r"[a-z']+")
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall(text.lower())
+
+
+def keyword_scores(text: str) -> dict:
+    tokens = tokenize(text)
+    hits = {label: sum(tok in words for tok in tokens) for label, words in KEYWORDS.items()}
+    total = sum(hits.values())
+    if total == 0:
+        return {}
+    return {label: n / total for label, n in hits.items()}
+
+
+def _label_map(valid_routes) -> dict:
+    """
+    generic label -> emitted label, for the generic labels valid_routes can express.
+    """
+    valid = set(valid_routes)
+    return {
+        generic: generic if generic in valid else FLOW_LABELS[generic]
+        for generic in ROUTES
+        if generic in valid or FLOW_LABELS[generic] in valid
+    }
+
+
+class _Tiers:
+    """
+    Local routing tiers shared by the sync and async fast routers.
+    """
+
+    def __init__(self, threshold, model_manager, valid_routes):
+        self.threshold = threshold
+        self.model_manager = model_manager
+        self.labels = _label_map(valid_routes)
+        self.stats = defaultdict(lambda: {"count": 0, "total_ms": 0.0})
+        self.lock = threading.Lock()
+
+    def allowed(self, state) -> list:
+        """
+        Structural tier: the inputs present rule labels out (no table -> no
+        sql, no image -> no vision) but never force one; "simple" stays open.
+        """
+        has_image = bool(state.get("image_path"))
+        has_table = bool(state.get("dataframe_path") or state.get("dataset_id"))
+        ruled_out = set()
+        if has_image != has_table:
+            ruled_out.add("sql" if has_image else "vision")
+        return [g for g in self.labels if g not in ruled_out]
+
+    def local(self, state):
+        """
+        (generic label, source, confidence) from the keyword tier over the
+        allowed labels; confidence 0 when nothing matched.
+        """
+        allowed = self.allowed(state)
+        if len(allowed) == 1:
+            return allowed[0], "structural", 1.0
+
+        # without evidence: the one data route left open (the input that is present), else simple
+        data = [g for g in allowed if g != "simple"]
+        fallback = data[0] if len(data) == 1 else ("simple" if "simple" in allowed else allowed[0])
+        best = (fallback, "default", 0.0)
+
+        probs = {g: p for g, p in keyword_scores(state["query"]).items() if g in allowed}
+        total = sum(probs.values())
+        if total:
+            label, p = max(probs.items(), key=lambda kv: kv[1])
+            best = (label, "keywords", p / total)
+        return best
+
+    def record(self, decision: str, source: str, confidence, start: float) -> dict:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if self.model_manager is not None:
+            self.model_manager.prefetch_for_route(decision)
+
+        with self.lock:
+            self.stats[source]["count"] += 1
+            self.stats[source]["total_ms"] += elapsed_ms
+
+        return {
+            "decision": decision,
+            "route_source": source,
+            "route_confidence": confidence,
+            "timings": {"router": round(elapsed_ms, 3)},
+        }
+
+    def report(self) -> dict:
+        with self.lock:
+            return {
+                source: {
+                    "count": s["count"],
+                    "mean_ms": s["total_ms"] / s["count"] if s["count"] else 0.0,
+                }
+                for source, s in self.stats.items()
+            }
+
+
+def fast_router_node(
+    llm=None,
+    threshold: float = 0.75,
+    model_manager=None,
+    router_prompt=ROUTER_PROMPT,
+    valid_routes=ROUTES,
+):
+    """
+    Tiered router in front of the LLM `router_node`:
+
+    1. structural : which inputs are present rules labels out
+    2. keywords   : per-label keyword rules over the query
+    3. llm        : only when the local tiers are below `threshold`
+
+    valid_routes / router_prompt: the labels the graph branches on and the
+    LLM tier's prompt, e.g. SQL_ROUTES / SQL_ROUTER_PROMPT; the local tiers'
+    simple / sql / vision are emitted as those labels (FLOW_LABELS).
+
+    Returns decision, route_source, route_confidence and timings["router"].
+    With a `model_manager`, the model the decision needs is prefetched.
+    `stats()` on the returned node reports counts and mean latency per source.
+    """
+    tiers = _Tiers(threshold, model_manager, valid_routes)
+    llm_route = router_node(llm, router_prompt, valid_routes) if llm is not None else None
+
+    def _route(state):
+        start = time.perf_counter()
+        label, source, confidence = tiers.local(state)
+        if confidence >= threshold or llm_route is None:
+            return tiers.record(tiers.labels[label], source, confidence, start)
+
+        routed = llm_route(state)
+        return tiers.record(routed["decision"], "llm", routed["route_confidence"], start)
+
+    _route.stats = tiers.report
+    return _route
+
+
+def afast_router_node(
+    llm=None,
+    threshold: float = 0.75,
+    model_manager=None,
+    router_prompt=ROUTER_PROMPT,
+    valid_routes=ROUTES,
+    gpu=None,
+):
+    """
+    Async fast_router_node: the local tiers run inline, the LLM tier is
+    scored on the GPU worker (arouter_node).
+    """
+    tiers = _Tiers(threshold, model_manager, valid_routes)
+    llm_route = arouter_node(llm, router_prompt, valid_routes, gpu) if llm is not None else None
+
+    async def _route(state):
+        start = time.perf_counter()
+        label, source, confidence = tiers.local(state)
+        if confidence >= threshold or llm_route is None:
+            return tiers.record(tiers.labels[label], source, confidence, start)
+
+        routed = await llm_route(state)
+        return tiers.record(routed["decision"], "llm", routed["route_confidence"], start)
+
+    _route.stats = tiers.report
+    return _route
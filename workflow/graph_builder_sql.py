@@ -1,39 +1,86 @@
 # workflow/graph_builder.py
+import threading
+
 from langgraph.graph import StateGraph, END
 from workflow.state import GraphState
-from workflow.router import router_node
-from workflow.vision_flow import vision_node, vision_interpret_node
+from workflow.dataset import timed
+from workflow.sql_cache import SQLCache
+from workflow.sql_templates import TemplateMatcher
+from workflow.knowledge import get_knowledge_index
+from workflow.router import SQL_ROUTER_PROMPT, SQL_ROUTES
+from workflow.fast_router import fast_router_node, afast_router_node
+from workflow.direct_flow import answer_directly_node, aanswer_directly_node
 from workflow.sql_flow import (
     sql_generate_node,
     sql_execute_node,
     sql_interpret_node,
+    asql_generate_node,
+    asql_execute_node,
+    asql_interpret_node,
 )
 # from llm.models.qwen_client import QwenClient
-from llm.models.sqlcoder_client import SQLCoderClient
+from llm.models.inference_client import local_manager, resolve_model
 
 # qwen = QwenClient()
-sqlc = SQLCoderClient()
 
+SQL_CACHE_PATH = "input/cache/sql_cache.json"
+
+_sql_cache = None
+_sql_templates = None
+_caches_lock = threading.Lock()
+
+
+def _caches():
+    """
+    SQL cache and template matcher shared by every graph built in this
+    process, created on the first build rather than at import.
+    """
+    global _sql_cache, _sql_templates
+    with _caches_lock:
+        if _sql_cache is None:
+            _sql_cache = SQLCache(path=SQL_CACHE_PATH)
+            _sql_templates = TemplateMatcher()
+    return _sql_cache, _sql_templates
 
-def build_graph(central_llm, sqlc):
+
+def build_graph(central_llm, sqlc=None, async_nodes: bool = False):
+    """
+    sqlc: SQLCoder handle; by default the inference server client when
+    MDIS_INFERENCE_ADDR is set, else loaded in-process on first use (and
+    offloaded when another model needs the GPU).
+    async_nodes=True builds async nodes (model calls on the shared GPU
+    worker, CPU steps on the thread pool); run with `await graph.ainvoke(state)`.
+    """
     graph = StateGraph(GraphState)
+    sqlc = sqlc if sqlc is not None else resolve_model("sqlcoder")
+    sql_cache, sql_templates = _caches()
+    knowledge = get_knowledge_index()
+
+    route, direct, generate, execute, interpret = (
+        (afast_router_node, aanswer_directly_node, asql_generate_node, asql_execute_node, asql_interpret_node)
+        if async_nodes
+        else (fast_router_node, answer_directly_node, sql_generate_node, sql_execute_node, sql_interpret_node)
+    )
 
     # nodes
-    sql_graph.add_node(
-    "sql_router",
-    router_node(
-        llm=mistral_llm,
-        router_prompt=SQL_ROUTER_PROMPT,
-        valid_routes={"answer_directly", "generate_sql"},
-    ),
+    # keywords first, Mistral only for ambiguous questions; SQLCoder is prefetched on generate_sql
+    graph.add_node(
+        "sql_router",
+        route(
+            central_llm,
+            model_manager=local_manager(),
+            router_prompt=SQL_ROUTER_PROMPT,
+            valid_routes=SQL_ROUTES,
+        ),
     )
+    graph.add_node("answer_directly", timed("answer_directly", direct(central_llm, knowledge=knowledge)))
 
     # graph.add_node("vision", vision_node(qwen))
     # graph.add_node("vision_interpret", vision_interpret_node(central_llm))
 
-    graph.add_node("sql_generate", sql_generate_node(sqlc))
-    graph.add_node("sql_execute", sql_execute_node(sqlc))
-    graph.add_node("sql_interpret", sql_interpret_node(central_llm))
+    graph.add_node("sql_generate", timed("sql_generate", generate(sqlc, sql_cache, sql_templates)))
+    graph.add_node("sql_execute", timed("sql_execute", execute(sqlc, sql_cache)))
+    graph.add_node("sql_interpret", timed("sql_interpret", interpret(central_llm, knowledge=knowledge)))
 
     # entry
     graph.set_entry_point("sql_router")
@@ -41,7 +88,7 @@ def build_graph(central_llm, sqlc):
     # conditional routing
     graph.add_conditional_edges(
         "sql_router",
-        lambda state: state["route"],
+        lambda state: state["decision"],
         {
             "answer_directly": "answer_directly",
             "generate_sql": "sql_generate",
@@ -56,7 +103,7 @@ def build_graph(central_llm, sqlc):
     graph.add_edge("sql_generate", "sql_execute")
     graph.add_edge("sql_execute", "sql_interpret")
     graph.add_edge("sql_interpret", END)
-    sql_graph.add_edge("answer_directly", END)
+    graph.add_edge("answer_directly", END)
 
 
     return graph.compile()
@@ -1,36 +1,62 @@
 # workflow/graph_builder.py
 from langgraph.graph import StateGraph, END
 from workflow.state import GraphState
-from workflow.router import router_node
-from workflow.vision_flow import vision_node, vision_interpret_node
+from workflow.dataset import timed
+from workflow.router import VISION_ROUTER_PROMPT, VISION_ROUTES
+from workflow.fast_router import fast_router_node, afast_router_node
+from workflow.direct_flow import answer_directly_node, aanswer_directly_node
+from workflow.vision_flow import (
+    vision_node,
+    vision_interpret_node,
+    avision_node,
+    avision_interpret_node,
+)
 from workflow.sql_flow import (
     sql_generate_node,
     sql_execute_node,
     sql_interpret_node,
 )
-from llm.models.qwen_client import QwenClient
+from workflow.knowledge import get_knowledge_index
+from llm.models.inference_client import local_manager, resolve_model
 # from llm.models.sqlcoder_client import SQLCoderClient
 
-qwen = QwenClient()
 # sqlc = SQLCoderClient()
 
 
-def build_graph(central_llm, sqlc):
+def build_graph(central_llm, sqlc=None, async_nodes: bool = False, qwen=None):
+    """
+    qwen: Qwen handle; by default the inference server client when
+    MDIS_INFERENCE_ADDR is set, else loaded in-process on first use (and
+    offloaded when another model needs the GPU).
+    async_nodes=True builds async nodes (Qwen / Mistral calls on the shared
+    GPU worker); run with `await graph.ainvoke(state)`.
+    """
     vision_graph = StateGraph(GraphState)
+    qwen = qwen if qwen is not None else resolve_model("qwen")
+    knowledge = get_knowledge_index()
+
+    route, direct, extract, interpret = (
+        (afast_router_node, aanswer_directly_node, avision_node, avision_interpret_node)
+        if async_nodes
+        else (fast_router_node, answer_directly_node, vision_node, vision_interpret_node)
+    )
 
     # nodes
+    # keywords first, Mistral only for ambiguous questions; Qwen is prefetched on extract_from_image
     vision_graph.add_node(
         "vision_router",
-        router_node(
-            llm=mistral_llm,
+        route(
+            central_llm,
+            model_manager=local_manager(),
             router_prompt=VISION_ROUTER_PROMPT,
-            valid_routes={"answer_directly", "extract_from_image"},
+            valid_routes=VISION_ROUTES,
         ),
     )
+    vision_graph.add_node("answer_directly", timed("answer_directly", direct(central_llm, knowledge=knowledge)))
 
-    vision_graph.add_node("vision", vision_node(qwen))
+    vision_graph.add_node("vision_extract", timed("vision_extract", extract(qwen)))
 
-    vision_graph.add_node("vision_interpret", vision_interpret_node(central_llm))
+    vision_graph.add_node("vision_interpret", timed("vision_interpret", interpret(central_llm, knowledge=knowledge)))
 
     # graph.add_node("sql_generate", sql_generate_node(sqlc))
     # graph.add_node("sql_execute", sql_execute_node(sqlc))
@@ -42,7 +68,7 @@ def build_graph(central_llm, sqlc):
     # conditional routing
     vision_graph.add_conditional_edges(
         "vision_router",
-        lambda state: state["route"],
+        lambda state: state["decision"],
         {
             "answer_directly": "answer_directly",
             "extract_from_image": "vision_extract",
@@ -0,0 +1,332 @@
+# workflow/knowledge.py
+import os
+import re
+import json
+import tempfile
+import threading
+
+import numpy as np
+
+
+KB_DIR = "Knowledge Base"
+KB_FILES = ("Concepts.md", "Relations.json")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "if", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was",
+    "what", "when", "which", "with", "how", "does", "do", "why", "show", "me",
+}
+
+# keys that make a JSON object a self-contained chunk
+_JSON_ID_KEYS = ("variable_name", "rule_id", "rule_name", "relationship_type", "name", "title", "condition")
+
+
+def tokenize(text: str) -> list:
+    """
+    Lower-cased alphanumeric terms, stop words dropped, trailing plural 's' cut.
+    """
+    terms = []
+    for t in re.findall(r"[a-z0-9]+", text.lower()):
+        if t in STOPWORDS:
+            continue
+        if len(t) > 3 and t.endswith("s") and not t.endswith("ss"):
+            t = t[:-1]
+        terms.append(t)
+    return terms
+
+
+# --------------------------------------------------
+# CHUNKING
+# --------------------------------------------------
+def chunk_markdown(text: str, source: str) -> list:
+    """
+    One chunk per heading; the title carries the heading path
+    ("Logical Validation > Physics Constraints > Draft-Power Relationship").
+    """
+    chunks, path, body = [], [], []
+
+    def _flush():
+        content = "\n".join(body).strip()
+        if path and content:
+            chunks.append({"source": source, "title": " > ".join(path), "text": content})
+
+    for line in text.splitlines():
+        m = re.match(r"^(#{1,6})\s+(.*)", line)
+        if m:
+            _flush()
+            body = []
+            level = len(m.group(1))
+            path = path[: level - 1] + [m.group(2).strip()]
+        else:
+            body.append(line)
+    _flush()
+    return chunks
+
+
+def _flatten(obj, prefix: str = "") -> list:
+    if isinstance(obj, dict):
+        return [line for k, v in obj.items() for line in _flatten(v, f"{prefix}{k}: ")]
+    if isinstance(obj, list):
+        if all(not isinstance(v, (dict, list)) for v in obj):
+            return [f"{prefix}{', '.join(map(str, obj))}"]
+        return [line for v in obj for line in _flatten(v, prefix)]
+    return [f"{prefix}{obj}"]
+
+
+def chunk_json(obj, source: str, context: str = "") -> list:
+    """
+    One chunk per parameter / rule / correlation: objects without nested
+    lists of objects become a chunk, containers are walked (nested dict
+    fields such as `domain_context` get a chunk of their own).
+    """
+    if isinstance(obj, list):
+        return [c for item in obj for c in chunk_json(item, source, context)]
+    if not isinstance(obj, dict):
+        return []
+
+    nested = {k for k, v in obj.items() if isinstance(v, list) and v and isinstance(v[0], dict)}
+    if not nested:
+        ident = next((obj[k] for k in _JSON_ID_KEYS if isinstance(obj.get(k), str)), None)
+        title = " > ".join(t for t in (context, ident) if t) or source
+        return [{"source": source, "title": title, "text": "\n".join(_flatten(obj))}]
+
+    label = obj.get("category_name") or obj.get("module") or context
+    chunks = []
+    for key, value in obj.items():
+        if key in nested:
+            chunks += chunk_json(value, source, label or key)
+        elif isinstance(value, dict):
+            chunks.append({"source": source, "title": key, "text": "\n".join(_flatten(value))})
+    return chunks
+
+
+def load_chunks(kb_dir: str = KB_DIR, files=KB_FILES) -> list:
+    chunks = []
+    for name in files:
+        path = os.path.join(kb_dir, name)
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8-sig") as f:
+            if name.endswith(".json"):
+                chunks += chunk_json(json.load(f), name)
+            else:
+                chunks += chunk_markdown(f.read(), name)
+    return chunks
+
+
+# --------------------------------------------------
+# INDEX
+# --------------------------------------------------
+class _Postings:
+    """
+    One build of the index. Never mutated: a rebuild makes a new one and
+    swaps it in whole, so a query never mixes arrays from two builds.
+    """
+
+    def __init__(self, signature, chunks, vocab, indptr, doc_ids, tf, doc_len):
+        self.signature = signature
+        self.chunks = chunks
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tf = tf
+        self.doc_len = doc_len
+
+        n = max(len(doc_len), 1)
+        df = np.diff(indptr).astype(np.float32)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        self.avg_len = float(doc_len.mean()) if len(doc_len) else 1.0
+
+
+class KnowledgeIndex:
+    """
+    Okapi BM25 over Knowledge Base chunks.
+
+    Postings are stored term-major in CSR form (indptr / doc ids / term
+    frequencies as flat NumPy arrays), so a query touches only the posting
+    lists of its own terms. The index is persisted as .npz next to a
+    signature of the source files and rebuilt only when they change.
+    """
+
+    def __init__(
+        self,
+        kb_dir: str = KB_DIR,
+        files=KB_FILES,
+        cache_path: str = "input/cache/kb_index.npz",
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.kb_dir = kb_dir
+        self.files = tuple(files)
+        self.cache_path = cache_path
+        self.k1 = k1
+        self.b = b
+
+        self._postings = None
+        self._lock = threading.Lock()
+        self.stats = {"builds": 0, "loads": 0, "queries": 0}
+
+    @property
+    def chunks(self) -> list:
+        postings = self._postings
+        return postings.chunks if postings is not None else []
+
+    # ------------------------------------------------
+    # FRESHNESS
+    # ------------------------------------------------
+    def signature(self) -> list:
+        sig = []
+        for name in self.files:
+            path = os.path.join(self.kb_dir, name)
+            if os.path.exists(path):
+                st = os.stat(path)
+                sig.append([name, st.st_size, st.st_mtime_ns])
+        return sig
+
+    def _ensure(self) -> _Postings:
+        sig = self.signature()
+        postings = self._postings
+        if postings is not None and postings.signature == sig:
+            return postings
+        with self._lock:
+            postings = self._postings
+            if postings is not None and postings.signature == sig:
+                return postings
+            postings = self._load(sig)
+            if postings is None:
+                postings = self._build(sig)
+                self._save(postings)
+            self._postings = postings
+            return postings
+
+    # ------------------------------------------------
+    # BUILD / PERSIST
+    # ------------------------------------------------
+    def _build(self, sig) -> _Postings:
+        chunks = load_chunks(self.kb_dir, self.files)
+        docs = [tokenize(f"{c['title']} {c['text']}") for c in chunks]
+
+        vocab, rows = {}, []
+        for doc_id, terms in enumerate(docs):
+            ids, counts = np.unique(
+                np.fromiter((vocab.setdefault(t, len(vocab)) for t in terms), dtype=np.int64),
+                return_counts=True,
+            )
+            rows.append((np.full(len(ids), doc_id), ids, counts))
+
+        doc_ids = np.concatenate([r[0] for r in rows]) if rows else np.empty(0, np.int64)
+        term_ids = np.concatenate([r[1] for r in rows]) if rows else np.empty(0, np.int64)
+        tf = np.concatenate([r[2] for r in rows]) if rows else np.empty(0, np.int64)
+
+        order = np.argsort(term_ids, kind="stable")
+        self.stats["builds"] += 1
+        return _Postings(
+            sig,
+            chunks,
+            vocab,
+            indptr=np.concatenate(([0], np.cumsum(np.bincount(term_ids, minlength=len(vocab))))),
+            doc_ids=doc_ids[order].astype(np.int32),
+            tf=tf[order].astype(np.float32),
+            doc_len=np.array([len(d) for d in docs], dtype=np.float32),
+        )
+
+    def _save(self, postings: _Postings):
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(self.cache_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        meta = {"signature": postings.signature, "vocab": postings.vocab, "chunks": postings.chunks}
+
+        # private tmp file in the same directory: os.replace stays atomic
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".kb_index.", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    indptr=postings.indptr,
+                    doc_ids=postings.doc_ids,
+                    tf=postings.tf,
+                    doc_len=postings.doc_len,
+                    meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+                )
+            os.replace(tmp, self.cache_path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _load(self, sig):
+        """
+        The persisted build for `sig`, or None.
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with np.load(self.cache_path) as data:
+                meta = json.loads(data["meta"].tobytes().decode())
+                if meta["signature"] != sig:
+                    return None
+                arrays = {k: data[k] for k in ("indptr", "doc_ids", "tf", "doc_len")}
+        except (OSError, ValueError, KeyError):
+            return None
+
+        self.stats["loads"] += 1
+        return _Postings(sig, meta["chunks"], meta["vocab"], **arrays)
+
+    # ------------------------------------------------
+    # QUERY
+    # ------------------------------------------------
+    def search(self, query: str, top_k: int = 3, min_score: float = 0.0) -> list:
+        """
+        [(score, chunk), ...] best first.
+        """
+        p = self._ensure()
+        self.stats["queries"] += 1
+
+        scores = np.zeros(len(p.chunks), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * p.doc_len / p.avg_len)
+
+        for term in set(tokenize(query)):
+            t = p.vocab.get(term)
+            if t is None:
+                continue
+            lo, hi = p.indptr[t], p.indptr[t + 1]
+            docs, tf = p.doc_ids[lo:hi], p.tf[lo:hi]
+            scores[docs] += p.idf[t] * tf * (self.k1 + 1) / (tf + norm[docs])
+
+        if not scores.any():
+            return []
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), p.chunks[i]) for i in best if scores[i] > min_score]
+
+    def context(self, query: str, top_k: int = 3, max_chars: int = 1500) -> str:
+        """
+        Top-k chunks rendered for an interpret prompt, capped at `max_chars`.
+        """
+        parts, used = [], 0
+        for _, chunk in self.search(query, top_k=top_k):
+            text = f"[{chunk['title']}]\n{chunk['text']}"
+            if used + len(text) > max_chars:
+                text = text[: max(max_chars - used, 0)]
+            if text:
+                parts.append(text)
+                used += len(text)
+            if used >= max_chars:
+                break
+        return "\n\n".join(parts)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_knowledge_index() -> KnowledgeIndex:
+    """
+    Lazy-loaded process-wide index over the bundled Knowledge Base.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = KnowledgeIndex()
+    return _index
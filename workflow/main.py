@@ -4,6 +4,7 @@ import streamlit as st
 import os
 import json
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from input import image_loader
 from input.data_loader import load_tabular_file
@@ -14,6 +15,14 @@ from pipelines.data_query_pipelines import *
 from pipelines.data_query_pipelines import *
 from pipelines.images_query_pipeline import image_query
 from pipelines.graph_pipeline import get_model
+from workflow.dataset import register_dataframe
+from llm.models.ingest import ingest_frame
+from workflow.profiler import get_profile, describe_profile
+from workflow.streaming import stream_to
+from workflow.query_log import QueryLog, migrate_json_log
+from workflow.vision_flow import prefetch_pages
+from workflow.graph_builder_sql import build_graph as build_sql_graph
+from llm.models.inference_client import resolve_model
 
 
 
@@ -26,7 +35,8 @@ st.set_page_config(page_title="Chart Insight Generator", layout="wide")
 BASE_INPUT_DIR = "input"
 CHART_IMAGE_DIR = os.path.join(BASE_INPUT_DIR, "charts", "raw_images")
 RAW_DATA_DIR = os.path.join(BASE_INPUT_DIR, "data", "raw_files")
-QUERY_LOG_PATH = os.path.join(BASE_INPUT_DIR, "user_queries", "queries.json")
+QUERY_LOG_PATH = os.path.join(BASE_INPUT_DIR, "user_queries", "queries.jsonl")
+LEGACY_QUERY_LOG_PATH = os.path.join(BASE_INPUT_DIR, "user_queries", "queries.json")
 
 os.makedirs(CHART_IMAGE_DIR, exist_ok=True)
 os.makedirs(RAW_DATA_DIR, exist_ok=True)
@@ -48,10 +58,38 @@ def cached_load_pdf(uploaded_file):
     return load_pdf_as_images(uploaded_file)
 
 ## Model_load
-m1 = get_model()
+# once per server process, not on every Streamlit rerun; with MDIS_INFERENCE_ADDR
+# set the graph nodes talk to `python -m llm.models.inference_server` instead of
+# holding their own weights
+@st.cache_resource(show_spinner=False)
+def get_pipeline():
+    return get_model()
+
+m1 = get_pipeline()
+
+@st.cache_resource(show_spinner=False)
+def get_sql_graph():
+    # in-repo SQL graph: its nodes resolve the registered frame by dataset_id
+    return build_sql_graph(resolve_model("mistral"))
+
+@st.cache_resource(show_spinner=False)
+def get_vision_model():
+    return resolve_model("qwen")
 # ======================================================
 # HELPERS
 # ======================================================
+def live_answer(box):
+    """
+    Token callback that renders the answer into `box` as it streams.
+    """
+    parts = []
+
+    def _on_token(token):
+        parts.append(token)
+        box.markdown("".join(parts))
+
+    return _on_token
+
 def save_uploaded_file(uploaded_file, target_dir):
     timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     path = os.path.join(target_dir, f"{timestamp}_{uploaded_file.name}")
@@ -59,23 +97,23 @@ def save_uploaded_file(uploaded_file, target_dir):
         f.write(uploaded_file.getbuffer())
     return path
 
-def save_query(query_text, mode):
+@st.cache_resource(show_spinner=False)
+def get_query_log():
+    log = QueryLog(QUERY_LOG_PATH)
+    migrate_json_log(LEGACY_QUERY_LOG_PATH, log)
+    return log
+
+def save_query(query_text, mode, **inputs):
+    """
+    O(1) append; `inputs` (dataframe_path / image_path) make the entry replayable.
+    """
     entry = {
         "timestamp": datetime.utcnow().isoformat(),
         "mode": mode,
-        "query": query_text
+        "query": query_text,
+        **inputs,
     }
-
-    if os.path.exists(QUERY_LOG_PATH):
-        with open(QUERY_LOG_PATH, "r") as f:
-            data = json.load(f)
-    else:
-        data = []
-
-    data.append(entry)
-
-    with open(QUERY_LOG_PATH, "w") as f:
-        json.dump(data, f, indent=2)
+    get_query_log().append(entry)
 
 # ======================================================
 # UI
@@ -117,12 +155,17 @@ if mode == "Upload Raw Data (CSV/Excel)":
             st.session_state.pop("raw_df", None)
             st.session_state.pop("table_name", None)
             st.session_state.pop("raw_data_path", None)
+            st.session_state.pop("dataset_id", None)
             saved_path = save_uploaded_file(uploaded_file, RAW_DATA_DIR)
             df,file_name = cached_load_tabular(uploaded_file)
+            # typed once: timestamps parsed, numerics downcast
+            df = ingest_frame(df)
 
             st.session_state["raw_df"] = df
             st.session_state['table_name'] = file_name
             st.session_state["raw_data_path"] = saved_path
+            # parse once: graph nodes resolve the frame by dataset_id
+            st.session_state["dataset_id"] = register_dataframe(df)
 
             st.success("File uploaded and saved once")
 
@@ -135,7 +178,9 @@ if mode == "Upload Raw Data (CSV/Excel)":
         st.dataframe(df.head())
 
         st.write("### Basic Info")
-        st.write(df.describe(include="all"))
+        # profiled once per upload (cached by dataset_id), not on every rerun
+        profile = get_profile(df, key=st.session_state.get("dataset_id"))
+        st.write(describe_profile(profile))
 
         st.divider()
         st.subheader("🧠 Ask a Question")
@@ -151,7 +196,11 @@ if mode == "Upload Raw Data (CSV/Excel)":
             st.warning("Please enter a query")
         else:
             # save query
-            save_query(user_query, mode)
+            save_query(
+                user_query,
+                mode,
+                dataframe_path=st.session_state.get("raw_data_path"),
+            )
 
             # df,query = df_query(df,user_query)
             # print(df)
@@ -181,15 +230,20 @@ if mode == "Upload Raw Data (CSV/Excel)":
             # print(summary)
 
             st.success("Query submitted and processed")
-            sql_result, final_answer,sql_query = m1.graph_sql_pipe(
-                                                        dataframe=st.session_state["raw_df"],
-                                                        user_query=user_query,
-                                                        table_name=st.session_state["table_name"]
-                                                    )
             st.subheader("Results")
-            st.success(sql_result)
-            st.success(sql_query)
-            st.success(final_answer)
+            answer_box = st.empty()
+
+            with stream_to(live_answer(answer_box)):
+                result = get_sql_graph().invoke({
+                    "query": user_query,
+                    # nodes resolve the registered frame instead of re-parsing
+                    "dataset_id": st.session_state["dataset_id"],
+                    "dataframe_path": st.session_state.get("raw_data_path"),
+                })
+            if result.get("sql_query"):
+                st.success(result.get("sql_result"))
+                st.success(result["sql_query"])
+            answer_box.success(result["final_answer"])
             
                                                                 
 
@@ -224,14 +278,14 @@ elif mode == "Upload Chart Image / PDF":
             if uploaded_file.name.lower().endswith(".pdf"):
                 images = cached_load_pdf(uploaded_file)
 
-                for i, img in enumerate(images):
-                    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-                    path = os.path.join(
-                        CHART_IMAGE_DIR,
-                        f"{timestamp}_page_{i+1}.png"
-                    )
-                    img.save(path)
-                    image_paths.append(path)
+                timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+                image_paths = [
+                    os.path.join(CHART_IMAGE_DIR, f"{timestamp}_page_{i+1}.png")
+                    for i in range(len(images))
+                ]
+                # PNG encoding releases the GIL; save the pages concurrently
+                with ThreadPoolExecutor(max_workers=4) as pool:
+                    list(pool.map(lambda args: args[0].save(args[1]), zip(images, image_paths)))
 
             else:
                 img = cached_load_image(uploaded_file)
@@ -252,6 +306,12 @@ elif mode == "Upload Chart Image / PDF":
             st.session_state["chart_file_name"] = uploaded_file.name
             st.session_state["selected_image_index"] = 0
 
+            # analyze every page in the background; selecting one is then instant
+            if len(image_paths) > 1:
+                st.session_state["chart_prefetch"] = prefetch_pages(
+                    get_vision_model(), image_paths
+                )
+
             st.success("New chart uploaded and saved")
 
 
@@ -290,26 +350,34 @@ if "chart_images" in st.session_state:
         if not user_query.strip():
             st.warning("Please enter a query")
         else:
-            save_query(user_query, mode)
-            st.success("Query submitted")
-
             # ✅ USE SELECTED IMAGE
             idx = st.session_state.get("selected_image_index", 0)
+
+            save_query(
+                user_query,
+                mode,
+                image_path=st.session_state["chart_image_paths"][idx],
+            )
+            st.success("Query submitted")
+
             selected_image = st.session_state["chart_images"][idx]
 
             image, query = image_query(selected_image, user_query)
 
-            vision_result, final_result = m1.graph_vision_pipe(
-                image=image,
-                user_query=query
-            )
+            st.subheader("Results")
+            answer_box = st.empty()
+
+            with stream_to(live_answer(answer_box)):
+                vision_result, final_result = m1.graph_vision_pipe(
+                    image=image,
+                    user_query=query
+                )
+
+            answer_box.success(final_result)
 
             with st.expander("View Vision Analysis Details"):
                 st.write(vision_result)
 
-            st.subheader("Results")
-            st.success(final_result)
-
 
 
 
@@ -0,0 +1,168 @@
+# workflow/profiler.py
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from llm.models.ingest import detect_datetime_format, sql_type
+from llm.models.sql_engine import frame_fingerprint
+
+
+SAMPLE_VALUES = 3
+
+
+def profile_dataset(df: pd.DataFrame) -> dict:
+    """
+    One profile per dataset: column types, min/max, null rate, cardinality,
+    sample values and timestamp ranges. Column statistics are computed with
+    frame-level (vectorized) reductions rather than per-column describe().
+    """
+    n = len(df)
+    null_rate = df.isna().mean() if n else pd.Series(0.0, index=df.columns)
+    cardinality = df.nunique(dropna=True)
+
+    numeric = df.select_dtypes("number")
+    num_min, num_max = numeric.min(), numeric.max()
+    num_mean = numeric.mean()
+
+    columns = OrderedDict()
+    for col in df.columns:
+        series = df[col]
+        info = {
+            "dtype": str(series.dtype),
+            "sql_type": sql_type(series.dtype),
+            "null_rate": float(null_rate[col]),
+            "cardinality": int(cardinality[col]),
+            "samples": [str(v) for v in series.dropna().unique()[:SAMPLE_VALUES]],
+        }
+
+        if col in numeric.columns:
+            info["kind"] = "numeric"
+            info["min"] = None if pd.isna(num_min[col]) else float(num_min[col])
+            info["max"] = None if pd.isna(num_max[col]) else float(num_max[col])
+            info["mean"] = None if pd.isna(num_mean[col]) else float(num_mean[col])
+        else:
+            fmt = None
+            if pd.api.types.is_datetime64_any_dtype(series):
+                parsed = series
+            else:
+                fmt = detect_datetime_format(series)
+                parsed = pd.to_datetime(series, format=fmt, errors="coerce") if fmt else None
+
+            if parsed is not None and parsed.notna().any():
+                info["kind"] = "timestamp"
+                info["sql_type"] = "TIMESTAMP"
+                info["format"] = fmt
+                info["min"] = str(parsed.min())
+                info["max"] = str(parsed.max())
+            else:
+                info["kind"] = "categorical"
+
+        columns[col] = info
+
+    return {"rows": n, "columns": columns}
+
+
+# --------------------------------------------------
+# CACHE (by content hash)
+# --------------------------------------------------
+class ProfileCache:
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, df: pd.DataFrame, key: str = None) -> dict:
+        """
+        key: dataset_id when known (skips re-hashing the frame)
+        """
+        key = key or frame_fingerprint(df)
+        with self._lock:
+            if key in self._profiles:
+                self._profiles.move_to_end(key)
+                return self._profiles[key]
+
+        profile = profile_dataset(df)
+        with self._lock:
+            self._profiles[key] = profile
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+        return profile
+
+
+_cache = ProfileCache()
+
+
+def get_profile(df: pd.DataFrame, key: str = None) -> dict:
+    return _cache.get(df, key)
+
+
+# --------------------------------------------------
+# CONSUMERS
+# --------------------------------------------------
+def describe_profile(profile: dict) -> pd.DataFrame:
+    """
+    Preview-pane summary (replaces df.describe(include="all")).
+    """
+    rows = {}
+    for col, info in profile["columns"].items():
+        rows[col] = {
+            "type": info["kind"],
+            "min": info.get("min"),
+            "max": info.get("max"),
+            "mean": info.get("mean"),
+            "null %": round(info["null_rate"] * 100, 2),
+            "unique": info["cardinality"],
+            "examples": ", ".join(info["samples"]),
+        }
+    return pd.DataFrame(rows).T
+
+
+def _name_tokens(name: str) -> set:
+    spaced = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(name))
+    return {t for t in re.split(r"[^a-z0-9]+", spaced.lower()) if t}
+
+
+def link_columns(profile: dict, question: str, max_columns: int = 12) -> list:
+    """
+    Schema linking for wide tables: keep timestamp columns plus the columns
+    whose name tokens (or sample values) appear in the question.
+    Narrow tables are returned unchanged.
+    """
+    columns = list(profile["columns"])
+    if len(columns) <= max_columns:
+        return columns
+
+    q_tokens = set(re.findall(r"[a-z0-9]+", question.lower()))
+    q_text = question.lower()
+
+    scored = []
+    for i, col in enumerate(columns):
+        info = profile["columns"][col]
+        score = 2 * len(_name_tokens(col) & q_tokens)
+        score += sum(1 for s in info["samples"] if s.lower() in q_text)
+        if info["kind"] == "timestamp":
+            score += 1
+        scored.append((score, -i, col))
+
+    keep = {col for score, _, col in sorted(scored, reverse=True)[:max_columns] if score > 0}
+    if not keep:
+        return columns[:max_columns]
+    return [c for c in columns if c in keep]
+
+
+def _schema_line(col: str, info: dict) -> str:
+    line = f"{col} {info['sql_type']}"
+    if info["kind"] == "timestamp":
+        # stored as ISO text; tell the model so literals compare correctly
+        line += f" -- 'YYYY-MM-DD HH:MM:SS', {info['min']} to {info['max']}"
+    return line
+
+
+def schema_string(profile: dict, columns: list = None) -> str:
+    """
+    `col TYPE` lines for SQL_PROMPT (timestamps with storage format + range).
+    """
+    columns = columns or list(profile["columns"])
+    return "\n".join(_schema_line(c, profile["columns"][c]) for c in columns)
@@ -0,0 +1,129 @@
+# workflow/query_log.py
+import os
+import io
+import json
+import gzip
+import glob
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process lock only
+    fcntl = None
+
+
+class QueryLog:
+    """
+    Append-only, line-delimited (JSONL) query log.
+
+    - each submit appends ONE line: O(1) regardless of log size
+    - writes hold an exclusive flock so concurrent sessions never interleave
+    - the active segment rotates at `max_bytes`; old segments are gzipped
+      as `<name>.<UTC timestamp>.jsonl.gz`
+    """
+
+    def __init__(self, path: str, max_bytes: int = 16 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    # --------------------------------------------------
+    # WRITE
+    # --------------------------------------------------
+    def append(self, entry: dict):
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+        with self._lock:
+            f = self._open_locked()
+            try:
+                f.write(line)
+                f.flush()
+                if f.tell() >= self.max_bytes:
+                    self._rotate()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                f.close()
+
+    def _open_locked(self):
+        """
+        Open the active segment under an exclusive lock. If another process
+        rotated it while we waited, the handle points at the old inode, so
+        reopen.
+        """
+        while True:
+            f = open(self.path, "ab")
+            if fcntl is None:
+                return f
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if os.stat(self.path).st_ino == os.fstat(f.fileno()).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+    def _rotate(self):
+        """
+        Called with the segment lock held. The renamed segment is compressed
+        and removed; the next append recreates the active file.
+        """
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        base = self.path[: -len(".jsonl")] if self.path.endswith(".jsonl") else self.path
+        rotated = f"{base}.{stamp}.jsonl"
+        os.replace(self.path, rotated)
+
+        with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+            while True:
+                chunk = src.read(1024 * 1024)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        os.remove(rotated)
+
+    # --------------------------------------------------
+    # READ
+    # --------------------------------------------------
+    def segments(self) -> list:
+        """
+        Compressed segments oldest-first, then the active file.
+        """
+        base = self.path[: -len(".jsonl")] if self.path.endswith(".jsonl") else self.path
+        paths = sorted(glob.glob(f"{glob.escape(base)}.*.jsonl.gz"))
+        if os.path.exists(self.path):
+            paths.append(self.path)
+        return paths
+
+    def __iter__(self):
+        """
+        Stream entries oldest-first without loading the log into memory.
+        Partially written trailing lines are skipped.
+        """
+        for path in self.segments():
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rb") as raw:
+                for line in io.TextIOWrapper(raw, encoding="utf-8"):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+
+def migrate_json_log(json_path: str, log: QueryLog):
+    """
+    One-off import of the legacy `queries.json` array into a QueryLog.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    with open(json_path, "r") as f:
+        entries = json.load(f)
+    for entry in entries:
+        log.append(entry)
+    os.replace(json_path, f"{json_path}.migrated")
+    return len(entries)
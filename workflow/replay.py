@@ -0,0 +1,101 @@
+# workflow/replay.py
+"""
+Replay the query log through a graph (load test from real traffic).
+
+    python -m workflow.replay --log input/user_queries/queries.jsonl \
+        --graph mypkg.graphs:build_sql_graph --concurrency 4 --limit 200
+
+`--graph` names a zero-argument callable returning a compiled LangGraph
+(anything with `.invoke(state)`).
+"""
+import argparse
+import importlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from workflow.query_log import QueryLog
+
+
+def entry_to_state(entry: dict) -> dict:
+    """
+    Rebuild the graph input from a logged submit.
+    """
+    return {
+        "query": entry["query"],
+        "dataframe_path": entry.get("dataframe_path"),
+        "image_path": entry.get("image_path"),
+    }
+
+
+def replay(entries, graph, concurrency: int = 1) -> dict:
+    """
+    Stream `entries` through `graph.invoke` and report latency percentiles.
+    """
+    latencies, errors = [], 0
+
+    def _one(entry):
+        start = time.perf_counter()
+        graph.invoke(entry_to_state(entry))
+        return (time.perf_counter() - start) * 1000
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # bounded window so a huge log is never materialized
+        pending = []
+        for entry in entries:
+            pending.append(pool.submit(_one, entry))
+            if len(pending) >= concurrency * 4:
+                future = pending.pop(0)
+                try:
+                    latencies.append(future.result())
+                except Exception:
+                    errors += 1
+        for future in pending:
+            try:
+                latencies.append(future.result())
+            except Exception:
+                errors += 1
+    wall = time.perf_counter() - wall
+
+    latencies.sort()
+
+    def _pct(p):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": (len(latencies) / wall) if wall else 0.0,
+        "p50_ms": _pct(50),
+        "p95_ms": _pct(95),
+        "p99_ms": _pct(99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--log", default="input/user_queries/queries.jsonl")
+    parser.add_argument("--graph", required=True, help="module:callable returning a compiled graph")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--mode", default=None, help="only replay entries logged in this UI mode")
+    args = parser.parse_args()
+
+    module, attr = args.graph.split(":")
+    graph = getattr(importlib.import_module(module), attr)()
+
+    entries = iter(QueryLog(args.log))
+    if args.mode:
+        entries = (e for e in entries if e.get("mode") == args.mode)
+    if args.limit:
+        entries = islice(entries, args.limit)
+
+    for key, value in replay(entries, graph, args.concurrency).items():
+        print(f"{key:>15}: {value:.2f}" if isinstance(value, float) else f"{key:>15}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# workflow/result_compaction.py
+import numpy as np
+import pandas as pd
+
+
+def count_tokens(text: str, tokenizer=None) -> int:
+    """
+    Exact count with the interpreting model's tokenizer when available,
+    otherwise the usual ~4 characters per token estimate.
+    """
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False))
+    return len(text) // 4 + 1
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indices of the points kept (first and last always kept).
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    bucket = (n - 2) / (n_out - 2)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        nstart, nend = end, min(int((i + 2) * bucket) + 1, n)
+        if nend <= nstart:
+            nstart, nend = n - 1, n
+
+        avg_x = x[nstart:nend].mean()
+        avg_y = y[nstart:nend].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+
+    return keep
+
+
+def _x_axis(df: pd.DataFrame):
+    """
+    Series x-axis: first datetime column, else the row position.
+    """
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            return col, df[col].astype("int64").to_numpy(dtype=float)
+    return None, np.arange(len(df), dtype=float)
+
+
+def _summarize(df: pd.DataFrame, top_k: int, series_points: int) -> str:
+    numeric = df.select_dtypes("number")
+    parts = [f"Result has {len(df)} rows x {df.shape[1]} columns (compacted)."]
+
+    if not numeric.empty:
+        stats = numeric.agg(["count", "mean", "std", "min", "median", "max"]).T
+        parts.append("Summary statistics:\n" + stats.to_string(float_format=lambda v: f"{v:.4g}"))
+
+        lead = numeric.columns[0]
+        top = df.loc[numeric[lead].nlargest(top_k).index]
+        parts.append(f"Top {len(top)} rows by {lead}:\n" + top.to_string(index=False))
+
+        x_col, x = _x_axis(df)
+        if len(df) > series_points:
+            for col in numeric.columns:
+                y = numeric[col].to_numpy(dtype=float)
+                mask = ~np.isnan(y)
+                idx = np.flatnonzero(mask)[lttb(x[mask], y[mask], series_points)]
+                cols = [x_col, col] if x_col is not None else [col]
+                sample = df.iloc[idx][cols]
+                parts.append(
+                    f"{col} trend ({len(idx)} of {int(mask.sum())} points, LTTB):\n"
+                    + sample.to_string(index=x_col is None)
+                )
+    else:
+        parts.append(f"First {top_k} rows:\n" + df.head(top_k).to_string(index=False))
+
+    return "\n\n".join(parts)
+
+
+def compact_result(
+    result,
+    token_budget: int = 1500,
+    tokenizer=None,
+    top_k: int = 10,
+    series_points: int = 50,
+) -> str:
+    """
+    Text for INTERPRET_PROMPT bounded by `token_budget`.
+
+    Small results pass through verbatim (`to_string()`); large ones become
+    summary statistics + top-k rows + LTTB-downsampled series, shrinking
+    k / points until the text fits.
+    """
+    if not isinstance(result, pd.DataFrame):
+        return str(result)
+
+    # rendering thousands of rows just to measure them is itself the slow
+    # part, so large frames are sized from a rendered sample first
+    sample_rows = 200
+    if len(result) > sample_rows:
+        sample = count_tokens(result.head(sample_rows).to_string(), tokenizer)
+        fits = sample * len(result) / sample_rows <= token_budget
+    else:
+        fits = True
+
+    if fits:
+        text = result.to_string()
+        if count_tokens(text, tokenizer) <= token_budget:
+            return text
+
+    while True:
+        text = _summarize(result, top_k, series_points)
+        if count_tokens(text, tokenizer) <= token_budget:
+            return text
+        if top_k <= 1 and series_points <= 3:
+            # very wide results: hard cap so prefill stays bounded
+            return text[: token_budget * 4]
+        top_k = max(1, top_k // 2)
+        series_points = max(3, series_points // 2)
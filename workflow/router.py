@@ -1,6 +1,8 @@
 # workflow/router.py
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+
+from workflow.async_runtime import get_gpu_worker
+from llm.models.prefix_cache import register_prompt
 
 
 ROUTER_PROMPT = ChatPromptTemplate.from_template(
@@ -23,16 +25,79 @@ Decision:
 """
 )
 
+register_prompt("router", ROUTER_PROMPT)
+
+ROUTES = ("simple", "vision", "sql")
+
 
-def router_node(llm):
+# per-flow routers: the input type is known, only "is the model needed" is decided
+SQL_ROUTER_PROMPT = ChatPromptTemplate.from_template(
     """
-    llm: central Mistral model
+You are a routing agent for a maritime analytics system.
+The user has uploaded a table of vessel data.
+
+Return ONLY ONE of:
+- answer_directly   (general maritime knowledge; the table is not needed)
+- generate_sql      (needs values, aggregates or filters from the table)
+
+User query:
+{query}
+
+Decision:
+"""
+)
+
+VISION_ROUTER_PROMPT = ChatPromptTemplate.from_template(
     """
+You are a routing agent for a maritime analytics system.
+The user has uploaded a chart or report page.
+
+Return ONLY ONE of:
+- answer_directly      (general maritime knowledge; the image is not needed)
+- extract_from_image   (needs what the chart shows: values, trends, events)
+
+User query:
+{query}
+
+Decision:
+"""
+)
+
+register_prompt("sql_router", SQL_ROUTER_PROMPT)
+register_prompt("vision_router", VISION_ROUTER_PROMPT)
+
+SQL_ROUTES = ("answer_directly", "generate_sql")
+VISION_ROUTES = ("answer_directly", "extract_from_image")
 
-    chain = ROUTER_PROMPT | llm | StrOutputParser()
+
+def router_node(llm, router_prompt=ROUTER_PROMPT, valid_routes=ROUTES):
+    """
+    llm: central Mistral model
+    valid_routes: closed label set; the decision is scored over exactly these
+    labels in one forward pass (MistralClient.classify), so it is always valid
+    """
+    labels = tuple(sorted(valid_routes))
 
     def _route(state):
-        decision = chain.invoke({"query": state["query"]}).strip().lower()
-        return {"decision": decision}
+        prompt = router_prompt.invoke({"query": state["query"]}).to_string()
+        decision, confidence = llm.classify(prompt, labels)
+        return {"decision": decision, "route_confidence": confidence}
+
+    return _route
+
+
+def arouter_node(llm, router_prompt=ROUTER_PROMPT, valid_routes=ROUTES, gpu=None):
+    """
+    Async router_node: the label scoring runs on the GPU worker, where
+    concurrent routing requests are scored in one batched forward pass.
+    """
+    gpu = gpu or get_gpu_worker()
+    labels = tuple(sorted(valid_routes))
+    key = (id(llm), "classify", labels)
+
+    async def _route(state):
+        prompt = router_prompt.invoke({"query": state["query"]}).to_string()
+        decision, confidence = await gpu.run_batched(key, llm.classify_batch, prompt, labels=labels)
+        return {"decision": decision, "route_confidence": confidence}
 
     return _route
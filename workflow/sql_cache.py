@@ -0,0 +1,253 @@
+# workflow/sql_cache.py
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+# quoted strings | dates (with optional time) | numbers
+LITERAL_RE = re.compile(
+    r"""'[^']*'|"[^"]*"|\d{1,4}[-/]\d{1,2}[-/]\d{1,4}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?|\d+(?:\.\d+)?"""
+)
+
+# numbers right after these keywords are query structure (LIMIT 10, ORDER BY 2),
+# not filter values: only rebound when the literal appears nowhere else
+STRUCTURAL_RE = re.compile(r"\b(?:LIMIT|OFFSET|TOP|BY)\s+$", re.I)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercase, collapse whitespace, drop trailing punctuation.
+    """
+    text = re.sub(r"\s+", " ", question.strip().lower())
+    return text.rstrip(" ?.!;")
+
+
+def schema_fingerprint(schema: str) -> str:
+    return hashlib.sha1(schema.encode()).hexdigest()[:16]
+
+
+def templatize(question: str):
+    """
+    Replace literals with positional placeholders.
+    Returns (template, [literals]) with literals unquoted.
+    """
+    literals = []
+
+    def _sub(match):
+        literals.append(match.group(0).strip("'\""))
+        return f"<L{len(literals) - 1}>"
+
+    return LITERAL_RE.sub(_sub, normalize_question(question)), literals
+
+
+def rebind_literals(sql: str, old: list, new: list) -> Optional[str]:
+    """
+    Swap the old question literals for the new ones inside cached SQL.
+    Returns None when an old literal that changed cannot be located
+    (e.g. SQLCoder reformatted a date), so the caller treats it as a miss.
+    """
+    replacements = {}
+    for o, n in zip(old, new):
+        if o == n:
+            continue
+        if o in replacements and replacements[o] != n:
+            return None
+        replacements[o] = n
+
+    if not replacements:
+        return sql
+
+    pattern = re.compile(
+        "|".join(
+            rf"(?<![\w.]){re.escape(o)}(?![\w.])"
+            for o in sorted(replacements, key=len, reverse=True)
+        )
+    )
+    matches = [(m, bool(STRUCTURAL_RE.search(sql[: m.start()]))) for m in pattern.finditer(sql)]
+    if {m.group(0) for m, _ in matches} != set(replacements):
+        return None
+    as_value = {m.group(0) for m, structural in matches if not structural}
+
+    # single pass, so swapped values (5 <-> 10) are not substituted twice
+    parts, last = [], 0
+    for m, structural in matches:
+        if structural and m.group(0) in as_value:
+            continue  # "Speed > 10 ... LIMIT 10": only the filter value follows the question
+        parts += [sql[last : m.start()], replacements[m.group(0)]]
+        last = m.end()
+    return "".join(parts) + sql[last:]
+
+
+class SQLCache:
+    """
+    NL -> SQL cache in front of SQLCoder.
+
+    Key: normalized question + schema fingerprint.
+    - exact hits return the cached SQL
+    - template hits (same question modulo dates/numbers/quoted values)
+      rebind the new literals into the cached SQL
+    - LRU eviction beyond `max_entries`, entries expire after `ttl_s`
+    - optional JSON persistence at `path` survives restarts
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_s: Optional[float] = 7 * 24 * 3600,
+        path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.path = path
+
+        self._exact = OrderedDict()     # (question, schema_fp) -> entry
+        self._templates = {}            # (template, schema_fp) -> exact key
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer at a time publishes the file
+        self._stats = {
+            "exact_hits": 0,
+            "template_hits": 0,
+            "misses": 0,
+            "saved_gpu_s": 0.0,
+        }
+
+        if path and os.path.exists(path):
+            self._load()
+
+    # --------------------------------------------------
+    # LOOKUP
+    # --------------------------------------------------
+    def _alive(self, entry) -> bool:
+        return self.ttl_s is None or time.time() - entry["created"] <= self.ttl_s
+
+    def get(self, question: str, schema: str) -> Optional[str]:
+        fp = schema_fingerprint(schema)
+        key = (normalize_question(question), fp)
+        template, literals = templatize(question)
+
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is not None and self._alive(entry):
+                self._exact.move_to_end(key)
+                self._stats["exact_hits"] += 1
+                self._stats["saved_gpu_s"] += entry["gen_s"]
+                return entry["sql"]
+
+            source_key = self._templates.get((template, fp))
+            entry = self._exact.get(source_key) if source_key else None
+            if entry is not None and self._alive(entry):
+                sql = rebind_literals(entry["sql"], entry["literals"], literals)
+                if sql is not None:
+                    self._exact.move_to_end(source_key)
+                    self._stats["template_hits"] += 1
+                    self._stats["saved_gpu_s"] += entry["gen_s"]
+                    return sql
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, question: str, schema: str, sql: str, gen_s: float = 0.0):
+        fp = schema_fingerprint(schema)
+        key = (normalize_question(question), fp)
+        template, literals = templatize(question)
+
+        with self._lock:
+            self._exact[key] = {
+                "sql": sql,
+                "literals": literals,
+                "template": template,
+                "gen_s": gen_s,
+                "created": time.time(),
+            }
+            self._exact.move_to_end(key)
+            self._templates[(template, fp)] = key
+            self._evict()
+
+        if self.path:
+            self._save()
+
+    def discard(self, question: str, schema: str):
+        """
+        Drop the entry answering `question` (e.g. SQL the guard refused),
+        so neither it nor its template serves the next lookup.
+        """
+        fp = schema_fingerprint(schema)
+        template, _ = templatize(question)
+
+        with self._lock:
+            key = (normalize_question(question), fp)
+            source_key = self._templates.get((template, fp))
+            removed = False
+            for k in {key, source_key} - {None}:
+                entry = self._exact.pop(k, None)
+                if entry is not None:
+                    removed = True
+                    tkey = (entry["template"], fp)
+                    if self._templates.get(tkey) == k:
+                        del self._templates[tkey]
+
+        if removed and self.path:
+            self._save()
+
+    def _evict(self):
+        while len(self._exact) > self.max_entries:
+            key, entry = self._exact.popitem(last=False)
+            tkey = (entry["template"], key[1])
+            if self._templates.get(tkey) == key:
+                del self._templates[tkey]
+
+    # --------------------------------------------------
+    # STATS
+    # --------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._exact)
+        lookups = stats["exact_hits"] + stats["template_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            (stats["exact_hits"] + stats["template_hits"]) / lookups if lookups else 0.0
+        )
+        return stats
+
+    # --------------------------------------------------
+    # PERSISTENCE
+    # --------------------------------------------------
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._save_lock:
+            # snapshot inside the writer lock, so the last file written is the newest state
+            with self._lock:
+                rows = [
+                    {"question": q, "schema_fp": fp, **entry}
+                    for (q, fp), entry in self._exact.items()
+                ]
+
+            # private tmp file in the same directory: os.replace stays atomic
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=".sql_cache.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(rows, f)
+                os.replace(tmp, self.path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    def _load(self):
+        with open(self.path, "r") as f:
+            rows = json.load(f)
+
+        for row in rows:
+            key = (row.pop("question"), row.pop("schema_fp"))
+            if not self._alive(row):
+                continue
+            self._exact[key] = row
+            self._templates[(row["template"], key[1])] = key
+        self._evict()
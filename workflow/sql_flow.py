@@ -1,10 +1,24 @@
 # workflow/sql_flow.py
-import pandas as pd
+import re
+import time
+
 from langchain_core.prompts import ChatPromptTemplate
 
+from workflow.dataset import resolve_dataset
+from workflow.async_runtime import get_gpu_worker, run_cpu
+from workflow.streaming import stream_llm
+from workflow.profiler import get_profile, link_columns, schema_string
+from workflow.result_compaction import compact_result
+from llm.models.physics_rules import flags_schema, rule_notes
+from llm.models.prefix_cache import register_prompt
+from llm.models.sql_guard import GuardError
+
 
 # - Table name is `data` in rules or not 
 
+# questions that should see the `data__flags` table in the schema
+ANOMALY_RE = re.compile(r"anomal|flag|violat|sensor|mismatch|inconsisten|outlier|physics|maintenance", re.I)
+
 SQL_PROMPT = ChatPromptTemplate.from_template(
     """
 You are an expert SQL generator.
@@ -37,60 +51,213 @@ Given the SQL result below, answer the user query clearly with numbers.
 SQL result:
 {sql_result}
 
+Domain notes (Knowledge Base excerpts; cite them where they explain the numbers):
+{context}
+
 User query:
 {query}
 """
 )
 
+# fixed instruction blocks: prefilled once per model (llm.models.prefix_cache)
+register_prompt("sql", SQL_PROMPT)
+register_prompt("sql_interpret", INTERPRET_PROMPT)
+
+
+# --------------------------------------------------
+# STEPS (shared by the sync and async nodes)
+# --------------------------------------------------
+def _prepare_generate(state, sql_cache, templates):
+    """
+    CPU half of sql_generate: template fast path, schema, prompt, cache.
+    Returns (update, None) when answered without SQLCoder,
+    else (None, (dataset_id, schema, prompt)).
+    """
+    dataset_id, df = resolve_dataset(state)
+
+    if templates is not None:
+        matched = templates.match(state["query"], dataset_id, df)
+        if matched is not None:
+            sql, result = matched
+            return {
+                "sql_query": sql,
+                "sql_result": result,
+                "dataset_id": dataset_id,
+                "sql_source": "template",
+            }, None
+
+    # profiled once per dataset; wide tables only get the linked columns
+    profile = get_profile(df, key=dataset_id)
+    schema = schema_string(profile, link_columns(profile, state["query"]))
+    if ANOMALY_RE.search(state["query"]):
+        flags = flags_schema(df)
+        if flags:
+            schema = f"Table data\n{schema}\n\n{flags}"
+
+    prompt = SQL_PROMPT.invoke(
+        {
+            "schema": schema,
+            "query": state["query"],
+        }
+    ).to_string()
+
+    if sql_cache is not None:
+        sql = sql_cache.get(state["query"], schema)
+        if sql is not None:
+            return {
+                "sql_query": sql,
+                "dataset_id": dataset_id,
+                "sql_source": "cache",
+                "sql_schema": schema,
+            }, None
+
+    return None, (dataset_id, schema, prompt)
+
+
+def _finish_generate(state, job, sql: str, gen_s: float):
+    # cached by _execute once it has run: a query the guard refuses is never stored
+    dataset_id, schema, _ = job
+    return {
+        "sql_query": sql,
+        "dataset_id": dataset_id,
+        "sql_source": "sqlcoder",
+        "sql_schema": schema,
+        "sql_gen_s": gen_s,
+    }
+
+
+def _execute(state, sqlcoder, sql_cache=None):
+    if state.get("sql_source") == "template":
+        return {}  # already answered by the fast path
+
+    dataset_id, df = resolve_dataset(state)
+    source = state.get("sql_source")
+    try:
+        # dataset_id is the frame's content hash: the engine skips re-hashing it
+        result = sqlcoder.execute_sql(df, state["sql_query"], fingerprint=dataset_id)
+    except GuardError as e:
+        if sql_cache is not None and source == "cache":
+            sql_cache.discard(state["query"], state["sql_schema"])
+        # refused / aborted by the SQL guard: the interpreter explains why
+        return {
+            "sql_result": f"Query not run ({e.reason}): {e.detail}",
+            "sql_error": e.as_dict(),
+        }
+
+    if sql_cache is not None and source == "sqlcoder":
+        sql_cache.put(state["query"], state["sql_schema"], state["sql_query"], gen_s=state.get("sql_gen_s", 0.0))
+    return {"sql_result": result}
+
+
+def _interpret_prompt(state, knowledge, top_k: int, token_budget: int, central_llm):
+    context = knowledge.context(state["query"], top_k=top_k) if knowledge else ""
+    result = state["sql_result"]
+    notes = rule_notes(result.columns) if hasattr(result, "columns") else ""
+    if getattr(result, "attrs", {}).get("truncated"):
+        notes = f"Result truncated to its first {result.attrs['row_limit']} rows.\n{notes}".strip()
+    if notes:
+        # results that read data__flags cite what each rule column means
+        context = f"{notes}\n\n{context}" if context else notes
+    return INTERPRET_PROMPT.invoke(
+        {
+            "sql_result": compact_result(
+                result,
+                token_budget=token_budget,
+                # read per call: a lazy model proxy would load the model for it
+                tokenizer=getattr(central_llm, "tokenizer", None),
+            ),
+            "context": context or "none",
+            "query": state["query"],
+        }
+    )
+
+
+# --------------------------------------------------
+# SYNC NODES
+# --------------------------------------------------
+def sql_generate_node(sqlcoder, sql_cache=None, templates=None):
+    """
+    templates: optional workflow.sql_templates.TemplateMatcher; matching
+               range-aggregate questions are answered without any model
+    sql_cache: optional workflow.sql_cache.SQLCache consulted before SQLCoder
+
+    sql_source records which of template | cache | sqlcoder produced the SQL.
+    """
 
-def sql_generate_node(sqlcoder):
     def _generate(state):
-        df = pd.read_csv(state["dataframe_path"])
-
-        def pandas_to_sqlite(dtype):
-            if "int" in str(dtype):
-                return "INTEGER"
-            if "float" in str(dtype):
-                return "REAL"
-            return "TEXT"
-
-        schema = "\n".join(
-        f"{c} {pandas_to_sqlite(t)}"
-        for c, t in df.dtypes.items()
-        )
-
-        prompt = SQL_PROMPT.invoke(
-            {
-                "schema": schema,
-                "query": state["query"],
-            }
-        ).to_string()
-
-        sql = sqlcoder.generate_sql(prompt)
-        return {"sql_query": sql}
+        update, job = _prepare_generate(state, sql_cache, templates)
+        if update is not None:
+            return update
+
+        start = time.perf_counter()
+        sql = sqlcoder.generate_sql(job[2])
+        return _finish_generate(state, job, sql, time.perf_counter() - start)
 
     return _generate
 
 
-def sql_execute_node(sqlcoder):
-    def _execute(state):
-        df = pd.read_csv(state["dataframe_path"])
-        result = sqlcoder.execute_sql(df, state["sql_query"])
-        return {"sql_result": result}
+def sql_execute_node(sqlcoder, sql_cache=None):
+    """
+    sql_cache: the generate node's SQLCache; SQLCoder output is stored only
+               after it ran, and a cached query the guard refuses is dropped
+    """
+
+    def _execute_node(state):
+        return _execute(state, sqlcoder, sql_cache)
 
-    return _execute
+    return _execute_node
 
 
-def sql_interpret_node(central_llm):
-    chain = INTERPRET_PROMPT | central_llm
+def sql_interpret_node(central_llm, token_budget: int = 1500, knowledge=None, top_k: int = 3):
+    """
+    Streams the answer token-by-token (see workflow.streaming).
+    Large results are compacted to `token_budget` tokens before prefill.
+    knowledge: optional workflow.knowledge.KnowledgeIndex; the top_k chunks
+               relevant to the query are added as domain notes
+    """
 
     def _interpret(state):
-        response = chain.invoke(
-            {
-                "sql_result": state["sql_result"].to_string(),
-                "query": state["query"],
-            }
-        )
-        return {"final_answer": response.content}
+        prompt = _interpret_prompt(state, knowledge, top_k, token_budget, central_llm)
+        answer, metrics = stream_llm(central_llm, prompt, node="sql_interpret")
+        return {"final_answer": answer, "timings": metrics}
+
+    return _interpret
+
+
+# --------------------------------------------------
+# ASYNC NODES (graph.ainvoke)
+# --------------------------------------------------
+def asql_generate_node(sqlcoder, sql_cache=None, templates=None, gpu=None):
+    """
+    Async sql_generate: CPU steps on the shared pool, SQLCoder on the GPU worker.
+    """
+    gpu = gpu or get_gpu_worker()
+
+    async def _generate(state):
+        update, job = await run_cpu(_prepare_generate, state, sql_cache, templates)
+        if update is not None:
+            return update
+
+        start = time.perf_counter()
+        sql = await gpu.run(sqlcoder.generate_sql, job[2])
+        return _finish_generate(state, job, sql, time.perf_counter() - start)
+
+    return _generate
+
+
+def asql_execute_node(sqlcoder, sql_cache=None):
+    async def _execute_node(state):
+        return await run_cpu(_execute, state, sqlcoder, sql_cache)
+
+    return _execute_node
+
+
+def asql_interpret_node(central_llm, token_budget: int = 1500, knowledge=None, top_k: int = 3, gpu=None):
+    gpu = gpu or get_gpu_worker()
+
+    async def _interpret(state):
+        prompt = await run_cpu(_interpret_prompt, state, knowledge, top_k, token_budget, central_llm)
+        answer, metrics = await gpu.run(stream_llm, central_llm, prompt, "sql_interpret")
+        return {"final_answer": answer, "timings": metrics}
 
     return _interpret
@@ -0,0 +1,187 @@
+# workflow/sql_templates.py
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from llm.models.ingest import DATETIME_FORMATS, SQL_DATETIME_FORMAT, detect_datetime_format
+
+
+AGG_WORDS = {
+    "average": "AVG", "mean": "AVG", "avg": "AVG",
+    "maximum": "MAX", "max": "MAX", "highest": "MAX", "peak": "MAX",
+    "minimum": "MIN", "min": "MIN", "lowest": "MIN",
+    "total": "SUM", "sum": "SUM",
+    "count": "COUNT", "number of": "COUNT",
+}
+
+_AGG_ALT = "|".join(sorted(map(re.escape, AGG_WORDS), key=len, reverse=True))
+_TS = r"""['"]?(\d{1,4}[-/]\d{1,2}[-/]\d{1,4}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?)['"]?"""
+
+_LEAD = r"(?:(?:what\s+(?:is|was|were)|what's|show(?:\s+me)?|give\s+me|tell\s+me|compute|calculate|find|get)\s+)?"
+
+# the whole question must be the intent: any extra clause (a filter, a
+# grouping) falls through to SQLCoder instead of being silently dropped
+INTENT_RE = re.compile(
+    rf"\s*{_LEAD}(?:the\s+)?(?P<agg>{_AGG_ALT})(?:\s+(?:of|the))*\s+(?P<col>[a-z_][\w ]*?)\s+"
+    rf"(?:between|from)\s+{_TS}\s+(?:and|to|until)\s+{_TS}\s*[?.!]*\s*",
+    re.I,
+)
+
+# words that mean the column phrase carries a condition, not a column name
+FILTER_WORDS = {
+    "where", "with", "per", "by", "for", "when", "above", "below", "over", "under",
+    "greater", "less", "more", "than", "excluding", "except", "without", "only", "each",
+}
+
+# a timestamp without a time of day
+_DATE_ONLY_RE = re.compile(r"\d{1,4}[-/]\d{1,2}[-/]\d{1,4}")
+_DAY_NS = 24 * 3600 * 10**9
+
+
+def _norm(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+def _to_epoch(text: str):
+    """
+    Naive timestamp -> ns since epoch, on the same scale as datetime64[ns].
+    """
+    for fmt in DATETIME_FORMATS:
+        try:
+            return int(np.datetime64(datetime.strptime(text, fmt), "ns").astype(np.int64))
+        except ValueError:
+            continue
+    return None
+
+
+class _SeriesIndex:
+    """
+    Time-sorted arrays for one dataset: epochs plus, per numeric column,
+    prefix sums / prefix counts (NaN-aware) for O(1) SUM/AVG/COUNT.
+    """
+
+    def __init__(self, df: pd.DataFrame, ts_col: str, ts: pd.Series):
+        valid = ts.notna().to_numpy()
+        order = np.argsort(ts.to_numpy()[valid], kind="stable")
+
+        self.ts_col = ts_col
+        self.epochs = ts.to_numpy()[valid][order].astype("datetime64[ns]").astype(np.int64)
+        self.values, self.prefix_sum, self.prefix_count = {}, {}, {}
+
+        for col in df.select_dtypes("number").columns:
+            v = df[col].to_numpy(dtype=float)[valid][order]
+            present = ~np.isnan(v)
+            self.values[col] = v
+            self.prefix_sum[col] = np.concatenate(([0.0], np.cumsum(np.where(present, v, 0.0))))
+            self.prefix_count[col] = np.concatenate(([0], np.cumsum(present)))
+
+    def window(self, lo: int, hi: int):
+        """
+        Row slice [i, j) for lo <= ts <= hi (two binary searches).
+        """
+        return (
+            int(np.searchsorted(self.epochs, lo, side="left")),
+            int(np.searchsorted(self.epochs, hi, side="right")),
+        )
+
+    def aggregate(self, func: str, col: str, i: int, j: int):
+        count = int(self.prefix_count[col][j] - self.prefix_count[col][i])
+        if func == "COUNT":
+            return count
+        if count == 0:
+            return None
+        total = float(self.prefix_sum[col][j] - self.prefix_sum[col][i])
+        if func == "SUM":
+            return total
+        if func == "AVG":
+            return total / count
+        window = self.values[col][i:j]
+        return float(np.nanmax(window) if func == "MAX" else np.nanmin(window))
+
+
+class TemplateMatcher:
+    """
+    Deterministic fast path for "<agg> <column> between <t1> and <t2>"
+    questions. Answers from prefix sums + searchsorted and returns the
+    equivalent SQL; anything else (extra conditions, a column that is not
+    named exactly) falls through to SQLCoder. A date-only end bound
+    includes that whole day.
+    """
+
+    def __init__(self, max_datasets: int = 8, table_name: str = "data"):
+        self.max_datasets = max_datasets
+        self.table_name = table_name
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _index(self, dataset_id: str, df: pd.DataFrame):
+        with self._lock:
+            if dataset_id in self._indexes:
+                self._indexes.move_to_end(dataset_id)
+                return self._indexes[dataset_id]
+
+        index = None
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                index = _SeriesIndex(df, col, df[col])
+                break
+            fmt = detect_datetime_format(df[col])
+            if fmt:
+                index = _SeriesIndex(df, col, pd.to_datetime(df[col], format=fmt, errors="coerce"))
+                break
+
+        with self._lock:
+            self._indexes[dataset_id] = index
+            while len(self._indexes) > self.max_datasets:
+                self._indexes.popitem(last=False)
+        return index
+
+    @staticmethod
+    def _resolve_column(phrase: str, columns) -> str:
+        # exact only: "power deviation" is not Power
+        if FILTER_WORDS & set(phrase.lower().split()):
+            return None
+        target = _norm(phrase)
+        exact = [c for c in columns if _norm(c) == target]
+        return exact[0] if exact else None
+
+    def match(self, question: str, dataset_id: str, df: pd.DataFrame):
+        """
+        Returns (sql, result DataFrame) or None.
+        """
+        m = INTENT_RE.fullmatch(question)
+        index = self._index(dataset_id, df) if m else None
+        if index is None:
+            self.stats["misses"] += 1
+            return None
+
+        func = AGG_WORDS[m.group("agg").lower()]
+        col = self._resolve_column(m.group("col"), index.values)
+        lo, hi = _to_epoch(m.group(3)), _to_epoch(m.group(4))
+        if col is None or lo is None or hi is None:
+            self.stats["misses"] += 1
+            return None
+
+        # "until 2024-12-31" means the whole day, not its first instant
+        whole_day = bool(_DATE_ONLY_RE.fullmatch(m.group(4)))
+        i, j = index.window(lo, hi + _DAY_NS - 1 if whole_day else hi)
+        value = index.aggregate(func, col, i, j)
+
+        label = f"{func}({col})"
+        ts_col = index.ts_col
+        lo_text = pd.Timestamp(lo).strftime(SQL_DATETIME_FORMAT)
+        if whole_day:
+            end_text = pd.Timestamp(hi + _DAY_NS).strftime(SQL_DATETIME_FORMAT)
+            where = f"\"{ts_col}\" >= '{lo_text}' AND \"{ts_col}\" < '{end_text}'"
+        else:
+            hi_text = pd.Timestamp(hi).strftime(SQL_DATETIME_FORMAT)
+            where = f"\"{ts_col}\" BETWEEN '{lo_text}' AND '{hi_text}'"
+        sql = f'SELECT {func}("{col}") AS "{label}" FROM {self.table_name} WHERE {where};'
+
+        self.stats["hits"] += 1
+        return sql, pd.DataFrame({label: [value]})
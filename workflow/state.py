@@ -1,5 +1,7 @@
 # workflow/state.py
-from typing import TypedDict, Optional, Any, List
+from typing import TypedDict, Optional, Any, List, Annotated
+
+from workflow.dataset import merge_timings
 
 
 class GraphState(TypedDict):
@@ -9,14 +11,24 @@ class GraphState(TypedDict):
     # optional inputs
     image_path: Optional[str]        # for vision flow
     dataframe_path: Optional[str]    # csv / parquet
+    dataset_id: Optional[str]        # key into workflow.dataset registry
 
     # routing
-    decision: Optional[str]          # simple | vision | sql
+    decision: Optional[str]          # simple | vision | sql, or a flow label (answer_directly, ...)
+    route_source: Optional[str]      # structural | keywords | default | llm
+    route_confidence: Optional[float]
 
     # intermediate results
-    vision_result: Optional[str]
+    vision_result: Optional[Any]     # parsed chart extraction (dict)
     sql_query: Optional[str]
+    sql_source: Optional[str]        # template | cache | sqlcoder
+    sql_schema: Optional[str]        # schema the SQL was generated for (SQL cache key)
+    sql_gen_s: Optional[float]       # SQLCoder generation time, cached with the SQL
     sql_result: Optional[Any]
+    sql_error: Optional[dict]        # SQL guard abort: reason, detail, sql, ...
 
     # final answer
     final_answer: Optional[str]
+
+    # instrumentation
+    timings: Annotated[dict, merge_timings]   # node name -> ms
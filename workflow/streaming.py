@@ -0,0 +1,72 @@
+# workflow/streaming.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+# callback(token: str) installed by the UI for the current run
+_token_sink = ContextVar("token_sink", default=None)
+
+
+@contextmanager
+def stream_to(callback):
+    """
+    Route interpret-node tokens to `callback` while the graph runs.
+
+        with stream_to(lambda tok: ...):
+            graph.invoke(state)
+    """
+    token = _token_sink.set(callback)
+    try:
+        yield
+    finally:
+        _token_sink.reset(token)
+
+
+def _graph_writer():
+    """
+    LangGraph custom stream writer (graph.stream(..., stream_mode="custom")),
+    or None outside a streaming run / on older langgraph.
+    """
+    try:
+        from langgraph.config import get_stream_writer
+
+        return get_stream_writer()
+    except Exception:
+        return None
+
+
+def stream_llm(llm, prompt, node: str):
+    """
+    Stream a completion from `llm` and fan tokens out to the UI sink and the
+    LangGraph custom stream.
+
+    llm: MistralClient (yields str) or a LangChain chat model (yields chunks)
+    Returns (text, metrics) with time-to-first-token in ms.
+    """
+    sink = _token_sink.get()
+    writer = _graph_writer()
+
+    parts = []
+    start = time.perf_counter()
+    ttft_ms = None
+
+    for chunk in llm.stream(prompt):
+        text = getattr(chunk, "content", chunk)
+        if not text:
+            continue
+        if ttft_ms is None:
+            ttft_ms = (time.perf_counter() - start) * 1000
+
+        parts.append(text)
+        if sink is not None:
+            sink(text)
+        if writer is not None:
+            writer({"node": node, "token": text})
+
+    total_ms = (time.perf_counter() - start) * 1000
+    metrics = {
+        f"{node}.ttft": round(ttft_ms if ttft_ms is not None else total_ms, 3),
+        f"{node}.decode": round(total_ms, 3),
+    }
+    return "".join(parts).strip(), metrics
@@ -1,6 +1,12 @@
 # workflow/vision_flow.py
+import json
+import asyncio
+
 from langchain_core.prompts import ChatPromptTemplate
 
+from workflow.streaming import stream_llm
+from workflow.async_runtime import get_gpu_worker, run_cpu
+from llm.models.prefix_cache import register_prompt
 
 
 
@@ -18,33 +24,49 @@ Rules:
 Return output STRICTLY as valid JSON.
 
 JSON format:
-{
-  "axes": {
+{{
+  "axes": {{
     "x": "...",
     "y": "...",
     "units": "..."
-  },
-  "time_range": {
+  }},
+  "time_range": {{
     "start": "...",
     "end": "..."
-  },
+  }},
   "trend": "...",
   "events": [
-    {
+    {{
       "type": "peak | dip | change_point | anomaly",
       "x": "...",
       "y": "...",
       "description": "..."
-    }
+    }}
   ],
   "notes": "..."
-}
+}}
 
 User question (for context only):
 {query}
 """
 )
 
+# the JSON format above as a decoding constraint (llm.models.json_constraint)
+CHART_SCHEMA = {
+    "axes": {"x": "string", "y": "string", "units": "string"},
+    "time_range": {"start": "any", "end": "any"},
+    "trend": "string",
+    "events": [
+        {
+            "type": ("peak", "dip", "change_point", "anomaly"),
+            "x": "any",
+            "y": "any",
+            "description": "string",
+        }
+    ],
+    "notes": "string",
+}
+
 
 INTERPRET_PROMPT = ChatPromptTemplate.from_template(
     """
@@ -55,43 +77,127 @@ Based on the extracted chart analysis below, answer the user query clearly and c
 Chart analysis:
 {vision_result}
 
+Domain notes (Knowledge Base excerpts; cite them where they explain the chart):
+{context}
+
 User query:
 {query}
 """
 )
 
+# VISION_PROMPT is not registered: Qwen's chat template puts the image
+# tokens first, so its prompts share no static text prefix
+register_prompt("vision_interpret", INTERPRET_PROMPT)
 
-def vision_node(qwen_client):
-    def _vision(state):
-        prompt = VISION_PROMPT.invoke(
-            {"query": state["query"]}
-        ).to_string()
 
-        result = qwen_client.analyze(
-            image_path=state["image_path"],
-            prompt=prompt,   # ONLY this
-        )
+def extraction_prompt() -> str:
+    """
+    The chart-extraction prompt. Extraction ignores the user question by
+    design, so it is rendered without it: one cached result per page serves
+    every question and pages can be analyzed before anyone asks.
+    """
+    return VISION_PROMPT.invoke({"query": "(not given)"}).to_string()
 
+
+def prefetch_pages(qwen_client, image_paths, gpu=None):
+    """
+    Analyze every page of an uploaded report in the background (batched, see
+    QwenClient.analyze_batch) so selecting any page later is a cache hit.
+    Runs on the GPU worker, queued behind interactive calls already submitted.
+    Returns the Future of the per-page results.
+    """
+    gpu = gpu or get_gpu_worker()
+    return gpu.submit(
+        qwen_client.analyze_batch, list(image_paths), extraction_prompt(), schema=CHART_SCHEMA
+    )
+
+
+def _vision_update(result) -> dict:
+    # constrained decoding returns a dict; a free-text client may not
+    if isinstance(result, str):
         try:
-        parsed = json.loads(raw)
-        except Exception:
-        parsed = {"raw_text": raw}
-        
-        return {"vision_result": result}
+            result = json.loads(result)
+        except ValueError:
+            result = {"raw_text": result}
+    return {"vision_result": result}
+
+
+def _submit_extraction(qwen_client, image_path: str, gpu):
+    """
+    Queue one chart on the GPU worker, the only thread that runs Qwen, so it
+    never generates concurrently with a page prefetch. Charts waiting
+    together share one QwenClient.analyze_batch.
+    """
+    prompt = extraction_prompt()
+    return gpu.submit_batched(
+        (id(qwen_client), "analyze", prompt),
+        qwen_client.analyze_batch,
+        image_path,
+        prompt=prompt,   # ONLY this
+        schema=CHART_SCHEMA,
+    )
+
+
+def vision_node(qwen_client, gpu=None):
+    gpu = gpu or get_gpu_worker()
+
+    def _vision(state):
+        result = _submit_extraction(qwen_client, state["image_path"], gpu).result()
+        return _vision_update(result)
 
     return _vision
 
 
-def vision_interpret_node(central_llm):
-    chain = INTERPRET_PROMPT | central_llm
+def _vision_interpret_prompt(state, knowledge, top_k: int):
+    context = knowledge.context(state["query"], top_k=top_k) if knowledge else ""
+    vision_result = state["vision_result"]
+    if not isinstance(vision_result, str):
+        vision_result = json.dumps(vision_result, indent=1)
+    return INTERPRET_PROMPT.invoke(
+        {
+            "vision_result": vision_result,
+            "context": context or "none",
+            "query": state["query"],
+        }
+    )
+
+
+def vision_interpret_node(central_llm, knowledge=None, top_k: int = 3):
+    """
+    Streams the answer token-by-token (see workflow.streaming).
+    knowledge: optional workflow.knowledge.KnowledgeIndex for domain notes
+    """
 
     def _interpret(state):
-        response = chain.invoke(
-            {
-                "vision_result": state["vision_result"],
-                "query": state["query"],
-            }
-        )
-        return {"final_answer": response.content}
+        prompt = _vision_interpret_prompt(state, knowledge, top_k)
+        answer, metrics = stream_llm(central_llm, prompt, node="vision_interpret")
+        return {"final_answer": answer, "timings": metrics}
+
+    return _interpret
+
+
+# --------------------------------------------------
+# ASYNC NODES (graph.ainvoke)
+# --------------------------------------------------
+def avision_node(qwen_client, gpu=None):
+    """
+    Async vision_node: same GPU-worker extraction, awaited.
+    """
+    gpu = gpu or get_gpu_worker()
+
+    async def _vision(state):
+        future = _submit_extraction(qwen_client, state["image_path"], gpu)
+        return _vision_update(await asyncio.wrap_future(future))
+
+    return _vision
+
+
+def avision_interpret_node(central_llm, knowledge=None, top_k: int = 3, gpu=None):
+    gpu = gpu or get_gpu_worker()
+
+    async def _interpret(state):
+        prompt = await run_cpu(_vision_interpret_prompt, state, knowledge, top_k)
+        answer, metrics = await gpu.run(stream_llm, central_llm, prompt, "vision_interpret")
+        return {"final_answer": answer, "timings": metrics}
 
     return _interpret